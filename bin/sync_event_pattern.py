@@ -0,0 +1,44 @@
+"""Rewrites the EventBridge pattern of EC2ResourceCreatedRule in resources/sam.yaml from the event registry
+
+Run from the project root after adding an event to tagger/parser/registry.py:
+    python3 ./bin/sync_event_pattern.py
+"""
+import os
+import sys
+
+sys.path.insert(0, os.getcwd())
+
+from tagger.parser.registry import event_pattern
+
+TEMPLATE_PATH = './resources/sam.yaml'
+RULE = '  EC2ResourceCreatedRule:\n'
+PATTERN_START = '      EventPattern:\n'
+PATTERN_END = '      Targets:\n'
+
+
+def render_event_pattern():
+    pattern = event_pattern()
+    lines = [PATTERN_START, '        source:\n']
+    lines.extend('          - %s\n' % source for source in pattern['source'])
+    lines.append('        detail:\n')
+    for key, values in sorted(pattern['detail'].items(), key=lambda item: item[0] != 'eventType'):
+        lines.append('          %s:\n' % key)
+        lines.extend('            - %s\n' % value for value in values)
+    return ''.join(lines)
+
+
+def sync_template(path=TEMPLATE_PATH):
+    with open(path) as f:
+        template = f.read()
+    rule = template.index(RULE)
+    start = template.index(PATTERN_START, rule)
+    end = template.index(PATTERN_END, start)
+    updated = template[:start] + render_event_pattern() + template[end:]
+    if updated != template:
+        with open(path, 'w') as f:
+            f.write(updated)
+    return updated != template
+
+
+if __name__ == '__main__':
+    print('Updated %s' % TEMPLATE_PATH if sync_template() else '%s is up to date' % TEMPLATE_PATH)
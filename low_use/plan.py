@@ -0,0 +1,231 @@
+"""Plan for a Low Use Reporter run
+
+Collects the actions a reporter run would take (tag writes, Dynamo writes, stops and emails)
+without executing any of them, and estimates the AWS API calls and run time they need at the
+configured rate limits. Used by the reporter's plan mode to size Dynamo capacity and SES quotas
+before LUAU is enabled on an account.
+
+The budget includes the run's own bookkeeping: the Dynamo preload Scan of the first invocation, the
+checkpoint (a head PutItem per invocation, then a shard and a head per batch, see
+LowUseReporter.save_shard) and summary items in the state table, and the Lambda Invoke handing the
+run over when it spans several invocations.
+"""
+
+import math
+from collections import Counter
+from util.aws import (CREATE_TAGS_MAX_RESOURCES, DYNAMO_BATCH_SIZE, DYNAMO_WRITE_RATE, INSTANCE_STATUS_CHUNK_SIZE,
+                      SES_BULK_SEND, SES_BULK_SIZE, STOP_CHUNK_SIZE, STOP_POLL_ATTEMPTS, STOP_POLL_INTERVAL)
+
+
+def chunks_needed(count, chunk_size):
+    """Get the number of calls needed to send count items chunk_size at a time
+
+    Args:
+        count (int): Number of items
+        chunk_size (int): Max number of items per call
+
+    Returns:
+        int: Number of calls
+    """
+    return int(math.ceil(count / float(chunk_size)))
+
+
+class RunPlan:
+    """Actions and API call budget of a reporter run
+
+    Attributes:
+        dynamo (obj): Wrapper for AWS DynamoDB, when its index is preloaded unchanged writes are left out
+        tag_writes (:obj:`list` of :obj:`dict`): Tags to write, with InstanceID, Key and Value
+        tag_groups (obj): Counter of instances to tag keyed by (region, tag key), each group is tagged
+            with chunked CreateTags calls
+        dynamo_puts (dict): Items to put keyed by table name
+        dynamo_deletes (dict): Instance ids to delete keyed by table name
+        stops (dict): Instance ids to stop keyed by region
+        creators (set): Creators that would receive a report
+        batches (int): Number of batches the run acts on, each one checkpointed
+        refresh (bool): The run refreshes the Trusted Advisor check before reading it
+    """
+    def __init__(self, dynamo, refresh=False):
+        self.dynamo = dynamo
+        self.refresh = refresh
+        self.batches = 0
+        self.tag_writes = []
+        self.tag_groups = Counter()
+        self.dynamo_puts = {dynamo.whitelist.name: [], dynamo.low_use.name: []}
+        self.dynamo_deletes = {dynamo.low_use.name: []}
+        self.stops = {}
+        self.creators = set()
+
+    def add_batch(self, batch, instance_regions):
+        """Add the actions of one sorted batch
+
+        Mirrors LowUseReporter.act_on_batch, and assumes every stop succeeds.
+
+        Args:
+            batch (dict): Sorted instances as returned by LowUseReporter.sort_instances
+            instance_regions (dict): Region of each instance keyed by instance id
+        """
+        dynamo = self.dynamo
+        self.batches += 1
+        for instance in batch['whitelist']:
+            self.put(dynamo.whitelist, dynamo.whitelist_item(instance['InstanceID'], instance['Creator'],
+                                                             instance['Reason']))
+            self.delete(dynamo.low_use, instance['InstanceID'])
+        for instance in batch['low_use']:
+            self.tag(instance['InstanceID'], 'Low Use', instance_regions)
+            self.put(dynamo.low_use, dynamo.low_use_item(instance['InstanceID'], instance['Creator']))
+            self.creators.add(instance['Creator'])
+        for instance in batch['scheduled_for_deletion']:
+            self.tag(instance['InstanceID'], 'Scheduled For Deletion', instance_regions)
+            self.put(dynamo.low_use, dynamo.scheduled_for_deletion_item(instance['InstanceID'], instance['Creator']))
+            self.creators.add(instance['Creator'])
+        for instance_id in batch['to_stop']:
+            self.stops.setdefault(instance_regions.get(instance_id), []).append(instance_id)
+            self.delete(dynamo.low_use, instance_id)
+
+    def tag(self, instance_id, tag_key, instance_regions):
+        """Plan a lifecycle tag write
+
+        Args:
+            instance_id (str): ID of EC2 Instance
+            tag_key (str): Key of the lifecycle tag, set to 'true'
+            instance_regions (dict): Region of each instance keyed by instance id
+        """
+        self.tag_writes.append({'InstanceID': instance_id, 'Key': tag_key, 'Value': 'true'})
+        self.tag_groups[(instance_regions.get(instance_id), tag_key)] += 1
+
+    def put(self, table, item):
+        """Plan a put, unless the preloaded index already holds the item unchanged
+
+        Args:
+            table (obj): Boto3 AWS Dynamo Table Object
+            item (dict): Item to put
+        """
+        if self.dynamo.index is None or self.dynamo.get_item(table, item['InstanceID']) != item:
+            self.dynamo_puts[table.name].append(item)
+
+    def delete(self, table, instance_id):
+        """Plan a delete, unless the preloaded index shows the item is not in the table
+
+        Args:
+            table (obj): Boto3 AWS Dynamo Table Object
+            instance_id (str): ID of EC2 Instance
+        """
+        if self.dynamo.index is None or self.dynamo.get_item(table, instance_id) is not None:
+            self.dynamo_deletes[table.name].append(instance_id)
+
+    def api_calls(self, bulk=SES_BULK_SEND, invocations=1):
+        """Estimate the API calls of the run's write phase and bookkeeping
+
+        Reads made while fetching and classifying the report are not included, plan mode already
+        made them, except the preload Scan the first invocation repeats. DescribeInstanceStatus
+        is an upper bound that assumes every poll is needed.
+
+        Args:
+            bulk (bool): Creator reports are sent with SendBulkTemplatedEmail
+            invocations (int): Number of Lambda invocations the run spans
+
+        Returns:
+            dict: Number of calls keyed by service, then by operation
+        """
+        dynamo_calls = Counter()
+        if self.dynamo.index is not None:
+            dynamo_calls['Scan'] = self.dynamo.scan_calls
+        # Checkpoint and summary reads, at most every shard on each resume, a head per invocation, a shard
+        # and a head per batch, the emails head and the summary, then the checkpoint and its shards are deleted
+        dynamo_calls['GetItem'] = invocations + 1 + self.batches * (invocations - 1)
+        dynamo_calls['PutItem'] = invocations + 2 * self.batches + 2
+        dynamo_calls['DeleteItem'] = self.batches + 1
+        for items in self.dynamo_puts.values():
+            dynamo_calls['BatchWriteItem'] += chunks_needed(len(items), DYNAMO_BATCH_SIZE)
+        for instance_ids in self.dynamo_deletes.values():
+            dynamo_calls['BatchWriteItem'] += chunks_needed(len(instance_ids), DYNAMO_BATCH_SIZE)
+        ec2_calls = Counter()
+        for count in self.tag_groups.values():
+            ec2_calls['CreateTags'] += chunks_needed(count, CREATE_TAGS_MAX_RESOURCES)
+        for instance_ids in self.stops.values():
+            ec2_calls['StopInstances'] += chunks_needed(len(instance_ids), STOP_CHUNK_SIZE)
+            ec2_calls['DescribeInstanceStatus'] += \
+                chunks_needed(len(instance_ids), INSTANCE_STATUS_CHUNK_SIZE) * STOP_POLL_ATTEMPTS
+        ses_calls = Counter({'GetSendQuota': 1, 'SendTemplatedEmail': 1})
+        if bulk:
+            ses_calls['SendBulkTemplatedEmail'] = chunks_needed(len(self.creators), SES_BULK_SIZE)
+        else:
+            ses_calls['SendTemplatedEmail'] += len(self.creators)
+        support_calls = Counter({'DescribeTrustedAdvisorCheckSummaries': 1})
+        if self.refresh:
+            support_calls['RefreshTrustedAdvisorCheck'] = 1
+        calls = {'dynamodb': dynamo_calls, 'ec2': ec2_calls, 'ses': ses_calls, 'support': support_calls,
+                 'lambda': Counter({'Invoke': invocations - 1})}
+        return {service: {operation: count for operation, count in operations.items() if count}
+                for service, operations in calls.items()}
+
+    def estimate_seconds(self, send_rate, write_rate=DYNAMO_WRITE_RATE):
+        """Estimate the time the rate limited parts of the run take
+
+        Dynamo writes wait on write_rate, emails (creator reports and the admin report) wait on the
+        SES send rate, and stops wait for instances to reach stopping/stopped, every region at once.
+
+        Args:
+            send_rate (float): Max number of emails SES accepts per second, None if unknown
+            write_rate (float): Max DynamoDB item writes per second, None if unlimited
+
+        Returns:
+            dict: Seconds per phase (dynamo_writes, stops, emails) and their total
+        """
+        item_writes = sum(len(items) for items in self.dynamo_puts.values()) + \
+            sum(len(instance_ids) for instance_ids in self.dynamo_deletes.values())
+        estimate = {
+            'dynamo_writes': item_writes / float(write_rate) if write_rate else 0.0,
+            'stops': float((STOP_POLL_ATTEMPTS - 1) * STOP_POLL_INTERVAL) if self.stops else 0.0,
+            'emails': (len(self.creators) + 1) / float(send_rate) if send_rate else 0.0
+        }
+        estimate['total'] = sum(estimate.values())
+        return estimate
+
+    def invocations(self, estimate, invocation_seconds=None):
+        """Estimate the number of Lambda invocations the run spans
+
+        Args:
+            estimate (dict): Seconds per phase, as returned by estimate_seconds
+            invocation_seconds (float): Usable seconds of one invocation, None if unknown
+
+        Returns:
+            int: Number of invocations, 1 if invocation_seconds is unknown
+        """
+        if not invocation_seconds:
+            return 1
+        return max(1, chunks_needed(estimate['dynamo_writes'] + estimate['stops'], invocation_seconds))
+
+    def summary(self, send_rate=None, remaining=None, invocation_seconds=None):
+        """Summarize the plan
+
+        Args:
+            send_rate (float): Max number of emails SES accepts per second, None if unknown
+            remaining (float): Number of emails that can still be sent in the current 24 hours, None if unlimited
+            invocation_seconds (float): Usable seconds of one invocation, None if unknown
+
+        Returns:
+            dict: Intended actions, API calls, estimated seconds and invocations, and quota warnings
+        """
+        estimate = self.estimate_seconds(send_rate)
+        invocations = self.invocations(estimate, invocation_seconds)
+        warnings = []
+        emails = len(self.creators) + 1
+        if remaining is not None and emails > remaining:
+            warnings.append('SES quota allows %d of %d emails' % (remaining, emails))
+        if send_rate is None:
+            warnings.append('SES send rate unknown, email time not estimated')
+        return {
+            'actions': {
+                'tag_writes': self.tag_writes,
+                'dynamo_puts': self.dynamo_puts,
+                'dynamo_deletes': self.dynamo_deletes,
+                'stops': self.stops,
+                'emails': sorted(self.creators)
+            },
+            'api_calls': self.api_calls(invocations=invocations),
+            'estimated_seconds': estimate,
+            'invocations': invocations,
+            'warnings': warnings
+        }
@@ -5,41 +5,128 @@ grabs some instance metadata from EC2 such as tags
 """
 
 import logging
-from util.aws import TrustedAdvisor, EC2Wrapper
+import os
+from util.aws import TrustedAdvisor, RegionalEC2Pool, get_region
 
 logging.basicConfig()
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
+# How the tags of each batch of flagged instances are loaded. 'describe_instances' (default) reads every
+# tag of the instances. 'describe_tags' only reads the lifecycle tags, worth enabling when instances carry
+# many other tags or many flagged instances are already terminated (DescribeInstances splits such chunks)
+INSTANCE_STATE_SOURCE = os.environ.get('INSTANCE_STATE_SOURCE', 'describe_instances')
+# Number of flagged instances parsed and handed downstream at a time
+PARSE_BATCH_SIZE = 500
+
 class LowUseReportParser:
     """Parses the Low Use report
 
     Attributes:
         session (obj): Boto3 AWS Session Object
         advisor (obj): Wrapper for AWS TrustedAdvisor
-        ec2 (obj): Wrapper for AWS EC2
+        ec2_pool (obj): Per-region EC2Wrappers, pass one in to share clients and tag cache with the caller
+        ec2 (obj): Wrapper for AWS EC2 in the region of the session
+        state_source (str): How instance state is loaded, 'describe_tags' or 'describe_instances'
+        instance_states (dict): Tags of each instance keyed by instance id, loaded while parsing
     """
-    def __init__(self, session):
+    def __init__(self, session, ec2_pool=None, state_source=INSTANCE_STATE_SOURCE):
         self.session = session
-        self.advisor = TrustedAdvisor()
-        self.ec2 = EC2Wrapper(session)
+        self.advisor = TrustedAdvisor(session)
+        self.ec2_pool = ec2_pool if ec2_pool is not None else RegionalEC2Pool(session)
+        self.ec2 = self.ec2_pool.get()
+        self.state_source = state_source
+        self.instance_states = None
 
-    def parse_low_use_report(self): 
+    def parse_low_use_report(self, instance_states=None):
         """Parses the report
 
+        Flagged instances are grouped by region and each region is parsed in parallel against
+        an EC2 client for that region.
+
+        Args:
+            instance_states (dict, optional): Tags of each instance keyed by instance id. If not given,
+                they are loaded per region according to state_source.
+
         Returns:   
             list of dict: List of Low use instances with associated metadata
         """
-        report = self.advisor.get_low_use_instances()
         list_of_instances = []
-        for instance in report:
-            instance_metadata = self.parse_metadata(instance['metadata'])
-            if not instance_metadata:
-                continue
-            list_of_instances.append(instance_metadata)
+        self.instance_states = {}
+        for instances, states in self.iter_low_use_report(instance_states=instance_states):
+            list_of_instances.extend(instances)
+            self.instance_states.update(states)
         return list_of_instances
 
-    def parse_metadata(self, metadata):
+    def iter_low_use_report(self, batch_size=PARSE_BATCH_SIZE, instance_states=None):
+        """Parses the report one batch at a time
+
+        Only one batch of parsed metadata and instance tags is held at a time, so callers can act
+        on a batch before the next one is parsed. The raw report itself is held in full, because
+        DescribeTrustedAdvisorCheckResult returns every flagged resource in one response.
+
+        Args:
+            batch_size (int): Number of flagged instances per batch
+            instance_states (dict, optional): Tags of each instance keyed by instance id. If not given,
+                they are loaded per batch and region according to state_source.
+
+        Yields:
+            list of dict: Low use instances of the batch with associated metadata
+            dict: Tags of the batch's instances keyed by instance id
+        """
+        report = self.advisor.get_low_use_instances() or []
+        for start in range(0, len(report), batch_size):
+            batch = report[start:start + batch_size]
+            if instance_states is None:
+                states = {}
+                region_states = self.ec2_pool.map_regions(self.group_by_region(batch), self.load_instance_states)
+                for region_state in region_states.values():
+                    states.update(region_state)
+            else:
+                states = instance_states
+
+            list_of_instances = []
+            for instance in batch:
+                instance_metadata = self.parse_metadata(instance['metadata'], states)
+                if not instance_metadata:
+                    continue
+                list_of_instances.append(instance_metadata)
+            yield list_of_instances, {instance['instance_id']: states.get(instance['instance_id'], {})
+                                      for instance in list_of_instances}
+
+    def group_by_region(self, report):
+        """Groups flagged resources by region
+
+        Args:
+            report (:obj:`list` of :obj:`dict`): Flagged resources from the Low Use report
+
+        Returns:
+            dict: Lists of flagged resources keyed by region
+        """
+        groups = {}
+        for instance in report:
+            region = get_region(instance['metadata'][0]) or self.ec2_pool.default_region
+            groups.setdefault(region, []).append(instance)
+        return groups
+
+    def load_instance_states(self, ec2, report):
+        """Loads the tags of flagged instances in one region
+
+        Both sources only read the flagged instances, so nothing outlives the batch.
+
+        Args:
+            ec2 (obj): EC2Wrapper bound to the region
+            report (:obj:`list` of :obj:`dict`): Flagged resources in the region
+
+        Returns:
+            dict: Tags of each instance keyed by instance id
+        """
+        instance_ids = [instance['metadata'][1] for instance in report]
+        if self.state_source == 'describe_tags':
+            return ec2.get_lifecycle_tags(instance_ids)
+        return ec2.get_tags_for_instances(instance_ids)
+
+    def parse_metadata(self, metadata, instance_states=None):
         """Parses instance metadata
 
         This function mainly formats the metadata to use key/value pairs instead of indexing for
@@ -48,11 +135,16 @@ class LowUseReportParser:
     
         Args:
             metadata (:obj:`list`): Metadata from Low Use report
+            instance_states (dict, optional): Tags of each instance keyed by instance id. If not given,
+                the creator is looked up from EC2.
 
         Returns:
             dict: Metadata of instance
         """
-        creator = self.ec2.get_creator_for_instance(metadata[1])
+        if instance_states is None:
+            creator = self.ec2_pool.get(get_region(metadata[0])).get_creator_for_instance(metadata[1])
+        else:
+            creator = instance_states.get(metadata[1], {}).get('Creator')
         if creator is None: 
             return {}
         usage_logs = metadata[5:19]
@@ -4,25 +4,100 @@ This function grabs and parses the Low Use report from AWS TrustedAdvisor, flags
 instances as either Whitelisted, Low Use, or Scheduled for Deletion via Tagging
 and DynamoDB Tables, and then sends Low Use/Admin report emails to the given 
 users.
+
+The run is a pipeline of stages that pass bounded batches of instances along:
+parse (TrustedAdvisor report + instance tags) -> classify -> actions (tags, Dynamo
+writes, stops) -> email aggregation. Actions for one batch run on a worker thread
+while the next batch is parsed and classified.
+
+Memory is not flat in fleet size. Instance tags, parsed metadata and whitelist/stop lists only
+live as long as their batch. What remains grows with the fleet:
+    * the raw Trusted Advisor result, which is fetched in one call
+    * the ids of processed instances
+    * the compact email record of each low use or scheduled instance, needed for the reports sent
+      at the end
+
+Progress is checkpointed in the state store after every batch. The checkpoint is sharded: every
+completed batch saves its own shard (processed ids and email records), and a small head item keeps
+the run's progress and shard count, so each write is the size of one batch whatever the size of the
+fleet. When the invocation is about to time out, the reporter saves its checkpoint and re-invokes
+itself asynchronously, and the next invocation resumes from the checkpoint instead of starting over.
+
+Batches are sized from the time left in the invocation and the time an instance's actions take
+(at least one Dynamo write at DYNAMO_WRITE_RATE, then measured from completed batches), and a batch
+is only taken if it and the batches in flight can finish before the safety margin.
+
+An instance moves through the lifecycle (Low Use -> Scheduled For Deletion -> stopped) one stage at
+a time, once LIFECYCLE_INTERVAL has passed since it entered its current stage. That time is kept in
+its LowUse item (FlaggedAt), so the reporter can be scheduled more often than LIFECYCLE_INTERVAL and
+every instance still gets its full notice. A new run first compares the Trusted Advisor check summary
+(timestamp and flagged-resource counts) with the one of the last finished run, kept in the state
+store with the time the next flagged instance is due:
+    * a 'force' key in the event: full run, every flagged instance moves on
+    * summary changed, or an instance due: newly flagged instances are flagged as Low Use, and the
+      instances that are due move on, the others keep their stage
+    * summary unchanged and nothing due: nothing to do, the report is not parsed
+
+In plan mode (a 'plan' key in the event, or PLAN_MODE=true) the report is fetched and classified,
+and the intended actions and their API call budget are logged and returned instead of executed.
 """
 
 
 import boto3
+import json
 import logging
 import os
-from util.aws import EC2Wrapper, DynamoWrapper, SESWrapper
-from low_use.report_parser import LowUseReportParser
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from botocore.exceptions import ClientError
+from util.aws import EC2Wrapper, RegionalEC2Pool, DynamoWrapper, SESWrapper, get_client, get_region, STOPPED_STATES
+from util.cache import TTLCache
+from util.metrics import emit_metrics
+from util.state import get_state_store
+from low_use.report_parser import LowUseReportParser, PARSE_BATCH_SIZE
+from low_use.plan import RunPlan
 
 logging.basicConfig()
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
+# Matches the Lambda timeout, so cached tags never outlive an invocation
+TAG_CACHE_TTL = 300
+# Load both Dynamo tables up front so membership checks and unchanged writes cost no requests
+DYNAMO_PRELOAD = os.environ.get('DYNAMO_PRELOAD', 'true').lower() == 'true'
+# Dynamo index preloaded by this container for the run it belongs to, reused when the run's next
+# invocation lands on the same warm container
+_run_index = {}
+# Max number of classified batches waiting for (or in) the action stage
+PIPELINE_DEPTH = 2
+# Key of the reporter's checkpoint in the state store
+CHECKPOINT_KEY = 'LowUseReporter'
+# Checkpoints older than this (seconds) belong to an abandoned run and are discarded
+CHECKPOINT_MAX_AGE = int(os.environ.get('CHECKPOINT_MAX_AGE', 6 * 60 * 60))
+# Stop taking new batches and hand over to a new invocation below this much remaining time
+TIME_SAFETY_MARGIN_MS = int(os.environ.get('TIME_SAFETY_MARGIN_MS', 60 * 1000))
+# Max number of invocations a single run may span, guards against re-invoking forever
+MAX_INVOCATIONS = 10
+# Key of the last finished run's check summary and next due time in the state store
+SUMMARY_KEY = 'LowUseReporterSummary'
+# Min seconds an instance stays Low Use, then Scheduled For Deletion, before moving on
+LIFECYCLE_INTERVAL = int(os.environ.get('LIFECYCLE_INTERVAL', 7 * 24 * 60 * 60))
+# An instance is due this many seconds early, so scheduling jitter and the run's own duration do not
+# push its transition back by a whole schedule period
+LIFECYCLE_TOLERANCE = int(os.environ.get('LIFECYCLE_TOLERANCE', 60 * 60))
+# Log and return the intended actions instead of executing them
+PLAN_MODE = os.environ.get('PLAN_MODE', 'false').lower() == 'true'
+
 class LowUseReporter:
     """Parses the Low Use report, sync instance states with Dynamo, and sends email reports
 
     Attrbiutes:
         session (obj): Boto3 AWS Session Object
-        ec2 (obj) Wrapper for AWS EC2
+        tag_cache (obj): Instance tag cache shared by the reporter and the parser for this invocation
+        ec2_pool (obj): Per-region Wrappers for AWS EC2, shared with the parser
+        ec2 (obj) Wrapper for AWS EC2 in the Lambda's region
         dynamo (obj): Wrapper for AWS DynamoDB
         ses (obj): Wrapper for AWS SES
         event (dict): Event dictionary passed by Lambda trigger
@@ -32,19 +107,56 @@ class LowUseReporter:
         low_use_instances (:obj:`list` of :obj:`dict`): list of low_use instances and associated metadata 
         instances_scheduled_for_deletion (:obj:`list` of :obj:`dict`): list of instances scheduled for deletion and associated metadata 
         instances_to_stop (:obj:`list` of :obj:`dict`): list of instances to be stopped and associated metadata 
+        instance_states (dict): Lifecycle tags of each instance keyed by instance id, None until loaded
+        instance_regions (dict): Region of each flagged instance keyed by instance id
+        creator_reports (dict): Creator report keyed by creator, built while sorting instances
+        state_store (obj): Store holding the run checkpoint
+        run_id (str): Id of the run, shared by every invocation resuming it
+        started_at (float): Epoch time the run started
+        invocation (int): Number of this invocation within the run, starting at 1
+        processed (set): Ids of the instances whose actions are done in this run
+        shards (int): Number of checkpoint shards saved by this run, one per completed batch
+        action_seconds (float): Time spent on the actions of the batches completed by this invocation
+        action_instances (int): Number of instances in the batches completed by this invocation
+        action_writes (int): Number of Dynamo writes the batches completed by this invocation needed
+        advance_lifecycle (bool): Move every flagged instance to its next stage, when False only the
+            instances that are due move on
+        summary (dict): Timestamp and flagged-resource counts of the check this run works from
+        next_due_at (float): Epoch time the next flagged instance of the report is due, None if none is waiting
     """
     def __init__(self, event, context):
         self.session = boto3.Session(region_name=os.environ['AWS_REGION'])
-        self.ec2 = EC2Wrapper(self.session)
+        self.tag_cache = TTLCache(ttl=TAG_CACHE_TTL)
+        self.ec2_pool = RegionalEC2Pool(self.session, tag_cache=self.tag_cache)
+        self.ec2 = self.ec2_pool.get()
         self.dynamo = DynamoWrapper(self.session)
         self.ses = SESWrapper(self.session)
         self.event = event
         self.context = context
-        self.parser = LowUseReportParser(self.session)
+        self.parser = LowUseReportParser(self.session, ec2_pool=self.ec2_pool)
+        if context is not None:
+            # Leave at least half of the invocation for the run itself
+            usable_seconds = max(0, context.get_remaining_time_in_millis() - TIME_SAFETY_MARGIN_MS) / 1000
+            self.parser.advisor.refresh_budget = min(self.parser.advisor.refresh_budget, usable_seconds / 2)
         self.whitelist = []
         self.low_use_instances = []
         self.instances_scheduled_for_deletion = []
         self.instances_to_stop = []
+        self.instance_states = None
+        self.instance_regions = {}
+        self.creator_reports = {}
+        self.state_store = get_state_store(self.session)
+        self.run_id = None
+        self.started_at = None
+        self.invocation = 1
+        self.processed = set()
+        self.shards = 0
+        self.action_seconds = 0.0
+        self.action_instances = 0
+        self.action_writes = 0
+        self.advance_lifecycle = True
+        self.summary = None
+        self.next_due_at = None
 
 
     def sync(self):
@@ -57,45 +169,147 @@ class LowUseReporter:
         self.sync_low_use_instances()
         self.sync_instances_scheduled_for_deletion()
 
-    def sync_whitelist(self):
+    def sync_whitelist(self, whitelist=None):
         """Sync whitelist
         
-        Adds newly whitelisted instances to the Whitelist DynamoDB Table
+        Adds newly whitelisted instances to the Whitelist DynamoDB Table in batches
+
+        Args:
+            whitelist (:obj:`list` of :obj:`dict`, optional): Instances to sync, defaults to self.whitelist
         """
-        for instance in self.whitelist:
-            self.dynamo.add_to_whitelist(instance['InstanceID'], instance['Creator'], instance['Reason'])
+        whitelist = self.whitelist if whitelist is None else whitelist
+        if not whitelist:
+            return
+        failed = self.dynamo.batch_add_to_whitelist(whitelist)
+        self.log_failed_writes('Whitelist', failed)
+        report = self.dynamo.batch_delete_item_from_low_use([instance['InstanceID'] for instance in whitelist])
+        self.log_failed_deletes(report)
 
-    def sync_low_use_instances(self): 
+    def sync_low_use_instances(self, low_use_instances=None): 
         """Sync low_use instances
         
-        Flags instances as low use and adds them to the LowUse DynamoDB Table
+        Flags instances as low use and adds them to the LowUse DynamoDB Table in batches
+
+        Args:
+            low_use_instances (:obj:`list` of :obj:`dict`, optional): Instances to sync, defaults to self.low_use_instances
         """
-        for instance in self.low_use_instances:
-            self.flag_instance_as_low_use(instance['InstanceID'], instance['Creator'])
+        low_use_instances = self.low_use_instances if low_use_instances is None else low_use_instances
+        self.tag_instances([instance['InstanceID'] for instance in low_use_instances], 'Low Use')
+        failed = self.dynamo.batch_add_to_low_use(low_use_instances, flagged_at=self.started_at)
+        self.log_failed_writes('LowUse', failed)
         
-    def sync_instances_scheduled_for_deletion(self):
+    def sync_instances_scheduled_for_deletion(self, instances_scheduled_for_deletion=None):
         """Sync instances scheduled for deletion
         
-        Flags instances as scheduled for deletion and sets them as such in the LowUse DynamoDB Table
+        Flags instances as scheduled for deletion and sets them as such in the LowUse DynamoDB Table in batches
+
+        Args:
+            instances_scheduled_for_deletion (:obj:`list` of :obj:`dict`, optional): Instances to sync,
+                defaults to self.instances_scheduled_for_deletion
         """
-        for instance in self.instances_scheduled_for_deletion:
-            self.flag_instance_for_deletion(instance['InstanceID'], instance['Creator'])        
-    
-    def flag_instance_as_low_use(self, instance_id, creator):
-        """Flag an instance as low_use
+        if instances_scheduled_for_deletion is None:
+            instances_scheduled_for_deletion = self.instances_scheduled_for_deletion
+        self.tag_instances([instance['InstanceID'] for instance in instances_scheduled_for_deletion],
+                           'Scheduled For Deletion')
+        failed = self.dynamo.batch_schedule_for_deletion(instances_scheduled_for_deletion, flagged_at=self.started_at)
+        self.log_failed_writes('LowUse', failed)
 
-        Flags an instance as low use via tags and in the a DynamoDB Table
+    def stop_instances(self, instances_to_stop=None):
+        """Stop instances
+
+        Stops the instances in each region and removes the ones that reached stopping/stopped
+        from the LowUse DynamoDB Table
+
+        Args:
+            instances_to_stop (:obj:`list` of :obj:`str`, optional): Instance ids to stop, defaults to self.instances_to_stop
+        """
+        instances_to_stop = self.instances_to_stop if instances_to_stop is None else instances_to_stop
+        if not instances_to_stop:
+            return
+        logger.warning("Stopping the following instances: %s", instances_to_stop)
+        states = {}
+        groups = self.group_by_region(instances_to_stop)
+        for region_states in self.ec2_pool.map_regions(groups, EC2Wrapper.stop_instances_in_chunks).values():
+            states.update(region_states)
+        stopped = [instance_id for instance_id, state in states.items() if state in STOPPED_STATES]
+        report = self.dynamo.batch_delete_item_from_low_use(stopped)
+        self.log_failed_deletes(report)
+
+    def log_failed_writes(self, table_name, items):
+        """Log items that could not be written to Dynamo
+
+        Args:
+            table_name (str): Name of the DynamoDB Table
+            items (:obj:`list` of :obj:`dict`): Items that could not be written
+        """
+        if items:
+            logger.error('Could not write %d items to %s: %s', len(items), table_name,
+                         [item['InstanceID'] for item in items])
+
+    def log_failed_deletes(self, report):
+        """Log instances that could not be removed from the LowUse Dynamo Table
+
+        Args:
+            report (dict): Delete outcome keyed by instance id
+        """
+        failed = [instance_id for instance_id, outcome in report.items() if outcome in ('unprocessed', 'failed')]
+        if failed:
+            logger.error('Could not delete %d items from LowUse: %s', len(failed), failed)
+
+    def log_delivery(self, delivery):
+        """Log the outcome of the creator report emails
+
+        Args:
+            delivery (dict): Delivery status keyed by creator
+        """
+        statuses = {}
+        for result in delivery.values():
+            statuses.setdefault(result['status'], []).append(result['destination'])
+        logger.info('Creator reports: %s', {status: len(recipients) for status, recipients in statuses.items()})
+        for status in ('failed', 'quota_exceeded'):
+            if status in statuses:
+                logger.error('Creator reports %s: %s', status, statuses[status])
+
+    def tag_instances(self, instance_ids, tag_key):
+        """Set a lifecycle tag to 'true' on many instances
+
+        Instances are grouped by region, and every region is tagged in parallel with chunked
+        CreateTags calls. Instances that no longer exist are logged and skipped.
+
+        Args:
+            instance_ids (:obj:`list` of :obj:`str`): IDs of EC2 Instances
+            tag_key (str): Key of the lifecycle tag
+        """
+        if not instance_ids:
+            return
+        tags = [{'Key': tag_key, 'Value': 'true'}]
+        self.ec2_pool.map_regions(self.group_by_region(instance_ids),
+                                  lambda ec2, region_ids: ec2.create_tags_in_chunks(region_ids, tags))
+
+    def tag_instance(self, instance_id, tag_function):
+        """Tag an instance, ignoring instances that no longer exist
 
         Args:
             instance_id (str): ID of EC2 Instance
-            creator (str): creator of EC2 Instance
+            tag_function (callable): EC2Wrapper method that tags the instance
         """
         try:
-            self.ec2.tag_as_low_use(instance_id)
+            tag_function(self.ec2_for(instance_id), instance_id)
         except Exception as e:
             # sometimes instances appear in the report after they've been terminated, causing an error
             # we dont need to stop the function for this error, just ignore and continue
             logger.error(e)
+    
+    def flag_instance_as_low_use(self, instance_id, creator):
+        """Flag an instance as low_use
+
+        Flags an instance as low use via tags and in the a DynamoDB Table
+
+        Args:
+            instance_id (str): ID of EC2 Instance
+            creator (str): creator of EC2 Instance
+        """
+        self.tag_instance(instance_id, EC2Wrapper.tag_as_low_use)
         self.dynamo.add_to_low_use(instance_id, creator)
 
     def flag_instance_for_deletion(self, instance_id, creator): 
@@ -107,15 +321,36 @@ class LowUseReporter:
             instance_id (str): ID of EC2 Instance
             creator (str): creator of EC2 Instance
         """
-        try:
-            self.ec2.tag_for_deletion(instance_id)
-        except Exception as e:
-            # sometimes instances appear in the report after they've been terminated, causing an error
-            # we dont need to stop the function for this error, just ignore and continue
-            logger.error(e)
+        self.tag_instance(instance_id, EC2Wrapper.tag_for_deletion)
         self.dynamo.schedule_for_deletion(instance_id, creator)
 
-    def sort_instances(self, instances):
+    def ec2_for(self, instance_id):
+        """Get the EC2 Wrapper for the region of an instance
+
+        Args:
+            instance_id (str): ID of EC2 Instance
+
+        Returns:
+            obj: EC2Wrapper bound to the instance's region (the Lambda's region if unknown)
+        """
+        return self.ec2_pool.get(self.instance_regions.get(instance_id))
+
+    def group_by_region(self, instance_ids):
+        """Group instance ids by region
+
+        Args:
+            instance_ids (:obj:`list` of :obj:`str`): IDs of EC2 Instances
+
+        Returns:
+            dict: Lists of instance ids keyed by region
+        """
+        groups = {}
+        for instance_id in instance_ids:
+            region = self.instance_regions.get(instance_id) or self.ec2_pool.default_region
+            groups.setdefault(region, []).append(instance_id)
+        return groups
+
+    def sort_instances(self, instances, instance_states=None):
         """Sort instances from Low Use Report
 
         Sorts the instances flagged by TrustedAdvisor as either:
@@ -124,81 +359,627 @@ class LowUseReporter:
             * Scheduled For Deletion (1 week from stopped)
             * To Be Stopped Immediately (Stopped in this invocation)
 
+        Instances already Low Use or Scheduled For Deletion that are not due are left out, unless
+        advance_lifecycle is set. See lifecycle_due.
+
+        The tags of every flagged instance are fetched up front in bulk, one region at a time in
+        parallel (or read from instance_states when loaded), so sorting itself does not make any AWS calls.
+
         Args:
             instances (:obj:`list` of :obj:`dict`): List of instances flagged by TrustedAdvisor and associated metadata
+            instance_states (dict, optional): Tags of each instance keyed by instance id, defaults to self.instance_states
 
+        Returns:
+            dict: The sorted instances of this call, keyed by whitelist, low_use, scheduled_for_deletion and to_stop
         """
+        for instance in instances:
+            self.instance_regions[instance['instance_id']] = get_region(instance.get('region'))
+        snapshot = instance_states if instance_states is not None else self.instance_states
+        if snapshot is None:
+            groups = self.group_by_region([instance['instance_id'] for instance in instances])
+            snapshot = {}
+            for region_snapshot in self.ec2_pool.map_regions(groups, EC2Wrapper.get_tags_for_instances).values():
+                snapshot.update(region_snapshot)
+        batch = {
+            'whitelist': [],
+            'low_use': [],
+            'scheduled_for_deletion': [],
+            'to_stop': []
+        }
         for instance in instances:
             instance_id = instance['instance_id']
+            tags = snapshot.get(instance_id, {})
             creator = instance.get('creator', 'Unknown')
             cost = instance.get('cost', 'Unknown')
             cpu_average = instance.get('cpu_average', 'Unknown')
             network_average = instance.get('network_average', 'Unknown')
-            if self.ec2.is_whitelisted(instance_id):
-                self.whitelist.append({
+            if tags.get('Whitelisted') == 'true':
+                batch['whitelist'].append({
                     'InstanceID': instance_id,
                     'Creator': creator,
-                    'Reason': self.ec2.get_whitelist_reason_for_instance(instance_id)
+                    'Reason': tags.get('Reason')
                 })
-            elif self.ec2.is_low_use(instance_id):
-                self.instances_scheduled_for_deletion.append({
+            elif not self.advance_lifecycle and (tags.get('Low Use') == 'true' or
+                                                 tags.get('Scheduled For Deletion') == 'true') \
+                    and not self.lifecycle_due(instance_id):
+                continue
+            elif tags.get('Low Use') == 'true':
+                scheduled_instance = {
                     'InstanceID': instance_id,
                     'Creator': creator,
                     'Cost': cost,
                     'AverageCpuUsage': cpu_average,
                     'AverageNetworkUsage': network_average
-                })
-            elif self.ec2.is_scheduled_for_deletion(instance_id):
-                self.instances_to_stop.append(instance_id)
+                }
+                batch['scheduled_for_deletion'].append(scheduled_instance)
+                self.index_by_creator('scheduled_for_deletion', scheduled_instance)
+                self.note_due(self.run_time() + LIFECYCLE_INTERVAL)
+            elif tags.get('Scheduled For Deletion') == 'true':
+                batch['to_stop'].append(instance_id)
             else:
-                self.low_use_instances.append({
+                low_use_instance = {
                     'InstanceID': instance_id,
                     'Creator': creator,
                     'Cost': cost,
                     'AverageCpuUsage': cpu_average,
                     'AverageNetworkUsage': network_average
-                })
+                }
+                batch['low_use'].append(low_use_instance)
+                self.index_by_creator('low_use', low_use_instance)
+                self.note_due(self.run_time() + LIFECYCLE_INTERVAL)
+        self.whitelist.extend(batch['whitelist'])
+        self.low_use_instances.extend(batch['low_use'])
+        self.instances_scheduled_for_deletion.extend(batch['scheduled_for_deletion'])
+        self.instances_to_stop.extend(batch['to_stop'])
+        return batch
+
+    def run_time(self):
+        """Get the time instances flagged by this run are recorded with
+
+        Returns:
+            float: Epoch time the run started, now if it has not started
+        """
+        return self.started_at if self.started_at is not None else time.time()
+
+    def lifecycle_due(self, instance_id):
+        """Check if a Low Use or Scheduled For Deletion instance is due to move on
+
+        The instance is due once LIFECYCLE_INTERVAL (less LIFECYCLE_TOLERANCE) has passed since it
+        entered its stage. Instances flagged before the time was recorded are due. The time is read
+        from the preloaded LowUse index, or with one GetItem per instance when it is not preloaded.
+
+        Args:
+            instance_id (str): ID of EC2 Instance
+
+        Returns:
+            bool: True if the instance moves on in this run
+        """
+        flagged_at = self.dynamo.get_flagged_at(instance_id)
+        if flagged_at is None:
+            return True
+        due_at = flagged_at + LIFECYCLE_INTERVAL
+        if self.run_time() >= due_at - LIFECYCLE_TOLERANCE:
+            return True
+        self.note_due(due_at)
+        return False
+
+    def note_due(self, due_at):
+        """Keep the earliest time a flagged instance is due
+
+        Args:
+            due_at (float): Epoch time an instance is due
+        """
+        if self.next_due_at is None or due_at < self.next_due_at:
+            self.next_due_at = due_at
+
+    def act_on_batch(self, batch):
+        """Apply tags, Dynamo writes and stops for one sorted batch
+
+        Args:
+            batch (dict): Sorted instances as returned by sort_instances
+        """
+        self.sync_whitelist(batch['whitelist'])
+        self.sync_low_use_instances(batch['low_use'])
+        self.sync_instances_scheduled_for_deletion(batch['scheduled_for_deletion'])
+        self.stop_instances(batch['to_stop'])
+
+    def sorted_batches(self, batch_size=PARSE_BATCH_SIZE):
+        """Parse and classify stage of the pipeline
+
+        Instances already processed earlier in the run are skipped.
+
+        Args:
+            batch_size (int): Number of flagged instances parsed per batch
+
+        Yields:
+            dict: Sorted instances of each parsed batch, as returned by sort_instances
+        """
+        for instances, instance_states in self.parser.iter_low_use_report(batch_size=batch_size):
+            instances = [instance for instance in instances if instance['instance_id'] not in self.processed]
+            if instances:
+                yield self.sort_instances(instances, instance_states)
+
+    def run_pipeline(self):
+        """Run the parse, classify and action stages
+
+        Actions run on a single worker thread, in batch order, while the main thread parses and
+        classifies the following batches. At most PIPELINE_DEPTH batches are in flight. Once a batch
+        is done, only its processed ids and email records are kept. Before parsing a batch, the
+        batches in flight and the new one must fit in the time left, otherwise the in-flight ones
+        are finished and the rest is left to the next invocation.
+
+        Returns:
+            bool: True if the whole report was processed, False if the invocation ran out of time
+        """
+        def act(batch):
+            started = time.time()
+            self.act_on_batch(batch)
+            return time.time() - started
+
+        batch_size = self.batch_size()
+        batches = self.sorted_batches(batch_size)
+        complete = True
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            in_flight = deque()
+            while True:
+                if len(in_flight) >= PIPELINE_DEPTH:
+                    self.complete_batch(*in_flight.popleft())
+                pending = sum(self.batch_length(batch) for batch, _, _ in in_flight)
+                pending_writes = sum(writes for _, _, writes in in_flight)
+                if self.out_of_time(self.estimate_seconds(pending, pending_writes) + self.estimate_seconds(batch_size)):
+                    complete = False
+                    break
+                batch = next(batches, None)
+                if batch is None:
+                    break
+                # Counted before acting, the actions write through the index
+                writes = self.batch_writes(batch)
+                in_flight.append((batch, executor.submit(act, batch), writes))
+            while in_flight:
+                self.complete_batch(*in_flight.popleft())
+        return complete
+
+    @staticmethod
+    def batch_length(batch):
+        """Number of instances in a sorted batch
+
+        Args:
+            batch (dict): Sorted instances as returned by sort_instances
+
+        Returns:
+            int: Number of instances acted on
+        """
+        return sum(len(instances) for instances in batch.values())
+
+    def batch_writes(self, batch):
+        """Count the Dynamo writes the actions of a sorted batch need
+
+        With the index preloaded, puts of items stored unchanged and deletes of items not in the LowUse
+        table are left out, as the actions skip them. Otherwise every put and delete is counted.
+
+        Args:
+            batch (dict): Sorted instances as returned by sort_instances
+
+        Returns:
+            int: Number of item writes
+        """
+        dynamo = self.dynamo
+        whitelist_items = [dynamo.whitelist_item(instance['InstanceID'], instance['Creator'], instance['Reason'])
+                           for instance in batch['whitelist']]
+        low_use_items = [dynamo.low_use_item(instance['InstanceID'], instance['Creator'], self.started_at)
+                         for instance in batch['low_use']] + \
+            [dynamo.scheduled_for_deletion_item(instance['InstanceID'], instance['Creator'], self.started_at)
+             for instance in batch['scheduled_for_deletion']]
+        deletes = [instance['InstanceID'] for instance in batch['whitelist']] + list(batch['to_stop'])
+        if dynamo.index is not None:
+            deletes = [instance_id for instance_id in deletes if dynamo.get_low_use_instance(instance_id) is not None]
+        return len(dynamo.changed_items(dynamo.whitelist, whitelist_items)) + \
+            len(dynamo.changed_items(dynamo.low_use, low_use_items)) + len(deletes)
+
+    def estimate_seconds(self, instance_count, write_count=None):
+        """Estimate how long the actions of some instances take
+
+        The Dynamo write rate sets a floor from the writes the instances need. Instances not yet parsed
+        are assumed to need as many writes as the batches completed in this invocation, one each before
+        any completed. Once batches have completed, their measured time is used when it is slower.
+
+        Args:
+            instance_count (int): Number of instances
+            write_count (int, optional): Number of Dynamo writes they need, see batch_writes
+
+        Returns:
+            float: Estimated seconds
+        """
+        if write_count is None:
+            writes_per_instance = self.action_writes / float(self.action_instances) if self.action_instances else 1.0
+            write_count = instance_count * writes_per_instance
+        write_limiter = self.dynamo.write_limiter
+        seconds = write_count / write_limiter.rate if write_limiter is not None else 0.0
+        if self.action_instances:
+            seconds = max(seconds, instance_count * self.action_seconds / self.action_instances)
+        return seconds
+
+    def batch_size(self):
+        """Size batches so that PIPELINE_DEPTH + 1 of them fit in the time left
+
+        Returns:
+            int: Number of flagged instances per batch, at most PARSE_BATCH_SIZE
+        """
+        per_instance = self.estimate_seconds(1)
+        if self.context is None or not per_instance:
+            return PARSE_BATCH_SIZE
+        usable = max(0, self.context.get_remaining_time_in_millis() - TIME_SAFETY_MARGIN_MS) / 1000
+        return max(1, min(PARSE_BATCH_SIZE, int(usable / (per_instance * (PIPELINE_DEPTH + 1)))))
+
+    def complete_batch(self, batch, future, writes):
+        """Wait for the actions of a batch and checkpoint them
+
+        Args:
+            batch (dict): Sorted instances as returned by sort_instances
+            future (obj): Future of the batch's act_on_batch call, returning the seconds it took
+            writes (int): Number of Dynamo writes the batch needed, see batch_writes
+        """
+        seconds = future.result()
+        self.action_seconds += seconds or 0.0
+        self.action_instances += self.batch_length(batch)
+        self.action_writes += writes
+        self.save_shard(batch)
+        for key in ('whitelist', 'low_use', 'scheduled_for_deletion'):
+            self.processed.update(instance['InstanceID'] for instance in batch[key])
+        self.processed.update(batch['to_stop'])
+        # Batches complete in the order sort_instances appended them, so the batch's whitelist and
+        # stop entries are at the head of those lists. Only the email records are needed from here on.
+        del self.whitelist[:len(batch['whitelist'])]
+        del self.instances_to_stop[:len(batch['to_stop'])]
+        for key in ('whitelist', 'low_use', 'scheduled_for_deletion'):
+            for instance in batch[key]:
+                self.instance_regions.pop(instance['InstanceID'], None)
+        for instance_id in batch['to_stop']:
+            self.instance_regions.pop(instance_id, None)
+        self.save_checkpoint('actions')
+
+    def out_of_time(self, reserve_seconds=0):
+        """Check if the invocation is about to time out
+
+        Args:
+            reserve_seconds (float): Time still needed by work about to be done
+
+        Returns:
+            bool: True if less than TIME_SAFETY_MARGIN_MS would remain after the reserve,
+                always False outside Lambda
+        """
+        if self.context is None:
+            return False
+        return self.context.get_remaining_time_in_millis() - reserve_seconds * 1000 < TIME_SAFETY_MARGIN_MS
+
+    def load_checkpoint(self):
+        """Start a new run or resume the checkpointed one
+
+        A checkpoint is resumed if this invocation continues its run, if it is recent enough
+        (an earlier invocation failed before finishing), or if its run stopped at MAX_INVOCATIONS.
+        Other checkpoints are discarded.
+
+        Returns:
+            str: Phase to start from, 'actions' or 'emails'. None if this invocation continues a
+                run that has already finished.
+        """
+        event = self.event or {}
+        checkpoint = self.state_store.get(CHECKPOINT_KEY)
+        if checkpoint is not None:
+            age = time.time() - checkpoint['started_at']
+            if checkpoint['run_id'] == event.get('run_id') or age < CHECKPOINT_MAX_AGE or checkpoint.get('capped'):
+                self.restore_checkpoint(checkpoint)
+                logger.info('Resuming run %s (invocation %d) from phase %s with %d processed instances',
+                            self.run_id, self.invocation, checkpoint['phase'], len(self.processed))
+                return checkpoint['phase']
+            logger.warning('Discarding checkpoint of run %s started %d seconds ago', checkpoint['run_id'], age)
+            self.delete_checkpoint(checkpoint)
+        if event.get('run_id'):
+            logger.info('Run %s has already finished', event['run_id'])
+            return None
+        self.run_id = uuid.uuid4().hex
+        self.started_at = time.time()
+        return 'actions'
+
+    def restore_checkpoint(self, checkpoint):
+        """Restore the sorted instances and progress of a checkpoint and its shards
+
+        Args:
+            checkpoint (dict): Checkpoint as saved by save_checkpoint
+        """
+        self.run_id = checkpoint['run_id']
+        # The run keeps acting on the report it started with, a refresh could change it mid-run
+        self.parser.advisor.refresh = False
+        self.started_at = checkpoint['started_at']
+        # A run stopped at MAX_INVOCATIONS starts a new series of invocations
+        self.invocation = 1 if checkpoint.get('capped') else checkpoint['invocation'] + 1
+        self.shards = checkpoint.get('shards', 0)
+        self.advance_lifecycle = checkpoint.get('advance_lifecycle', True)
+        self.summary = checkpoint.get('summary')
+        self.next_due_at = checkpoint.get('next_due_at')
+        self.processed = set()
+        self.low_use_instances = []
+        self.instances_scheduled_for_deletion = []
+        for index in range(self.shards):
+            shard = self.state_store.get(self.shard_key(self.run_id, index)) or {}
+            self.processed.update(shard.get('processed', []))
+            self.low_use_instances.extend(shard.get('low_use_instances', []))
+            self.instances_scheduled_for_deletion.extend(shard.get('instances_scheduled_for_deletion', []))
+        self.creator_reports = {}
+        for instance in self.low_use_instances:
+            self.index_by_creator('low_use', instance)
+        for instance in self.instances_scheduled_for_deletion:
+            self.index_by_creator('scheduled_for_deletion', instance)
+
+    @staticmethod
+    def shard_key(run_id, index):
+        """Key of a checkpoint shard in the state store
+
+        Args:
+            run_id (str): Id of the run
+            index (int): Index of the shard
+
+        Returns:
+            str: Key of the shard
+        """
+        return '{}#{}#{}'.format(CHECKPOINT_KEY, run_id, index)
+
+    def save_shard(self, batch):
+        """Save the progress of a completed batch as a new checkpoint shard
+
+        Whitelisted and stopped instances need nothing after their actions, so only their ids are saved.
+
+        Args:
+            batch (dict): Sorted instances as returned by sort_instances
+        """
+        processed = [instance['InstanceID'] for key in ('whitelist', 'low_use', 'scheduled_for_deletion')
+                     for instance in batch[key]] + list(batch['to_stop'])
+        self.state_store.put(self.shard_key(self.run_id, self.shards), {
+            'processed': processed,
+            'low_use_instances': batch['low_use'],
+            'instances_scheduled_for_deletion': batch['scheduled_for_deletion']
+        })
+        self.shards += 1
+
+    def save_checkpoint(self, phase, capped=False):
+        """Save the progress of the run
+
+        Only the head of the checkpoint is written, the instances of completed batches are in their
+        shards. Batches still in flight have no shard yet and are redone on resume.
+
+        Args:
+            phase (str): Phase to resume from, 'actions' or 'emails'
+            capped (bool): The run stopped at MAX_INVOCATIONS and waits for the next scheduled run
+        """
+        self.state_store.put(CHECKPOINT_KEY, {
+            'run_id': self.run_id,
+            'started_at': self.started_at,
+            'invocation': self.invocation,
+            'phase': phase,
+            'shards': self.shards,
+            'advance_lifecycle': self.advance_lifecycle,
+            'summary': self.summary,
+            'next_due_at': self.next_due_at,
+            'capped': capped
+        })
+
+    def delete_checkpoint(self, checkpoint):
+        """Remove a checkpoint and its shards
+
+        Args:
+            checkpoint (dict): Checkpoint as saved by save_checkpoint
+        """
+        for index in range(checkpoint.get('shards', 0)):
+            self.state_store.delete(self.shard_key(checkpoint['run_id'], index))
+        self.state_store.delete(CHECKPOINT_KEY)
+
+    def check_summary(self):
+        """Decide what a new run does from the Low Use check summary
+
+        Refreshes the check first in refresh mode, so the summary and the report agree. Runs are compared
+        by their number of flagged resources, the summary's timestamp changes with every refresh.
+
+        Returns:
+            str: 'full' if forced, 'incremental' if the number of flagged resources changed or an instance
+                is due, 'skip' if neither
+        """
+        advisor = self.parser.advisor
+        if advisor.refresh:
+            advisor.refresh_low_use_check()
+            advisor.refresh = False
+        try:
+            summary = advisor.get_low_use_summary()
+        except ClientError as e:
+            logger.warning('Could not get the Low Use check summary: %s', e)
+            summary = None
+        if summary is not None:
+            self.summary = {'timestamp': summary.get('timestamp'),
+                            'resourcesSummary': summary.get('resourcesSummary')}
+        if (self.event or {}).get('force'):
+            return 'full'
+        record = self.state_store.get(SUMMARY_KEY)
+        if record is None or 'next_due_at' not in record:
+            return 'incremental'
+        if self.summary is None or self.flagged_count(self.summary) != self.flagged_count(record['summary']):
+            return 'incremental'
+        if record['next_due_at'] is not None and time.time() >= record['next_due_at'] - LIFECYCLE_TOLERANCE:
+            return 'incremental'
+        return 'skip'
+
+    @staticmethod
+    def flagged_count(summary):
+        """Number of flagged resources in a check summary
+
+        Args:
+            summary (dict): Check summary as kept by check_summary, may be None
+
+        Returns:
+            int: Number of flagged resources, None if unknown
+        """
+        return ((summary or {}).get('resourcesSummary') or {}).get('resourcesFlagged')
+
+    def save_summary(self):
+        """Record the summary this run worked from, and when the next flagged instance is due"""
+        self.state_store.put(SUMMARY_KEY, {'summary': self.summary, 'next_due_at': self.next_due_at})
+
+    def plan(self):
+        """Plan the run without executing it
+
+        Checks the summary and fetches and classifies the report like a normal run, with reads only:
+        the Trusted Advisor check is not refreshed, nothing is tagged, written, stopped or sent, and
+        nothing is saved in the state store. Then logs every intended action and the estimated API
+        calls, run time and invocations.
+
+        Returns:
+            dict: Summary of the plan, see RunPlan.summary, with the mode of the run
+        """
+        invocation_seconds = None
+        if self.context is not None:
+            invocation_seconds = max(0, self.context.get_remaining_time_in_millis() - TIME_SAFETY_MARGIN_MS) / 1000
+        advisor = self.parser.advisor
+        run_plan = RunPlan(self.dynamo, refresh=advisor.refresh)
+        advisor.refresh = False
+        mode = self.check_summary()
+        self.advance_lifecycle = mode == 'full'
+        logger.info('PLAN Low Use check summary %s, %s run', self.summary, mode)
+        if mode != 'skip':
+            if DYNAMO_PRELOAD:
+                self.dynamo.preload()
+            for batch in self.sorted_batches():
+                run_plan.add_batch(batch, self.instance_regions)
+        try:
+            send_rate, remaining = self.ses.get_send_quota()
+        except ClientError as e:
+            logger.warning('Could not get SES quota: %s', e)
+            send_rate, remaining = None, None
+        summary = run_plan.summary(send_rate, remaining, invocation_seconds)
+        summary['mode'] = mode
+        for tag_write in summary['actions']['tag_writes']:
+            logger.info('PLAN tag %s with %s=%s', tag_write['InstanceID'], tag_write['Key'], tag_write['Value'])
+        for table_name, items in summary['actions']['dynamo_puts'].items():
+            for item in items:
+                logger.info('PLAN put %s in %s', item, table_name)
+        for table_name, instance_ids in summary['actions']['dynamo_deletes'].items():
+            for instance_id in instance_ids:
+                logger.info('PLAN delete %s from %s', instance_id, table_name)
+        for region, instance_ids in summary['actions']['stops'].items():
+            logger.info('PLAN stop %d instances in %s: %s', len(instance_ids), region, instance_ids)
+        logger.info('PLAN email reports to %s and the admin report', summary['actions']['emails'])
+        logger.info('PLAN API calls: %s', json.dumps(summary['api_calls'], sort_keys=True))
+        logger.info('PLAN estimated seconds: %s over %d invocations',
+                    json.dumps(summary['estimated_seconds'], sort_keys=True), summary['invocations'])
+        for warning in summary['warnings']:
+            logger.warning('PLAN %s', warning)
+        return summary
+
+    def reinvoke(self):
+        """Hand the rest of the run over to a new asynchronous invocation of this function"""
+        if self.invocation >= MAX_INVOCATIONS:
+            logger.error('Run %s reached %d invocations, the next scheduled run resumes it',
+                         self.run_id, self.invocation)
+            self.save_checkpoint('actions', capped=True)
+            return
+        logger.info('Out of time, continuing run %s in a new invocation', self.run_id)
+        get_client(self.session, 'lambda').invoke(
+            FunctionName=self.context.invoked_function_arn,
+            InvocationType='Event',
+            Payload=json.dumps({'run_id': self.run_id})
+        )
+
+    def index_by_creator(self, report_key, instance):
+        """Add an instance to its creator's report
+
+        Args:
+            report_key (str): Section of the report, 'low_use' or 'scheduled_for_deletion'
+            instance (dict): Sorted instance and associated metadata
+        """
+        creator = instance['Creator']
+        if creator not in self.creator_reports:
+            self.creator_reports[creator] = {
+                'creator': creator,
+                'low_use': [],
+                'scheduled_for_deletion': []
+            }
+        self.creator_reports[creator][report_key].append(instance)
 
     def get_creator_report(self):
         """Generates creator reports
 
-        Generates a new report for each creator with associated low use instances
+        Generates a new report for each creator with associated low use or scheduled for deletion
+        instances. Reports come from the index built by sort_instances; if the lists were filled
+        some other way, the index is built from them in one pass first.
 
         Yields:
             dict: creator report for each creator with associated low use instances
         """
-        all_creators = set([instance['Creator'] for instance in self.low_use_instances])
-        logger.info(all_creators)
-        for creator in all_creators:
-            yield {
-                'creator': creator,
-                'low_use': [instance for instance in self.low_use_instances if instance['Creator'] == creator],
-                'scheduled_for_deletion': [instance for instance in self.instances_scheduled_for_deletion if instance['Creator'] == creator]
-            }
+        if not self.creator_reports:
+            for instance in self.low_use_instances:
+                self.index_by_creator('low_use', instance)
+            for instance in self.instances_scheduled_for_deletion:
+                self.index_by_creator('scheduled_for_deletion', instance)
+        logger.info(list(self.creator_reports))
+        for creator_report in self.creator_reports.values():
+            yield creator_report
+
+    def load_index(self):
+        """Preload the Dynamo index once per run
+
+        The tables are scanned on the run's first invocation only. A resumed invocation reuses the index
+        kept by a warm container, which write-through kept current, and otherwise reads the items it needs
+        directly instead of scanning both tables again.
+        """
+        if _run_index.get('run_id') == self.run_id:
+            self.dynamo.index = _run_index['index']
+        elif self.invocation == 1:
+            _run_index.clear()
+            _run_index.update(run_id=self.run_id, index=self.dynamo.preload())
+        else:
+            logger.info('Invocation %d of run %s reads Dynamo without a preloaded index',
+                        self.invocation, self.run_id)
 
     def start(self):
         """Lambda entry point
 
         This is where the Lambda invocation starts. It parses the low use reports, sorts the instances
-        and sends creator/admin email reports.
+        and sends creator/admin email reports. A run that does not finish within the invocation is
+        continued by a new invocation from its checkpoint.
+
+        Returns:
+            dict: The plan in plan mode, None otherwise
         """
-        report = self.parser.parse_low_use_report()
-        self.sort_instances(report)
-        self.sync()
+        if PLAN_MODE or (self.event or {}).get('plan'):
+            return self.plan()
+        phase = self.load_checkpoint()
+        if phase is None:
+            return
+        if self.invocation == 1 and not self.processed:
+            mode = self.check_summary()
+            logger.info('Low Use check summary %s, %s run', self.summary, mode)
+            if mode == 'skip':
+                return
+            self.advance_lifecycle = mode == 'full'
+        if phase == 'actions':
+            # Saved before any batch, so the invocation count is kept and a reinvoked run finds its checkpoint
+            self.save_checkpoint('actions')
+            if DYNAMO_PRELOAD:
+                self.load_index()
+            if not self.run_pipeline():
+                self.reinvoke()
+                return
+            self.save_checkpoint('emails')
+
+        delivery = self.ses.send_low_use_emails(self.get_creator_report())
+        self.log_delivery(delivery)
 
-        if self.instances_to_stop != []:
-            logger.warning("Stopping the following instances: %s", self.instances_to_stop)
-            self.ec2.stop_instances(self.instances_to_stop)
-            self.dynamo.batch_delete_item_from_low_use(self.instances_to_stop)
-        
-        for creator_report_data in self.get_creator_report():
-            response = self.ses.send_low_use_email(creator_report_data['creator'], creator_report_data['low_use'], creator_report_data['scheduled_for_deletion'])
-    
         response = self.ses.send_admin_report(self.low_use_instances, self.instances_scheduled_for_deletion)
         logger.info(response)
+        logger.info('Tag cache: %s', self.tag_cache.stats())
+        self.save_summary()
+        self.delete_checkpoint({'run_id': self.run_id, 'shards': self.shards})
         
         
     
+@emit_metrics
 def lambda_handler(event, context):
     """Lambda handler
 
@@ -5,29 +5,36 @@ This module is deployed as a Lambda function within an AWS Environment. This fun
 tagging AutoScaling Groups at creation with the email associated with the account creating the group. It
 also tags the group's instances and ensures future instances will inherit the tags. 
 
+The boto3 Session and clients are created on the first invocation and kept at module level, so warm
+invocations skip creating them. Init time is published as a Cold or Warm metric through util.metrics.
+
 Note:
     The function expects specific AWS Event Data, passed through the event parameter. It supports one event referring
     to the creation of an AutoScaling Group:
         * CreateAutoScalingGroup
 """
 
-import boto3
 import os
+import time
 from tagger.parser.asg_event import AutoScalingEventParser
-from util.aws import ASGWrapper
+from util.aws import ASGWrapper, get_session
+from util.metrics import METRICS, emit_metrics
 import logging
 
 logging.basicConfig()
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
+# False until the first invocation of this container has initialized a tagger
+_warm = False
+
 
 class ASGTagger:
     """Class used to tag AutoScaling Groups and it's instances
 
     Attributes:
         region (str): AWS Region the Lambda resides in
-        session (obj): boto3 object for AWS Session
+        session (obj): boto3 object for AWS Session, reused by every invocation of a warm container
         ec2 (obj): abstracts AWS ASG calls via ASGWrapper
         event (dict): event object passed by lambda_handler
         context (dict): context object passed by lambda_handler
@@ -36,13 +43,20 @@ class ASGTagger:
     """
 
     def __init__(self, event, context):
+        global _warm
+        init_start = time.perf_counter()
         self.region = os.environ['AWS_REGION']
-        self.session = boto3.Session(region_name=self.region)
+        self.session = get_session(self.region)
         self.asg = ASGWrapper(self.session)
         self.event = event
         self.context = context
         self.parser = AutoScalingEventParser(
             self.session, self.event, self.context)
+        init_ms = (time.perf_counter() - init_start) * 1000
+        container = 'Warm' if _warm else 'Cold'
+        METRICS.record_timing('ASGTagger.Init' + container, init_ms)
+        logger.info('ASGTagger initialized in %.1f ms (%s container)', init_ms, container.lower())
+        _warm = True
 
     def start(self):
         """Tagger entry point
@@ -66,6 +80,7 @@ class ASGTagger:
         return self.asg.create_or_update_tags(Tags=[tag])
 
 
+@emit_metrics
 def lambda_handler(event, context):
     """Lambda entry point
 
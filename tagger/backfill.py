@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+"""Creator tag backfill module
+
+This module is deployed as a Lambda function within an AWS Environment. The taggers only tag resources created
+after LUAU is deployed, so older resources have no Creator tag and are never reported. This function tags them.
+
+For every region, in parallel, it lists the instances, volumes, AMIs and security groups without a Creator tag,
+then walks the CloudTrail event history of their creation events (RunInstances, CreateVolume, CreateImage,
+CreateSecurityGroup) to find who created them. CloudTrail events are parsed with the tagger's event registry.
+Instances launched by an ASG get the Creator tag of their group. Resolved resources are tagged in batched
+CreateTags calls, one creator at a time.
+
+Progress (which event history page each region reached) is checkpointed in the state store. When the invocation
+is about to time out it saves its checkpoint and re-invokes itself, so a large account is backfilled over several
+invocations. Resources tagged by an earlier invocation are no longer untagged and are not looked at again.
+Once complete, invocations do nothing unless the event has a 'restart' key.
+
+Note:
+    CloudTrail only keeps 90 days of event history, resources created earlier cannot be resolved and are counted
+    as unresolved.
+"""
+
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from tagger.parser import registry
+from util.aws import ASGWrapper, EC2Wrapper, get_client, get_session, CREATE_TAGS_MAX_RESOURCES, MAX_REGION_WORKERS
+from util.metrics import emit_metrics
+from util.state import get_state_store
+from util.throttle import RateLimiter
+
+logging.basicConfig()
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Key of the backfill checkpoint in the state store
+CHECKPOINT_KEY = 'TaggerBackfill'
+# Regions to backfill, comma separated, defaults to the Lambda's region
+BACKFILL_REGIONS = [region for region in os.environ.get('BACKFILL_REGIONS', '').split(',') if region]
+# Creation events looked up in CloudTrail, in order
+BACKFILL_EVENTS = ['RunInstances', 'CreateVolume', 'CreateImage', 'CreateSecurityGroup']
+# CloudTrail allows 2 LookupEvents calls per second per region
+LOOKUP_EVENTS_RATE = 2
+# Stop looking up events and hand over to a new invocation below this much remaining time
+TIME_SAFETY_MARGIN_MS = int(os.environ.get('TIME_SAFETY_MARGIN_MS', 60 * 1000))
+# Max number of invocations a single backfill may span, guards against re-invoking forever
+MAX_INVOCATIONS = 20
+
+
+class Backfiller:
+    """Tags resources created before LUAU was deployed with their creator
+
+    Attributes:
+        region (str): AWS Region the Lambda resides in
+        session (obj): Boto3 AWS Session Object
+        event (dict): Event dictionary passed by Lambda trigger
+        context (dict): Context dictionary passed by Lambda trigger
+        regions (:obj:`list` of :obj:`str`): Regions to backfill
+        state_store (obj): Store holding the backfill checkpoint
+        progress (dict): Progress of each region keyed by region, see new_progress
+        invocation (int): Number of this invocation within the backfill
+    """
+    def __init__(self, event, context):
+        self.region = os.environ['AWS_REGION']
+        self.session = get_session(self.region)
+        self.event = event
+        self.context = context
+        self.regions = BACKFILL_REGIONS or [self.region]
+        self.state_store = get_state_store(self.session)
+        self.progress = {}
+        self.invocation = 1
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def new_progress():
+        """Progress of a region that has not been started
+
+        Returns:
+            dict: Index in BACKFILL_EVENTS of the event being looked up, CloudTrail token of its next
+                page, whether the region is done, and counts of tagged and unresolved resources
+        """
+        return {'event': 0, 'token': None, 'done': False, 'tagged': 0, 'unresolved': 0}
+
+    def start(self):
+        """Backfill entry point
+
+        Returns:
+            dict: Progress of each region, and whether the backfill is complete
+        """
+        checkpoint = self.state_store.get(CHECKPOINT_KEY)
+        if checkpoint is not None and (self.event or {}).get('restart'):
+            logger.info('Discarding the backfill checkpoint and starting over')
+            checkpoint = None
+        if checkpoint is not None:
+            self.progress = checkpoint['progress']
+            self.invocation = checkpoint['invocation'] + 1
+        regions = [region for region in self.regions if not self.progress.get(region, {}).get('done')]
+        for region in regions:
+            self.progress.setdefault(region, self.new_progress())
+        if regions:
+            logger.info('Backfilling %s (invocation %d)', regions, self.invocation)
+            with ThreadPoolExecutor(max_workers=min(len(regions), MAX_REGION_WORKERS)) as executor:
+                list(executor.map(self.backfill_region, regions))
+
+        complete = all(self.progress[region]['done'] for region in self.regions)
+        self.save_checkpoint()
+        if not complete:
+            self.reinvoke()
+        logger.info('Backfill %s: %s', 'complete' if complete else 'incomplete', json.dumps(self.progress))
+        return {'complete': complete, 'progress': self.progress}
+
+    def out_of_time(self):
+        """Check if the invocation is about to time out
+
+        Returns:
+            bool: True if less than TIME_SAFETY_MARGIN_MS remain, always False outside Lambda
+        """
+        if self.context is None:
+            return False
+        return self.context.get_remaining_time_in_millis() < TIME_SAFETY_MARGIN_MS
+
+    def save_checkpoint(self):
+        """Save the progress of every region"""
+        with self._lock:
+            self.state_store.put(CHECKPOINT_KEY, {'invocation': self.invocation, 'progress': self.progress})
+
+    def reinvoke(self):
+        """Hand the rest of the backfill over to a new asynchronous invocation of this function"""
+        if self.context is None:
+            return
+        if self.invocation >= MAX_INVOCATIONS:
+            logger.error('Backfill reached %d invocations, resume it manually', self.invocation)
+            return
+        logger.info('Out of time, continuing the backfill in a new invocation')
+        get_client(self.session, 'lambda').invoke(
+            FunctionName=self.context.invoked_function_arn,
+            InvocationType='Event',
+            Payload=json.dumps({'backfill': True})
+        )
+
+    def backfill_region(self, region):
+        """Tag the untagged resources of a region, resuming from its progress
+
+        Args:
+            region (str): Name of the region
+        """
+        progress = self.progress[region]
+        ec2 = EC2Wrapper(self.session, region_name=region)
+        untagged = ec2.get_untagged_resources('Creator')
+        logger.info('%d untagged resources in %s', len(untagged), region)
+        pending = {}
+
+        asg = ASGWrapper(get_session(region))
+        for resource_id, tags in list(untagged.items()):
+            asg_name = tags.get('aws:autoscaling:groupName')
+            creator = asg.get_asg_creator(asg_name) if asg_name else None
+            if creator is not None:
+                pending.setdefault(creator, []).append(resource_id)
+                del untagged[resource_id]
+
+        limiter = RateLimiter(LOOKUP_EVENTS_RATE)
+        while untagged and progress['event'] < len(BACKFILL_EVENTS):
+            if self.out_of_time():
+                break
+            event_name = BACKFILL_EVENTS[progress['event']]
+            limiter.acquire()
+            details, progress['token'] = self.lookup_events(region, event_name, progress['token'])
+            for detail in details:
+                username, resource_ids, _ = registry.parse(detail)
+                if username == 'None':
+                    continue
+                for resource_id in resource_ids:
+                    if untagged.pop(resource_id, None) is not None:
+                        pending.setdefault(username, []).append(resource_id)
+            if progress['token'] is None:
+                progress['event'] += 1
+            if sum(len(resource_ids) for resource_ids in pending.values()) >= CREATE_TAGS_MAX_RESOURCES:
+                progress['tagged'] += self.tag_creators(ec2, pending)
+                pending = {}
+
+        progress['tagged'] += self.tag_creators(ec2, pending)
+        if not untagged or progress['event'] >= len(BACKFILL_EVENTS):
+            progress['done'] = True
+            progress['unresolved'] = len(untagged)
+            logger.info('Backfilled %s: %d tagged, %d unresolved', region, progress['tagged'], len(untagged))
+        self.save_checkpoint()
+
+    def lookup_events(self, region, event_name, token=None):
+        """Get one page of a region's CloudTrail history for an event
+
+        Args:
+            region (str): Name of the region
+            event_name (str): Name of the event
+            token (str, optional): Token of the page, the newest events if not given
+
+        Returns:
+            :obj:`list` of :obj:`dict`: The events of the page, as event details
+            str: Token of the next page, None if this was the last page
+        """
+        kwargs = {'LookupAttributes': [{'AttributeKey': 'EventName', 'AttributeValue': event_name}]}
+        if token is not None:
+            kwargs['NextToken'] = token
+        response = get_client(self.session, 'cloudtrail', region_name=region).lookup_events(**kwargs)
+        details = [json.loads(event['CloudTrailEvent']) for event in response['Events']]
+        return details, response.get('NextToken')
+
+    def tag_creators(self, ec2, resources_by_creator):
+        """Tag resources with their creator, in batched CreateTags calls
+
+        Args:
+            ec2 (obj): EC2Wrapper of the resources' region
+            resources_by_creator (dict): Resource ids keyed by creator
+
+        Returns:
+            int: Number of resources tagged
+        """
+        tagged = 0
+        for creator, resource_ids in resources_by_creator.items():
+            failed = ec2.create_tags_in_chunks(resource_ids, [{'Key': 'Creator', 'Value': creator}])
+            tagged += len(set(resource_ids)) - len(failed)
+        return tagged
+
+
+@emit_metrics
+def lambda_handler(event, context):
+    """Lambda entry point
+
+    Args:
+        event (dict): Event dictionary passed by AWS
+        context (dict): Context dictionary passed by AWS
+
+    Returns:
+        dict: Progress of each region, and whether the backfill is complete
+    """
+    return Backfiller(event, context).start()
@@ -4,45 +4,71 @@
 This module is deployed as a Lambda function within an AWS Environment. This function is responsible for
 tagging EC2 instances/resources at creation with the email associated with the account creating the instance/resource.
 
+In batch mode the function consumes SQS batches of those events (EventBridge -> SQS -> Lambda). Resource ids
+are coalesced by creator so each creator gets one CreateTags call per batch, and only the events that could not
+be parsed or tagged are reported back to SQS for redelivery.
+
+The boto3 Session and clients are created on the first invocation and kept at module level, so warm
+invocations skip creating them. Init time is published as a Cold or Warm metric through util.metrics.
+
 Note:
-    The function expects specific AWS Event Data, passed through the event parameter. It supports four events, each
-    referring to a supported resource:
-        * RunInstances
-        * CreateSecurityGroup
-        * CreateVolume
-        * CreateImage
+    The function expects specific AWS Event Data, passed through the event parameter. The supported events are
+    declared in tagger.parser.registry, which also says which service (EC2, ELBv2 or RDS) tags their resources.
 """
 
 
-import boto3
+import json
 import os
+import time
+from botocore.exceptions import ClientError
 from tagger.parser.ec2_event import EC2EventParser
-from util.aws import EC2Wrapper
+from util.aws import EC2Wrapper, ELBv2Wrapper, RDSWrapper, get_session, CREATE_TAGS_MAX_RESOURCES, \
+    THROTTLING_ERROR_CODES
+from util.metrics import METRICS, emit_metrics
 import logging
 
 logging.basicConfig()
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
+
+# Wrapper class tagging the resources of each registry service, all share the create_tags signature
+TAGGER_WRAPPERS = {
+    'ec2': EC2Wrapper,
+    'elbv2': ELBv2Wrapper,
+    'rds': RDSWrapper
+}
+
+# False until the first invocation of this container has initialized a tagger
+_warm = False
  
 class EC2Tagger:
     """Class used to tag EC2 Resources
 
     Attributes:
         region (str): AWS Region the Lambda resides in
-        session (obj): boto3 object for AWS Session
+        session (obj): boto3 object for AWS Session, reused by every invocation of a warm container
         ec2 (obj): abstracts AWS EC2 calls via EC2Wrapper
+        wrappers (dict): Wrapper tagging the resources of each service, keyed by service
         event (dict): event object passed by lambda_handler
         context (dict): context object passed by lambda_handler
         parser (obj): Class used to parse the event dictionary
 
     """
     def __init__(self, event, context):
+        global _warm
+        init_start = time.perf_counter()
         self.region = os.environ['AWS_REGION']
-        self.session = boto3.Session(region_name=self.region)
+        self.session = get_session(self.region)
         self.ec2 = EC2Wrapper(self.session)
+        self.wrappers = {'ec2': self.ec2}
         self.event = event
         self.context = context
         self.parser = EC2EventParser(self.session, self.event, self.context)
+        init_ms = (time.perf_counter() - init_start) * 1000
+        container = 'Warm' if _warm else 'Cold'
+        METRICS.record_timing('EC2Tagger.Init' + container, init_ms)
+        logger.info('EC2Tagger initialized in %.1f ms (%s container)', init_ms, container.lower())
+        _warm = True
 
     def start(self):
         """Tagger entry point
@@ -50,32 +76,140 @@ class EC2Tagger:
         This method is called by the lambda handler. It parses the event and tags the appropriate resources.
 
         Returns:
-            dict: Response from AWS CreateTags API Call
+            dict: Response from the AWS tagging API Call (CreateTags for EC2 resources), None if
+            the event created nothing to tag
 
         """
-        username, resource_ids = self.parser.parse_event()
+        username, resource_ids, service = self.parser.parse_resources()
+        if service is None or not resource_ids:
+            logger.warning('Nothing to tag in %s event', self.parser.get_event_name())
+            return None
+        if username is None:
+            # Launched by an ASG that has no Creator tag (yet)
+            logger.warning('No creator for %s, not tagging %s', self.parser.get_event_name(), resource_ids)
+            return None
         username_tag = {
             'Key': 'Creator',
             'Value': username
         }
-        return self.ec2.create_tags(
+        return self.get_wrapper(service).create_tags(
             Resources=resource_ids,
             Tags=[username_tag]
         )
 
+    def get_wrapper(self, service):
+        """Get the wrapper tagging the resources of a service
+
+        Args:
+            service (str): Service from the event registry (ec2, elbv2, rds)
+
+        Returns:
+            obj: Wrapper with a create_tags method, created on first use
+        """
+        if service not in self.wrappers:
+            self.wrappers[service] = TAGGER_WRAPPERS[service](self.session)
+        return self.wrappers[service]
+
+    def start_batch(self):
+        """Batch entry point
+
+        Parses every SQS record of the event as an EC2 event, then tags the resources of each
+        creator with as few tagging calls as possible.
+
+        Returns:
+            dict: batchItemFailures listing the message ids SQS should redeliver
+        """
+        failures = []
+        entries_by_creator = {}
+        for record in self.event['Records']:
+            message_id = record['messageId']
+            try:
+                event = json.loads(record['body'])
+                username, resource_ids, service = EC2EventParser(
+                    self.session, event, self.context).parse_resources()
+            except Exception as e:
+                logger.error('Could not parse message %s: %s', message_id, e)
+                failures.append(message_id)
+                continue
+            if username is None or not resource_ids:
+                logger.warning('Nothing to tag in message %s', message_id)
+                continue
+            entries_by_creator.setdefault((service, username), []).append((message_id, resource_ids))
+
+        for (service, creator), entries in entries_by_creator.items():
+            for chunk in self.chunk_entries(entries):
+                failures.extend(self.tag_entries(creator, chunk, service))
+        logger.info('Tagged %d of %d messages', len(self.event['Records']) - len(failures), len(self.event['Records']))
+        return {'batchItemFailures': [{'itemIdentifier': message_id} for message_id in failures]}
+
+    def chunk_entries(self, entries):
+        """Split a creator's messages into chunks that fit in one CreateTags call
+
+        A message is never split across chunks, so a failed call maps back to whole messages.
+
+        Args:
+            entries (:obj:`list` of :obj:`tuple`): Message id and resource ids of each message
+
+        Returns:
+            :obj:`list` of :obj:`list`: Chunks of entries, each with at most CREATE_TAGS_MAX_RESOURCES resource ids
+        """
+        chunks = []
+        chunk = []
+        size = 0
+        for message_id, resource_ids in entries:
+            if chunk and size + len(resource_ids) > CREATE_TAGS_MAX_RESOURCES:
+                chunks.append(chunk)
+                chunk = []
+                size = 0
+            chunk.append((message_id, resource_ids))
+            size += len(resource_ids)
+        if chunk:
+            chunks.append(chunk)
+        return chunks
+
+    def tag_entries(self, creator, entries, service='ec2'):
+        """Tag the resources of some messages with their creator in one tagging call
+
+        One missing resource (not visible yet, or already deleted) fails the whole call, so a failed
+        chunk is bisected until the failing messages are isolated and every other message is tagged.
+        A throttled call is not split, SQS redelivers its messages instead.
+
+        Args:
+            creator (str): Creator of every resource in the entries
+            entries (:obj:`list` of :obj:`tuple`): Message id and resource ids of each message
+            service (str): Service tagging the resources (ec2, elbv2, rds)
+
+        Returns:
+            :obj:`list` of :obj:`str`: Ids of the messages that could not be tagged
+        """
+        resource_ids = list(dict.fromkeys(resource_id for _, ids in entries for resource_id in ids))
+        try:
+            self.get_wrapper(service).create_tags(Resources=resource_ids, Tags=[{'Key': 'Creator', 'Value': creator}])
+        except ClientError as e:
+            if len(entries) == 1 or e.response['Error']['Code'] in THROTTLING_ERROR_CODES:
+                logger.error('Could not tag %s with creator %s: %s', resource_ids, creator, e)
+                return [message_id for message_id, _ in entries]
+            middle = len(entries) // 2
+            return (self.tag_entries(creator, entries[:middle], service) +
+                    self.tag_entries(creator, entries[middle:], service))
+        return []
+
 
+@emit_metrics
 def lambda_handler(event, context):
     """Lambda entry point
     
     This is the handler associated with this lambda function. It instantiates a new EC2Tagger and passes
-    down the event data.
+    down the event data. SQS batches (events with Records) are processed in batch mode.
 
     Args:
         event (dict): Event dictionary passed by AWS
         context (dict): Context dictionary passed by AWS (not used but required by AWS)
     
     Returns:
-        dict: Response from AWS CreateTags API Call
+        dict: Response from the AWS tagging API Call, or the batchItemFailures of an SQS batch
     """
+    if 'Records' in event:
+        return EC2Tagger(event, context).start_batch()
     return EC2Tagger(event, context).start()
 
@@ -3,12 +3,8 @@
 This module parses the AWS Event dictionary for EC2 Events to return needed data.
 
 Note:
-    The module expects specific AWS Event Data, passed through the event parameter. It supports four events, each
-    referring to a supported resource:
-        * RunInstances
-        * CreateSecurityGroup
-        * CreateVolume
-        * CreateImage
+    The module expects specific AWS Event Data, passed through the event parameter. The supported events, and
+    where their resource ids are found, are declared in tagger.parser.registry.
 
 """
 
@@ -18,6 +14,8 @@ import boto3
 
 from util.aws import ASGWrapper, EC2Wrapper
 from .base_event import AWSEventParser
+from . import registry
+from .registry import EVENT_REGISTRY
 
 logging.basicConfig()
 logger = logging.getLogger()
@@ -55,27 +53,40 @@ class EC2EventParser(AWSEventParser):
     def get_resource_ids(self, event_name):
         """Gets the ids of created resources
 
-        This function merely returns a different part of the event depending upon
-        the specific event type being processed.
+        The location of the ids in the event is looked up in the event registry.
 
         Args:
             event_name (str): Corresponds to the name of the AWS Event
         
         Returns:
-            list: List of resource ids from the event
+            list: List of resource ids from the event, empty for an unsupported event
 
         """
-        response = self.event['detail']['responseElements']
-        if event_name == 'CreateImage':
-            return [response['imageId']]
-        elif event_name == 'RunInstances':
-            return self.get_created_instance_ids()
-        elif event_name == 'CreateSecurityGroup':
-            return [response['groupId']]
-        elif event_name == 'CreateVolume':
-            return [response['volumeId']]
-        else:
+        resource_event = EVENT_REGISTRY.get(event_name)
+        if resource_event is None:
             return []
+        return resource_event.get_resource_ids(self.event['detail'])
+
+    def get_instance_tags(self):
+        """Gets the tags of created instances that are in the event
+
+        Instances launched by an ASG from a launch template carry the aws:autoscaling:groupName tag
+        in the event, which saves looking the group up.
+
+        Returns:
+            dict: Tag values keyed by tag key
+        """
+        tags = {}
+        detail = self.event['detail']
+        tag_specifications = (detail.get('requestParameters') or {}).get('tagSpecificationSet') or {}
+        for tag_specification in tag_specifications.get('items', []):
+            if tag_specification.get('resourceType') == 'instance':
+                for tag in tag_specification.get('tags', []):
+                    tags[tag['key']] = tag['value']
+        for instance in (detail.get('responseElements') or {}).get('instancesSet', {}).get('items', []):
+            for tag in (instance.get('tagSet') or {}).get('items', []):
+                tags[tag['key']] = tag['value']
+        return tags
 
     def invoked_by_asg(self):
         """Determines if the event was invoked by an ASG
@@ -100,15 +111,23 @@ class EC2EventParser(AWSEventParser):
             list: ids of the created resources. 
 
         """
-        event_name = self.get_event_name()
-        resource_ids = self.get_resource_ids(event_name)
-
-        # If the instance was created by an AutoScaling Group, we need to check the ASG tags for the user email
-        if event_name == 'RunInstances' and self.invoked_by_asg():
-            username = ASGWrapper(self.session).get_asg_user_tag_by_instance_id(
-                self.get_created_instance_ids())
-        else:
-            username = self.get_username()
+        username, resource_ids, _ = self.parse_resources()
         return username, resource_ids
 
-    
\ No newline at end of file
+    def parse_resources(self):
+        """Parses the event dictionary, including the service that tags the created resources
+
+        Returns:
+            str: The user email (or username) associated with the created resources
+            list: ids of the created resources
+            str: Service tagging the resources (ec2, elbv2, rds), None for an unsupported event
+
+        """
+        username, resource_ids, service = registry.parse(self.event['detail'])
+
+        # If the instance was created by an AutoScaling Group, we need to check the ASG tags for the user email
+        if self.get_event_name() == 'RunInstances' and self.invoked_by_asg():
+            tags = self.get_instance_tags()
+            username = tags.get('Creator') or ASGWrapper(self.session).get_creator_by_instance_id(
+                self.get_created_instance_ids(), asg_name=tags.get('aws:autoscaling:groupName'))
+        return username, resource_ids, service
@@ -0,0 +1,145 @@
+"""Event Registry module
+
+This module declares every AWS API event the EC2 tagger handles: where the ids of the created resources
+and the identity of the creator are found in the event, and which service tags them. The parser, the
+tagger and the EventBridge pattern in resources/sam.yaml (see bin/sync_event_pattern.py) are all driven
+by EVENT_REGISTRY, so supporting a new resource type only means adding an entry here.
+
+Paths are written as dotted keys, `[]` marks a list whose items are all visited
+(`responseElements.instancesSet.items[].instanceId`). They are compiled once, at import.
+
+Attributes:
+    ALL_ITEMS (obj): Path step visiting every item of a list.
+    IDENTITY_PATHS (:obj:`list` of :obj:`tuple`): Compiled paths of the creator's username, first match wins.
+    EVENT_REGISTRY (dict): ResourceEvent keyed by event name.
+"""
+
+ALL_ITEMS = object()
+
+
+def compile_path(path):
+    """Compile a dotted path into a tuple of steps
+
+    Args:
+        path (str): Dotted path, `[]` after a key visits every item of its list
+
+    Returns:
+        tuple: Keys to follow, ALL_ITEMS where every item of a list is visited
+    """
+    steps = []
+    for key in path.split('.'):
+        if key.endswith('[]'):
+            steps.extend([key[:-2], ALL_ITEMS])
+        else:
+            steps.append(key)
+    return tuple(steps)
+
+
+def extract(value, path):
+    """Get the values a compiled path leads to
+
+    Missing keys and empty values are skipped rather than raised, an event without the
+    expected response simply has nothing to extract.
+
+    Args:
+        value (obj): Part of the event the path starts from
+        path (tuple): Compiled path
+
+    Returns:
+        list: Values found at the end of the path
+    """
+    values = [value]
+    for step in path:
+        found = []
+        for current in values:
+            if step is ALL_ITEMS:
+                if isinstance(current, list):
+                    found.extend(current)
+            elif isinstance(current, dict) and current.get(step) is not None:
+                found.append(current[step])
+        values = found
+    return values
+
+
+IDENTITY_PATHS = [compile_path('userIdentity.userName')]
+
+
+class ResourceEvent:
+    """An event creating resources the tagger tags
+
+    Attributes:
+        source (str): EventBridge source of the event
+        service (str): Service whose tagging API tags the resources (ec2, elbv2, rds)
+        paths (:obj:`list` of :obj:`tuple`): Compiled paths of the resource ids in the event detail
+    """
+    def __init__(self, source, service, *paths):
+        self.source = source
+        self.service = service
+        self.paths = [compile_path(path) for path in paths]
+
+    def get_resource_ids(self, detail):
+        """Get the ids of the created resources
+
+        Args:
+            detail (dict): Detail of the event
+
+        Returns:
+            :obj:`list` of :obj:`str`: Ids (or ARNs) of the created resources
+        """
+        return [resource_id for path in self.paths for resource_id in extract(detail, path)]
+
+
+EVENT_REGISTRY = {
+    'RunInstances': ResourceEvent('aws.ec2', 'ec2', 'responseElements.instancesSet.items[].instanceId'),
+    'CreateImage': ResourceEvent('aws.ec2', 'ec2', 'responseElements.imageId'),
+    'CreateSecurityGroup': ResourceEvent('aws.ec2', 'ec2', 'responseElements.groupId'),
+    'CreateVolume': ResourceEvent('aws.ec2', 'ec2', 'responseElements.volumeId'),
+    'CreateSnapshot': ResourceEvent('aws.ec2', 'ec2', 'responseElements.snapshotId'),
+    'CopySnapshot': ResourceEvent('aws.ec2', 'ec2', 'responseElements.snapshotId'),
+    'CreateNetworkInterface': ResourceEvent('aws.ec2', 'ec2', 'responseElements.networkInterface.networkInterfaceId'),
+    'AllocateAddress': ResourceEvent('aws.ec2', 'ec2', 'responseElements.allocationId'),
+    'CreateLaunchTemplate': ResourceEvent(
+        'aws.ec2', 'ec2', 'responseElements.CreateLaunchTemplateResponse.launchTemplate.launchTemplateId'),
+    # Classic load balancers have no ARN in the response, only ELBv2 ones are tagged
+    'CreateLoadBalancer': ResourceEvent('aws.elasticloadbalancing', 'elbv2',
+                                        'responseElements.loadBalancers[].loadBalancerArn'),
+    'CreateDBInstance': ResourceEvent('aws.rds', 'rds', 'responseElements.dBInstanceArn'),
+}
+
+
+def parse(detail):
+    """Extract everything the tagger needs from an event
+
+    Args:
+        detail (dict): Detail of the event
+
+    Returns:
+        str: Username of the creator, 'None' if the event has none
+        :obj:`list` of :obj:`str`: Ids of the created resources, empty for an unsupported event
+        str: Service tagging the resources, None for an unsupported event
+    """
+    username = 'None'
+    for path in IDENTITY_PATHS:
+        found = extract(detail, path)
+        if found:
+            username = found[0]
+            break
+    resource_event = EVENT_REGISTRY.get(detail.get('eventName'))
+    if resource_event is None:
+        return username, [], None
+    return username, resource_event.get_resource_ids(detail), resource_event.service
+
+
+def event_pattern():
+    """Build the EventBridge pattern matching every registered event
+
+    Returns:
+        dict: Event pattern with the registered sources and event names
+    """
+    return {
+        'source': sorted(set(resource_event.source for resource_event in EVENT_REGISTRY.values())),
+        'detail': {
+            'eventType': ['AwsApiCall'],
+            'eventName': list(EVENT_REGISTRY)
+        }
+    }
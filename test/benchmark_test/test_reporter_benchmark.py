@@ -0,0 +1,247 @@
+"""End to end benchmarks of LowUseReporter.start against a synthetic fleet
+
+Skipped unless LUAU_BENCHMARK=1. Fleet sizes come from LUAU_BENCH_SIZES (comma separated, defaults to
+100,1000) and results are written as JSON to LUAU_BENCH_OUTPUT (defaults to benchmark_results.json).
+moto is slow at scale (1000 instances take about 100 seconds), so larger fleets are opt in.
+
+The LowUse and Whitelist tables are seeded to match the lifecycle tags of the fleet, as a previous run
+would have left them, so the preload and the unchanged writes it skips are measured. Every size is run
+twice: a full run, then a run against the same check summary, which is skipped. For both runs the
+wall time, peak traced memory (moto's in-memory backends included) and the AWS API calls per operation
+are recorded.
+
+moto 3.1, the version pinned in requirements.txt, does not return per-destination statuses from
+SendBulkTemplatedEmail, so creator reports are sent with individual SendTemplatedEmail calls here.
+"""
+
+import json
+import os
+import platform
+import tempfile
+import time
+import tracemalloc
+import unittest
+from functools import partial
+from unittest.mock import MagicMock, patch
+import boto3
+from moto import mock_dynamodb2, mock_ec2, mock_ses
+from low_use.reporter import LowUseReporter, LIFECYCLE_INTERVAL
+from util.aws import DynamoWrapper
+from util.metrics import METRICS
+from util.state import FileStateStore
+
+BENCHMARK = os.environ.get('LUAU_BENCHMARK') == '1'
+BENCH_SIZES = [int(size) for size in os.environ.get('LUAU_BENCH_SIZES', '100,1000').split(',')]
+BENCH_OUTPUT = os.environ.get('LUAU_BENCH_OUTPUT', 'benchmark_results.json')
+REGION = 'us-west-2'
+# Instances per creator, and share of the fleet already in each lifecycle state
+INSTANCES_PER_CREATOR = 20
+LIFECYCLE_MIX = [
+    ({}, 0.6),
+    ({'Low Use': 'true'}, 0.2),
+    ({'Scheduled For Deletion': 'true'}, 0.1),
+    ({'Whitelisted': 'true', 'Reason': 'benchmark'}, 0.1)
+]
+RUN_INSTANCES_CHUNK_SIZE = 500
+SES_EMAIL = 'luau@example.com'
+ADMIN_EMAIL = 'admin@example.com'
+SUMMARY = {'timestamp': '2026-10-01T00:00:00Z', 'resourcesSummary': {'resourcesFlagged': 0}}
+
+
+def flagged_resource(instance_id):
+    """Build a Trusted Advisor Low Use flagged resource for an instance
+
+    Args:
+        instance_id (str): ID of the Instance
+
+    Returns:
+        dict: Flagged resource as returned by DescribeTrustedAdvisorCheckResult
+    """
+    metadata = ['%sa' % REGION, instance_id, 'benchmark', 't2.micro', '$1.00'] + \
+        ['0.1%  0.00 MB'] * 14 + ['0.1%', '0.00 MB', '14 days']
+    return {'status': 'warning', 'region': REGION, 'resourceId': instance_id, 'metadata': metadata}
+
+
+def create_fleet(session, size):
+    """Launch a synthetic fleet in moto, spread across creators and lifecycle states
+
+    Args:
+        session (obj): Boto3 AWS Session Object
+        size (int): Number of instances
+
+    Returns:
+        :obj:`list` of :obj:`dict`: Flagged resources of every instance
+        dict: Tags of every instance keyed by instance id
+    """
+    ec2 = session.client('ec2')
+    image_id = ec2.describe_images()['Images'][0]['ImageId']
+    counts = [int(size * share) for _, share in LIFECYCLE_MIX]
+    counts[0] += size - sum(counts)
+    launched = 0
+    for (lifecycle_tags, _), count in zip(LIFECYCLE_MIX, counts):
+        while count > 0:
+            # Keep every call within one creator's share of the fleet
+            chunk = min(count, RUN_INSTANCES_CHUNK_SIZE, INSTANCES_PER_CREATOR - launched % INSTANCES_PER_CREATOR)
+            creator = 'creator%d@example.com' % (launched // INSTANCES_PER_CREATOR)
+            tags = [{'Key': 'Creator', 'Value': creator}] + \
+                [{'Key': key, 'Value': value} for key, value in lifecycle_tags.items()]
+            ec2.run_instances(ImageId=image_id, MinCount=chunk, MaxCount=chunk, InstanceType='t2.micro',
+                              TagSpecifications=[{'ResourceType': 'instance', 'Tags': tags}])
+            launched += chunk
+            count -= chunk
+    instance_tags = {}
+    for page in ec2.get_paginator('describe_instances').paginate():
+        for reservation in page['Reservations']:
+            for instance in reservation['Instances']:
+                instance_tags[instance['InstanceId']] = {tag['Key']: tag['Value'] for tag in instance.get('Tags', [])}
+    return [flagged_resource(instance_id) for instance_id in instance_tags], instance_tags
+
+
+def create_tables(session):
+    """Create the LowUse and Whitelist tables in moto
+
+    Args:
+        session (obj): Boto3 AWS Session Object
+    """
+    dynamo = session.resource('dynamodb')
+    for table_name in ('LowUse', 'Whitelist'):
+        dynamo.create_table(
+            TableName=table_name,
+            KeySchema=[{'AttributeName': 'InstanceID', 'KeyType': 'HASH'}],
+            AttributeDefinitions=[{'AttributeName': 'InstanceID', 'AttributeType': 'S'}],
+            ProvisionedThroughput={'ReadCapacityUnits': 2, 'WriteCapacityUnits': 2}
+        )
+
+
+def seed_tables(session, instance_tags):
+    """Fill the LowUse and Whitelist tables as a previous run would have left them
+
+    Flagged instances entered their stage one LIFECYCLE_INTERVAL ago, so they are all due.
+
+    Args:
+        session (obj): Boto3 AWS Session Object
+        instance_tags (dict): Tags of every instance keyed by instance id
+    """
+    dynamo = DynamoWrapper(session)
+    flagged_at = time.time() - LIFECYCLE_INTERVAL
+    with dynamo.low_use.batch_writer() as low_use, dynamo.whitelist.batch_writer() as whitelist:
+        for instance_id, tags in instance_tags.items():
+            creator = tags['Creator']
+            if tags.get('Whitelisted') == 'true':
+                whitelist.put_item(Item=dynamo.whitelist_item(instance_id, creator, tags['Reason']))
+            elif tags.get('Scheduled For Deletion') == 'true':
+                low_use.put_item(Item=dynamo.scheduled_for_deletion_item(instance_id, creator, flagged_at))
+            elif tags.get('Low Use') == 'true':
+                low_use.put_item(Item=dynamo.low_use_item(instance_id, creator, flagged_at))
+
+
+def create_templates(session):
+    """Create the SES templates and verify the sender in moto
+
+    Args:
+        session (obj): Boto3 AWS Session Object
+    """
+    ses = session.client('ses')
+    ses.verify_email_identity(EmailAddress=SES_EMAIL)
+    ses.verify_email_identity(EmailAddress=ADMIN_EMAIL)
+    for template_file in ('low_use_report.json', 'admin_report.json'):
+        with open(os.path.join('resources', 'templates', template_file)) as f:
+            template = json.load(f)
+        template['HtmlPart'] = ''.join(template['HtmlPart'])
+        template['TextPart'] = ''.join(template['TextPart'])
+        ses.create_template(Template=template)
+
+
+@unittest.skipUnless(BENCHMARK, 'Set LUAU_BENCHMARK=1 to run the benchmarks')
+class TestLowUseReporterBenchmark(unittest.TestCase):
+    results = {}
+
+    @classmethod
+    def tearDownClass(cls):
+        with open(BENCH_OUTPUT, 'w') as f:
+            json.dump({
+                'python': platform.python_version(),
+                'timestamp': int(time.time()),
+                'results': cls.results
+            }, f, indent=2, sort_keys=True)
+
+    @patch('util.aws.ADMIN_EMAIL', ADMIN_EMAIL)
+    @patch('util.aws.SES_EMAIL', SES_EMAIL)
+    @mock_ses
+    @mock_dynamodb2
+    @mock_ec2
+    def run_benchmark(self, size):
+        os.environ['AWS_REGION'] = REGION
+        session = boto3.Session(region_name=REGION)
+        report, instance_tags = create_fleet(session, size)
+        create_tables(session)
+        seed_tables(session, instance_tags)
+        create_templates(session)
+
+        state_directory = tempfile.TemporaryDirectory()
+        self.addCleanup(state_directory.cleanup)
+        state_path = os.path.join(state_directory.name, 'state.json')
+        result = self.measure(self.new_reporter(report, state_path))
+        result['instances'] = size
+        result['unchanged'] = self.measure(self.new_reporter(report, state_path))
+        return result
+
+    @staticmethod
+    def new_reporter(report, state_path):
+        """Build a reporter reading the synthetic report, sharing its state file with earlier runs
+
+        Args:
+            report (:obj:`list` of :obj:`dict`): Flagged resources of every instance
+            state_path (str): Path of the state file
+
+        Returns:
+            obj: The reporter
+        """
+        reporter = LowUseReporter(None, None)
+        reporter.state_store = FileStateStore(state_path)
+        reporter.parser.advisor = MagicMock(refresh=False)
+        reporter.parser.advisor.get_low_use_instances.return_value = report
+        reporter.parser.advisor.get_low_use_summary.return_value = SUMMARY
+        reporter.ses.send_low_use_emails = partial(reporter.ses.send_low_use_emails, bulk=False)
+        return reporter
+
+    @staticmethod
+    def measure(reporter):
+        """Run a reporter and record its wall time, peak memory, API calls and sorted instances
+
+        Args:
+            reporter (obj): The reporter
+
+        Returns:
+            dict: Measurements of the run
+        """
+        METRICS.reset()
+        tracemalloc.start()
+        start = time.perf_counter()
+        reporter.start()
+        wall_seconds = time.perf_counter() - start
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        api_calls = {'%s.%s' % key: {'calls': stats.calls, 'errors': stats.errors, 'throttles': stats.throttles}
+                     for key, stats in sorted(METRICS.operations.items())}
+        METRICS.reset()
+        return {
+            'wall_seconds': round(wall_seconds, 3),
+            'peak_memory_bytes': peak_memory,
+            'api_calls': api_calls,
+            'sorted': {
+                'low_use': len(reporter.low_use_instances),
+                'scheduled_for_deletion': len(reporter.instances_scheduled_for_deletion),
+                'processed': len(reporter.processed)
+            }
+        }
+
+    def test_start(self):
+        for size in BENCH_SIZES:
+            with self.subTest(size=size):
+                result = self.run_benchmark(size)
+                self.results[str(size)] = result
+                self.assertEqual(result['sorted']['processed'], size)
+                self.assertEqual(result['unchanged']['sorted']['processed'], 0)
+                self.assertIn('dynamodb.Scan', result['api_calls'])
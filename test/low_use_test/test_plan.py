@@ -0,0 +1,80 @@
+import unittest
+import boto3
+from low_use.plan import RunPlan
+from util.aws import DynamoWrapper
+
+
+class TestRunPlan(unittest.TestCase):
+    def setUp(self):
+        self.dynamo = DynamoWrapper(boto3.Session(region_name='us-west-2'))
+        self.batch = {
+            'whitelist': [{'InstanceID': 'test_id_1', 'Creator': 'test1', 'Reason': 'test_reason'}],
+            'low_use': [{'InstanceID': 'test_id_%d' % i, 'Creator': 'test2'} for i in range(2, 32)],
+            'scheduled_for_deletion': [{'InstanceID': 'test_id_32', 'Creator': 'test3'}],
+            'to_stop': ['test_id_33', 'test_id_34']
+        }
+        self.regions = {'test_id_33': 'us-west-2', 'test_id_34': 'us-east-1'}
+
+    def test_api_calls(self):
+        plan = RunPlan(self.dynamo)
+        plan.add_batch(self.batch, self.regions)
+
+        api_calls = plan.api_calls(bulk=True)
+        # One call per region and tag key
+        self.assertEqual(api_calls['ec2']['CreateTags'], 2)
+        self.assertEqual(api_calls['ec2']['StopInstances'], 2)
+        # Whitelist puts (1), LowUse puts (31 -> 2 calls), LowUse deletes (3)
+        self.assertEqual(api_calls['dynamodb']['BatchWriteItem'], 4)
+        self.assertEqual(api_calls['ses'], {'GetSendQuota': 1, 'SendTemplatedEmail': 1, 'SendBulkTemplatedEmail': 1})
+        self.assertEqual(plan.stops, {'us-west-2': ['test_id_33'], 'us-east-1': ['test_id_34']})
+        # Checkpoint and summary bookkeeping of one batch in the state table
+        self.assertEqual(api_calls['dynamodb']['GetItem'], 2)
+        self.assertEqual(api_calls['dynamodb']['PutItem'], 5)
+        self.assertEqual(api_calls['dynamodb']['DeleteItem'], 2)
+        self.assertEqual(api_calls['lambda'], {})
+
+    def test_api_calls_over_several_invocations(self):
+        self.dynamo.index = {'Whitelist': {}, 'LowUse': {}}
+        self.dynamo.scan_calls = 8
+        plan = RunPlan(self.dynamo, refresh=True)
+        plan.add_batch(self.batch, self.regions)
+        plan.add_batch(self.batch, self.regions)
+
+        api_calls = plan.api_calls(invocations=3)
+        self.assertEqual(api_calls['dynamodb']['Scan'], 8)
+        self.assertEqual(api_calls['dynamodb']['GetItem'], 8)
+        self.assertEqual(api_calls['dynamodb']['PutItem'], 9)
+        self.assertEqual(api_calls['lambda'], {'Invoke': 2})
+        self.assertEqual(api_calls['support'], {'DescribeTrustedAdvisorCheckSummaries': 1,
+                                                'RefreshTrustedAdvisorCheck': 1})
+
+    def test_preloaded_index_skips_unchanged_writes(self):
+        self.dynamo.index = {
+            'Whitelist': {'test_id_1': self.dynamo.whitelist_item('test_id_1', 'test1', 'test_reason')},
+            'LowUse': {'test_id_33': self.dynamo.scheduled_for_deletion_item('test_id_33', 'test4')}
+        }
+        plan = RunPlan(self.dynamo)
+        plan.add_batch(self.batch, self.regions)
+
+        self.assertEqual(plan.dynamo_puts['Whitelist'], [])
+        self.assertEqual(plan.dynamo_deletes['LowUse'], ['test_id_33'])
+
+    def test_summary(self):
+        plan = RunPlan(self.dynamo)
+        plan.add_batch(self.batch, self.regions)
+
+        summary = plan.summary(send_rate=2.0, remaining=3)
+        self.assertEqual(summary['actions']['emails'], ['test2', 'test3'])
+        self.assertEqual(summary['estimated_seconds']['emails'], 1.5)
+        self.assertEqual(summary['warnings'], [])
+        self.assertEqual(summary['invocations'], 1)
+        self.assertEqual(plan.summary(send_rate=2.0, remaining=2)['warnings'], ['SES quota allows 2 of 3 emails'])
+
+    def test_summary_invocations(self):
+        plan = RunPlan(DynamoWrapper(boto3.Session(region_name='us-west-2'), write_rate=1.0))
+        plan.add_batch(self.batch, self.regions)
+
+        # 35 item writes at 1 per second, and 8 seconds of stop polls
+        estimate = plan.estimate_seconds(2.0, write_rate=1.0)
+        self.assertEqual(plan.invocations(estimate, invocation_seconds=20), 3)
+        self.assertEqual(plan.invocations(estimate), 1)
@@ -0,0 +1,32 @@
+import unittest
+import boto3
+from unittest.mock import MagicMock
+from low_use.report_parser import LowUseReportParser
+
+
+class TestLowUseReportParser(unittest.TestCase):
+    def setUp(self):
+        self.session = boto3.Session(region_name='us-west-2')
+        self.parser = LowUseReportParser(self.session)
+        self.metadata = ['us-west-2', 'test_id', 'test_name', 't2.micro', '$1.00'] + \
+            ['0.1%  0.00 MB'] * 14 + ['0.1%', '0.00 MB', '14 days']
+
+    def test_parse_metadata(self):
+        instance_states = {'test_id': {'Creator': 'test_creator'}}
+        instance_metadata = self.parser.parse_metadata(self.metadata, instance_states)
+        self.assertEqual(instance_metadata['creator'], 'test_creator')
+        self.assertEqual(instance_metadata['region'], 'us-west-2')
+        self.assertEqual(instance_metadata['instance_id'], 'test_id')
+        self.assertEqual(instance_metadata['cpu_usage'], ['0.1%'] * 14)
+        self.assertEqual(instance_metadata['days_logged'], 14)
+
+    def test_parse_metadata_without_creator(self):
+        self.assertEqual(self.parser.parse_metadata(self.metadata, {}), {})
+
+    def test_load_instance_states_from_tags(self):
+        parser = LowUseReportParser(self.session, state_source='describe_tags')
+        ec2 = MagicMock()
+        ec2.get_lifecycle_tags.return_value = {'test_id': {'Creator': 'test_creator'}}
+        states = parser.load_instance_states(ec2, [{'metadata': self.metadata}])
+        self.assertEqual(states, {'test_id': {'Creator': 'test_creator'}})
+        ec2.get_lifecycle_tags.assert_called_once_with(['test_id'])
@@ -1,9 +1,14 @@
 import unittest
+from unittest.mock import MagicMock, patch
 import boto3
+import tempfile
 from moto import mock_dynamodb2, mock_ec2
 from low_use.reporter import LowUseReporter
 from util.aws import EC2Wrapper, DynamoWrapper
+from util.state import FileStateStore
+import json
 import os
+import time
 
 
 class TestLowUseReporter(unittest.TestCase):
@@ -16,6 +21,9 @@ class TestLowUseReporter(unittest.TestCase):
 
         os.environ['AWS_REGION'] = 'us-west-2'
         self.reporter = LowUseReporter(None, None)
+        self.state_directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.state_directory.cleanup)
+        self.reporter.state_store = FileStateStore(self.state_directory.name + '/state.json')
         self.maxDiff = None
         self.dynamo_resource = boto3.resource(
             'dynamodb', region_name='us-west-2')
@@ -35,14 +43,6 @@ class TestLowUseReporter(unittest.TestCase):
                     'AttributeName': 'InstanceID',
                     'AttributeType': 'S'
                 },
-                {
-                    'AttributeName': 'Creator',
-                    'AttributeType': 'S'
-                },
-                {
-                    'AttributeName': 'Reason',
-                    'AttributeType': 'S'
-                },
 
             ],
             ProvisionedThroughput={
@@ -63,14 +63,6 @@ class TestLowUseReporter(unittest.TestCase):
                     'AttributeName': 'InstanceID',
                     'AttributeType': 'S'
                 },
-                {
-                    'AttributeName': 'Creator',
-                    'AttributeType': 'S'
-                },
-                {
-                    'AttributeName': 'Scheduled For Deletion',
-                    'AttributeType': 'S'
-                },
 
             ],
             ProvisionedThroughput={
@@ -114,10 +106,12 @@ class TestLowUseReporter(unittest.TestCase):
             'InstanceID': instance,
             'Creator': 'test_creator',
             'Scheduled For Deletion': False,
-            'EmailSent': False
+            'EmailSent': False,
+            'FlaggedAt': 1000
         }
 
-        self.reporter.low_use_instances.append(test_item)
+        self.reporter.started_at = 1000.5
+        self.reporter.low_use_instances.append({'InstanceID': instance, 'Creator': 'test_creator'})
         self.reporter.sync_low_use_instances()
         item = self.lowuse_table.get_item(Key={'InstanceID': instance})['Item']
         self.assertDictEqual(test_item, item)
@@ -133,14 +127,28 @@ class TestLowUseReporter(unittest.TestCase):
             'InstanceID': instance,
             'Creator': 'test_creator',
             'Scheduled For Deletion': True,
+            'FlaggedAt': 1000
         }
 
-        self.reporter.instances_scheduled_for_deletion.append(test_item)
+        self.reporter.started_at = 1000.5
+        self.reporter.instances_scheduled_for_deletion.append({'InstanceID': instance, 'Creator': 'test_creator'})
         self.reporter.sync_instances_scheduled_for_deletion()
         item = self.lowuse_table.get_item(Key={'InstanceID': instance})['Item']
         self.assertDictEqual(test_item, item)
         self.assertTrue(self.wrapper.is_scheduled_for_deletion(instance))
 
+    @mock_ec2
+    def test_tag_instances(self):
+        instances = [instance['InstanceId'] for instance in
+                     self.wrapper.ec2.run_instances(MaxCount=3, MinCount=3)['Instances']]
+        for instance_id in instances:
+            self.reporter.instance_regions[instance_id] = 'us-west-2'
+        with patch.object(EC2Wrapper, 'create_tags', autospec=True, side_effect=EC2Wrapper.create_tags) as create_tags:
+            self.reporter.tag_instances(instances, 'Low Use')
+        self.assertEqual(create_tags.call_count, 1)
+        for instance_id in instances:
+            self.assertTrue(self.wrapper.is_low_use(instance_id))
+
     @mock_dynamodb2
     @mock_ec2
     def test_flag_instances_as_low_use(self):
@@ -154,8 +162,10 @@ class TestLowUseReporter(unittest.TestCase):
             'EmailSent': False
         }
 
+        flagged_after = int(time.time())
         self.reporter.flag_instance_as_low_use(instance, 'test_creator')
         item = self.lowuse_table.get_item(Key={'InstanceID': instance})['Item']
+        self.assertTrue(flagged_after <= item.pop('FlaggedAt') <= time.time())
         self.assertDictEqual(test_item, item)
         self.assertTrue(self.wrapper.is_low_use(instance))
 
@@ -171,8 +181,10 @@ class TestLowUseReporter(unittest.TestCase):
             'Scheduled For Deletion': True,
         }
 
+        flagged_after = int(time.time())
         self.reporter.flag_instance_for_deletion(instance, 'test_creator')
         item = self.lowuse_table.get_item(Key={'InstanceID': instance})['Item']
+        self.assertTrue(flagged_after <= item.pop('FlaggedAt') <= time.time())
         self.assertDictEqual(test_item, item)
         self.assertTrue(self.wrapper.is_scheduled_for_deletion(instance))
 
@@ -285,5 +297,264 @@ class TestLowUseReporter(unittest.TestCase):
         result = list(self.reporter.get_creator_report())
         self.assertCountEqual(expected_creator_reports, result)
 
+    def test_get_creator_report_scheduled_for_deletion_only(self):
+        self.reporter.instances_scheduled_for_deletion = [
+            {
+                'Creator': 'test1',
+                'InstanceID': 'test_id_1_delete'
+            }
+        ]
+
+        expected_creator_reports = [
+            {
+                'creator': 'test1',
+                'low_use': [],
+                'scheduled_for_deletion': [{
+                    'Creator': 'test1',
+                    'InstanceID': 'test_id_1_delete'
+                }]}
+        ]
+        result = list(self.reporter.get_creator_report())
+        self.assertEqual(expected_creator_reports, result)
+
+    def test_run_pipeline(self):
+        batches = [
+            ([{'instance_id': 'test_id_1', 'creator': 'test1', 'region': 'us-west-2'}],
+                {'test_id_1': {}}),
+            ([{'instance_id': 'test_id_2', 'creator': 'test2', 'region': 'us-west-2'},
+                {'instance_id': 'test_id_3', 'creator': 'test2', 'region': 'us-west-2'}],
+                {'test_id_2': {'Scheduled For Deletion': 'true'}, 'test_id_3': {'Whitelisted': 'true'}})
+        ]
+        self.reporter.parser.iter_low_use_report = MagicMock(return_value=iter(batches))
+        self.reporter.act_on_batch = MagicMock()
+
+        self.reporter.run_pipeline()
+
+        acted = [call[0][0] for call in self.reporter.act_on_batch.call_args_list]
+        self.assertEqual([instance['InstanceID'] for instance in acted[0]['low_use']], ['test_id_1'])
+        self.assertEqual(acted[1]['to_stop'], ['test_id_2'])
+        self.assertEqual([instance['InstanceID'] for instance in acted[1]['whitelist']], ['test_id_3'])
+        self.assertEqual(self.reporter.instances_to_stop, [])
+        self.assertEqual(self.reporter.whitelist, [])
+        self.assertEqual(self.reporter.instance_regions, {})
+        self.assertEqual(self.reporter.processed, {'test_id_1', 'test_id_2', 'test_id_3'})
+        self.assertEqual([report['creator'] for report in self.reporter.get_creator_report()], ['test1'])
+
+    def test_run_pipeline_resumes_from_checkpoint(self):
+        batches = [
+            ([{'instance_id': 'test_id_1', 'creator': 'test1', 'region': 'us-west-2'}], {'test_id_1': {}}),
+            ([{'instance_id': 'test_id_2', 'creator': 'test2', 'region': 'us-west-2'}], {'test_id_2': {}})
+        ]
+        store = self.reporter.state_store
+        self.reporter.parser.iter_low_use_report = MagicMock(return_value=iter(batches))
+        self.reporter.act_on_batch = MagicMock()
+        self.reporter.context = MagicMock()
+        # Enough time for the first batch only
+        self.reporter.context.get_remaining_time_in_millis.side_effect = [300000, 1000, 1000]
+        self.assertEqual(self.reporter.load_checkpoint(), 'actions')
+
+        self.assertFalse(self.reporter.run_pipeline())
+        checkpoint = store.get('LowUseReporter')
+        self.assertEqual(checkpoint['shards'], 1)
+        self.assertEqual(store.get('LowUseReporter#{}#0'.format(checkpoint['run_id']))['processed'], ['test_id_1'])
+
+        resumed = LowUseReporter({'run_id': checkpoint['run_id']}, None)
+        resumed.state_store = store
+        resumed.parser.iter_low_use_report = MagicMock(return_value=iter(batches))
+        resumed.act_on_batch = MagicMock()
+        self.assertEqual(resumed.load_checkpoint(), 'actions')
+        self.assertTrue(resumed.run_pipeline())
+
+        acted = resumed.act_on_batch.call_args_list[0][0][0]
+        self.assertEqual([instance['InstanceID'] for instance in acted['low_use']], ['test_id_2'])
+        self.assertEqual(resumed.invocation, 2)
+        self.assertFalse(resumed.parser.advisor.refresh)
+        self.assertCountEqual([report['creator'] for report in resumed.get_creator_report()], ['test1', 'test2'])
+
+    def test_batch_size_from_time_left(self):
+        self.reporter.dynamo.write_limiter = MagicMock(rate=2.0)
+        self.reporter.context = MagicMock()
+        self.reporter.context.get_remaining_time_in_millis.return_value = 300000
+        # 240 usable seconds at 0.5 seconds per instance, for the in-flight batches and the next one
+        self.assertEqual(self.reporter.batch_size(), 160)
+        self.assertFalse(self.reporter.out_of_time(self.reporter.estimate_seconds(480)))
+        self.assertTrue(self.reporter.out_of_time(self.reporter.estimate_seconds(481)))
+
+        self.reporter.action_seconds, self.reporter.action_instances = 100.0, 100
+        self.assertEqual(self.reporter.batch_size(), 80)
+
+    def test_batch_writes(self):
+        dynamo = self.reporter.dynamo
+        self.reporter.started_at = 1000
+        dynamo.index = {'Whitelist': {'whitelisted': dynamo.whitelist_item('whitelisted', 'test', 'reason')},
+                        'LowUse': {'moved': dynamo.low_use_item('moved', 'test', 1000)}}
+        batch = {
+            'whitelist': [{'InstanceID': 'whitelisted', 'Creator': 'test', 'Reason': 'reason'},
+                          {'InstanceID': 'moved', 'Creator': 'test', 'Reason': 'reason'}],
+            'low_use': [{'InstanceID': 'new', 'Creator': 'test'}],
+            'scheduled_for_deletion': [],
+            'to_stop': ['gone']
+        }
+        # Put and LowUse delete of the newly whitelisted instance, and the new Low Use item
+        self.assertEqual(self.reporter.batch_writes(batch), 3)
+        dynamo.index = None
+        self.assertEqual(self.reporter.batch_writes(batch), 6)
+
+    def test_estimate_seconds_from_needed_writes(self):
+        self.reporter.dynamo.write_limiter = MagicMock(rate=2.0)
+        self.assertEqual(self.reporter.estimate_seconds(100), 50.0)
+        self.assertEqual(self.reporter.estimate_seconds(100, 10), 5.0)
+        self.reporter.action_seconds, self.reporter.action_instances, self.reporter.action_writes = 1.0, 100, 10
+        self.assertEqual(self.reporter.estimate_seconds(100), 5.0)
+
+    def test_start_checkpoints_before_reinvoking(self):
+        reporter = self.summary_reporter()
+        reporter.context = MagicMock(invoked_function_arn='arn')
+        reporter.context.get_remaining_time_in_millis.return_value = 1000
+        reporter.parser.iter_low_use_report = MagicMock(return_value=iter([]))
+        with patch('low_use.reporter.DYNAMO_PRELOAD', False), patch('low_use.reporter.get_client') as get_client:
+            reporter.start()
+        payload = get_client.return_value.invoke.call_args[1]['Payload']
+
+        resumed = LowUseReporter(json.loads(payload), None)
+        resumed.state_store = self.reporter.state_store
+        self.assertEqual(resumed.load_checkpoint(), 'actions')
+        self.assertEqual(resumed.run_id, reporter.run_id)
+        self.assertEqual(resumed.invocation, 2)
+
+    def test_capped_run_resumes_on_next_schedule(self):
+        self.reporter.load_checkpoint()
+        self.reporter.started_at -= 24 * 60 * 60
+        self.reporter.invocation = 10
+        self.reporter.reinvoke()
+
+        resumed = LowUseReporter(None, None)
+        resumed.state_store = self.reporter.state_store
+        self.assertEqual(resumed.load_checkpoint(), 'actions')
+        self.assertEqual(resumed.run_id, self.reporter.run_id)
+        self.assertEqual(resumed.invocation, 1)
+
+    def test_load_checkpoint_of_finished_run(self):
+        reporter = LowUseReporter({'run_id': 'finished_run'}, None)
+        reporter.state_store = self.reporter.state_store
+        self.assertIsNone(reporter.load_checkpoint())
+
+    def test_load_index_once_per_run(self):
+        index = {'LowUse': {}, 'Whitelist': {}}
+        self.reporter.run_id = 'run_1'
+        self.reporter.dynamo.preload = MagicMock(return_value=index)
+        self.reporter.load_index()
+        self.reporter.dynamo.preload.assert_called_once_with()
+
+        resumed = LowUseReporter(None, None)
+        resumed.run_id, resumed.invocation = 'run_1', 2
+        resumed.dynamo.preload = MagicMock()
+        resumed.load_index()
+        resumed.dynamo.preload.assert_not_called()
+        self.assertIs(resumed.dynamo.index, index)
+
+        resumed.run_id = 'run_2'
+        resumed.dynamo.index = None
+        resumed.load_index()
+        resumed.dynamo.preload.assert_not_called()
+        self.assertIsNone(resumed.dynamo.index)
+
+    def test_start_in_plan_mode(self):
+        batches = [([{'instance_id': 'test_id_1', 'creator': 'test1', 'region': 'us-west-2'}], {'test_id_1': {}})]
+        reporter = LowUseReporter({'plan': True}, None)
+        reporter.state_store = self.reporter.state_store
+        reporter.parser.iter_low_use_report = MagicMock(return_value=iter(batches))
+        reporter.parser.advisor = MagicMock(refresh=True)
+        reporter.parser.advisor.get_low_use_summary.return_value = None
+        reporter.state_store = MagicMock(wraps=reporter.state_store)
+        reporter.dynamo.preload = MagicMock()
+        reporter.ses = MagicMock()
+        reporter.ses.get_send_quota.return_value = (1.0, None)
+        reporter.act_on_batch = MagicMock()
+
+        summary = reporter.start()
+
+        reporter.act_on_batch.assert_not_called()
+        reporter.ses.send_low_use_emails.assert_not_called()
+        self.assertEqual(summary['actions']['tag_writes'],
+                         [{'InstanceID': 'test_id_1', 'Key': 'Low Use', 'Value': 'true'}])
+        self.assertEqual(summary['api_calls']['ec2'], {'CreateTags': 1})
+        self.assertEqual(summary['api_calls']['support']['RefreshTrustedAdvisorCheck'], 1)
+        self.assertEqual(summary['mode'], 'incremental')
+        reporter.parser.advisor.refresh_low_use_check.assert_not_called()
+        reporter.state_store.put.assert_not_called()
+        reporter.state_store.delete.assert_not_called()
+
     def test_start(self):
         pass
+
+    def summary_reporter(self, event=None):
+        reporter = LowUseReporter(event, None)
+        reporter.state_store = self.reporter.state_store
+        reporter.parser.advisor = MagicMock(refresh=False)
+        reporter.parser.advisor.get_low_use_summary.return_value = {
+            'timestamp': '2026-10-01T00:00:00Z',
+            'resourcesSummary': {'resourcesProcessed': 10, 'resourcesFlagged': 2}
+        }
+        return reporter
+
+    def test_check_summary(self):
+        reporter = self.summary_reporter()
+        self.assertEqual(reporter.check_summary(), 'incremental')
+        reporter.next_due_at = time.time() + 24 * 60 * 60
+        reporter.save_summary()
+
+        self.assertEqual(self.summary_reporter().check_summary(), 'skip')
+        # A refresh moves the timestamp, and instances that are not flagged change the processed count
+        refreshed = self.summary_reporter()
+        refreshed.parser.advisor.get_low_use_summary.return_value['timestamp'] = '2026-10-02T00:00:00Z'
+        refreshed.parser.advisor.get_low_use_summary.return_value['resourcesSummary']['resourcesProcessed'] = 11
+        self.assertEqual(refreshed.check_summary(), 'skip')
+        self.assertEqual(self.summary_reporter({'force': True}).check_summary(), 'full')
+        changed = self.summary_reporter()
+        changed.parser.advisor.get_low_use_summary.return_value['resourcesSummary']['resourcesFlagged'] = 3
+        self.assertEqual(changed.check_summary(), 'incremental')
+
+        # Due within the tolerance
+        due = self.summary_reporter()
+        due.state_store.put('LowUseReporterSummary', {'summary': reporter.summary,
+                                                      'next_due_at': time.time() + 30 * 60})
+        self.assertEqual(due.check_summary(), 'incremental')
+
+    def test_start_skips_unchanged_report(self):
+        reporter = self.summary_reporter()
+        reporter.check_summary()
+        reporter.started_at = time.time()
+        reporter.save_summary()
+
+        skipped = self.summary_reporter()
+        skipped.run_pipeline = MagicMock()
+        skipped.ses = MagicMock()
+        skipped.start()
+        skipped.run_pipeline.assert_not_called()
+        skipped.ses.send_low_use_emails.assert_not_called()
+
+    def test_sort_instances_advances_due_instances(self):
+        day = 24 * 60 * 60
+        now = time.time()
+        dynamo = self.reporter.dynamo
+        dynamo.index = {'Whitelist': {}, 'LowUse': {
+            'low_use': dynamo.low_use_item('low_use', 'test', now - 6 * day),
+            'low_use_due': dynamo.low_use_item('low_use_due', 'test', now - 7 * day + 30 * 60),
+            'scheduled': dynamo.scheduled_for_deletion_item('scheduled', 'test', now - 3 * day),
+            'scheduled_due': dynamo.scheduled_for_deletion_item('scheduled_due', 'test', now - 8 * day),
+            'legacy': {'InstanceID': 'legacy', 'Creator': 'test', 'Scheduled For Deletion': False}
+        }}
+        instances = [{'instance_id': instance_id, 'creator': 'test'} for instance_id in
+                     ('new', 'low_use', 'low_use_due', 'scheduled', 'scheduled_due', 'legacy')]
+        states = {'low_use': {'Low Use': 'true'}, 'low_use_due': {'Low Use': 'true'}, 'legacy': {'Low Use': 'true'},
+                  'scheduled': {'Scheduled For Deletion': 'true'}, 'scheduled_due': {'Scheduled For Deletion': 'true'}}
+        self.reporter.advance_lifecycle = False
+        self.reporter.started_at = now
+        batch = self.reporter.sort_instances(instances, states)
+        self.assertEqual([instance['InstanceID'] for instance in batch['low_use']], ['new'])
+        self.assertEqual([instance['InstanceID'] for instance in batch['scheduled_for_deletion']],
+                         ['low_use_due', 'legacy'])
+        self.assertEqual(batch['to_stop'], ['scheduled_due'])
+        # The instance flagged 6 days ago is the next one due
+        self.assertEqual(self.reporter.next_due_at, int(now - 6 * day) + 7 * day)
@@ -2,6 +2,8 @@ import unittest
 import boto3
 from moto import mock_ec2
 import json
+from mock import patch
+from util.aws import ASGWrapper
 from tagger.parser.ec2_event import EC2EventParser
 
 
@@ -152,3 +154,21 @@ class TestEC2EventParser(unittest.TestCase):
         expected_response = ('sahajsoft', ['i-092a8256362fcb350'])
         self.assertEqual(self.parser.parse_event(), expected_response)
 
+    def test_parse_event_asg(self):
+        event = json.loads(open('./test/example_events/run_instances_from_asg.json').read())
+        self.parser = EC2EventParser(boto3.Session(region_name='us-west-2'), event, None)
+        instance_ids = self.parser.get_created_instance_ids()
+        with patch.object(ASGWrapper, 'get_creator_by_instance_id', return_value='creator') as get_creator:
+            self.assertEqual(self.parser.parse_event(), ('creator', instance_ids))
+        get_creator.assert_called_once_with(instance_ids, asg_name=None)
+
+    def test_parse_event_asg_tags(self):
+        event = json.loads(open('./test/example_events/run_instances_from_asg.json').read())
+        event['detail']['requestParameters']['tagSpecificationSet'] = {'items': [{
+            'resourceType': 'instance',
+            'tags': [{'key': 'aws:autoscaling:groupName', 'value': 'test_asg'}]
+        }]}
+        self.parser = EC2EventParser(boto3.Session(region_name='us-west-2'), event, None)
+        with patch.object(ASGWrapper, 'get_creator_by_instance_id', return_value='creator') as get_creator:
+            self.assertEqual(self.parser.parse_event()[0], 'creator')
+        self.assertEqual(get_creator.call_args[1], {'asg_name': 'test_asg'})
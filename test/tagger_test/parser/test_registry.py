@@ -0,0 +1,54 @@
+import unittest
+import importlib.util
+from tagger.parser.registry import ALL_ITEMS, EVENT_REGISTRY, compile_path, extract, parse, event_pattern
+
+
+def event_detail(event_name, response_elements, username='Test'):
+    return {
+        'eventName': event_name,
+        'userIdentity': {'userName': username},
+        'responseElements': response_elements
+    }
+
+
+class TestRegistry(unittest.TestCase):
+    def test_compile_path(self):
+        self.assertEqual(compile_path('responseElements.imageId'), ('responseElements', 'imageId'))
+        self.assertEqual(compile_path('items[].id'), ('items', ALL_ITEMS, 'id'))
+
+    def test_extract(self):
+        detail = {'items': [{'id': 'a'}, {'id': 'b'}, {'other': 'c'}]}
+        self.assertEqual(extract(detail, compile_path('items[].id')), ['a', 'b'])
+        self.assertEqual(extract(detail, compile_path('missing.id')), [])
+        self.assertEqual(extract({'items': None}, compile_path('items[].id')), [])
+
+    def test_parse(self):
+        cases = [
+            ('CreateSnapshot', {'snapshotId': 'snap-1'}, ['snap-1'], 'ec2'),
+            ('CreateNetworkInterface', {'networkInterface': {'networkInterfaceId': 'eni-1'}}, ['eni-1'], 'ec2'),
+            ('AllocateAddress', {'allocationId': 'eipalloc-1'}, ['eipalloc-1'], 'ec2'),
+            ('CreateLaunchTemplate', {'CreateLaunchTemplateResponse': {'launchTemplate': {'launchTemplateId': 'lt-1'}}},
+             ['lt-1'], 'ec2'),
+            ('CreateLoadBalancer', {'loadBalancers': [{'loadBalancerArn': 'arn:lb/1'}, {'loadBalancerArn': 'arn:lb/2'}]},
+             ['arn:lb/1', 'arn:lb/2'], 'elbv2'),
+            ('CreateDBInstance', {'dBInstanceArn': 'arn:db:1'}, ['arn:db:1'], 'rds'),
+        ]
+        for event_name, response_elements, resource_ids, service in cases:
+            self.assertEqual(parse(event_detail(event_name, response_elements)), ('Test', resource_ids, service))
+
+    def test_parse_unsupported(self):
+        self.assertEqual(parse(event_detail('DeleteVolume', {'volumeId': 'vol-1'})), ('Test', [], None))
+        self.assertEqual(parse({'eventName': 'CreateVolume'}), ('None', [], 'ec2'))
+
+    def test_event_pattern(self):
+        pattern = event_pattern()
+        self.assertEqual(pattern['source'], ['aws.ec2', 'aws.elasticloadbalancing', 'aws.rds'])
+        self.assertEqual(pattern['detail']['eventName'], list(EVENT_REGISTRY))
+
+    def test_template_in_sync(self):
+        spec = importlib.util.spec_from_file_location('sync_event_pattern', './bin/sync_event_pattern.py')
+        sync_event_pattern = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(sync_event_pattern)
+        with open('./resources/sam.yaml') as f:
+            self.assertIn(sync_event_pattern.RULE + '    Type: AWS::Events::Rule\n    Properties:\n' +
+                          sync_event_pattern.render_event_pattern(), f.read())
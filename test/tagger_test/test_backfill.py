@@ -0,0 +1,83 @@
+import unittest
+import tempfile
+import boto3
+import os
+from unittest.mock import MagicMock, patch
+from moto import mock_autoscaling, mock_ec2
+from tagger.backfill import Backfiller, CHECKPOINT_KEY, BACKFILL_EVENTS
+from util.state import FileStateStore
+
+
+def run_instances_detail(username, instance_id):
+    return {
+        'eventName': 'RunInstances',
+        'userIdentity': {'userName': username},
+        'responseElements': {'instancesSet': {'items': [{'instanceId': instance_id}]}}
+    }
+
+
+class TestBackfiller(unittest.TestCase):
+    def setUp(self):
+        os.environ['AWS_REGION'] = 'us-west-2'
+        self.state_directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.state_directory.cleanup)
+        self.state_store = FileStateStore(self.state_directory.name + '/state.json')
+
+    def backfiller(self, context=None):
+        backfiller = Backfiller({}, context)
+        backfiller.state_store = self.state_store
+        return backfiller
+
+    def get_creator(self, ec2, resource_id):
+        tags = ec2.describe_tags(Filters=[{'Name': 'resource-id', 'Values': [resource_id]},
+                                          {'Name': 'key', 'Values': ['Creator']}])['Tags']
+        return tags[0]['Value'] if tags else None
+
+    @mock_autoscaling
+    @mock_ec2
+    def test_start(self):
+        ec2 = boto3.client('ec2', region_name='us-west-2')
+        instance_ids = [i['InstanceId'] for i in ec2.run_instances(MaxCount=3, MinCount=3)['Instances']]
+        ec2.create_tags(Resources=[instance_ids[2]], Tags=[{'Key': 'Creator', 'Value': 'already'}])
+        pages = {
+            None: ([run_instances_detail('first', instance_ids[0])], 'page-2'),
+            'page-2': ([run_instances_detail('second', instance_ids[1]),
+                        run_instances_detail('third', instance_ids[2])], None)
+        }
+        backfiller = self.backfiller()
+        with patch.object(Backfiller, 'lookup_events',
+                          side_effect=lambda region, event_name, token=None: pages[token]
+                          if event_name == 'RunInstances' else ([], None)) as lookup_events:
+            response = backfiller.start()
+
+        self.assertTrue(response['complete'])
+        self.assertEqual(self.get_creator(ec2, instance_ids[0]), 'first')
+        self.assertEqual(self.get_creator(ec2, instance_ids[1]), 'second')
+        self.assertEqual(self.get_creator(ec2, instance_ids[2]), 'already')
+        self.assertEqual(response['progress']['us-west-2']['tagged'], 2)
+        self.assertEqual(lookup_events.call_args_list[1][0], ('us-west-2', 'RunInstances', 'page-2'))
+        self.assertTrue(self.state_store.get(CHECKPOINT_KEY)['progress']['us-west-2']['done'])
+
+    @mock_autoscaling
+    @mock_ec2
+    def test_resume_from_checkpoint(self):
+        ec2 = boto3.client('ec2', region_name='us-west-2')
+        instance_id = ec2.run_instances(MaxCount=1, MinCount=1)['Instances'][0]['InstanceId']
+        context = MagicMock()
+        context.get_remaining_time_in_millis.side_effect = [120000, 0]
+        backfiller = self.backfiller(context)
+        with patch.object(Backfiller, 'lookup_events', return_value=([], 'page-2')), \
+                patch('tagger.backfill.get_client') as get_client:
+            response = backfiller.start()
+        self.assertFalse(response['complete'])
+        get_client.return_value.invoke.assert_called_once()
+        checkpoint = self.state_store.get(CHECKPOINT_KEY)
+        self.assertEqual(checkpoint['progress']['us-west-2']['token'], 'page-2')
+
+        with patch.object(Backfiller, 'lookup_events',
+                          return_value=([run_instances_detail('creator', instance_id)], None)) as lookup_events:
+            response = self.backfiller().start()
+        self.assertEqual(lookup_events.call_args_list[0][0], ('us-west-2', BACKFILL_EVENTS[0], 'page-2'))
+        self.assertEqual(self.get_creator(ec2, instance_id), 'creator')
+        self.assertTrue(response['complete'])
+        self.assertEqual(self.state_store.get(CHECKPOINT_KEY)['invocation'], 2)
@@ -2,9 +2,12 @@ import unittest
 import json
 import boto3
 import os
-from mock import MagicMock
+from mock import MagicMock, patch
 from moto import mock_autoscaling, mock_ec2
-from tagger.ec2_tagger import EC2Tagger
+from botocore.exceptions import ClientError
+from tagger.ec2_tagger import EC2Tagger, lambda_handler
+from util.cache import TTLCache
+from util.metrics import METRICS
 
 class TestEC2Tagger(unittest.TestCase):
     
@@ -21,4 +24,95 @@ class TestEC2Tagger(unittest.TestCase):
         self.tagger = EC2Tagger(self.event, None)
         response = self.tagger.start()
         response_metadata = response['ResponseMetadata']
-        self.assertEqual(response_metadata['HTTPStatusCode'], 200)
\ No newline at end of file
+        self.assertEqual(response_metadata['HTTPStatusCode'], 200)
+
+    @mock_ec2
+    def test_warm_invocation_reuses_session(self):
+        METRICS.reset()
+        first = EC2Tagger(self.event, None)
+        second = EC2Tagger(self.event, None)
+        self.assertIs(first.session, second.session)
+        self.assertIs(first.ec2.ec2, second.ec2.ec2)
+        self.assertIn('EC2Tagger.InitWarm', METRICS.timings)
+        METRICS.reset()
+
+    @mock_ec2
+    def test_start_dispatches_by_service(self):
+        event = json.loads(json.dumps(self.event))
+        event['detail']['eventName'] = 'CreateDBInstance'
+        event['detail']['responseElements'] = {'dBInstanceArn': 'arn:aws:rds:us-west-2:123456789012:db:test'}
+        tagger = EC2Tagger(event, None)
+        rds = MagicMock()
+        tagger.wrappers['rds'] = rds
+        tagger.start()
+        rds.create_tags.assert_called_once_with(Resources=['arn:aws:rds:us-west-2:123456789012:db:test'],
+                                                Tags=[{'Key': 'Creator', 'Value': 'sahajsoft'}])
+
+    @mock_ec2
+    def test_start_unsupported_event(self):
+        event = json.loads(json.dumps(self.event))
+        event['detail']['eventName'] = 'DeleteVolume'
+        self.assertIsNone(EC2Tagger(event, None).start())
+
+    @mock_autoscaling
+    @mock_ec2
+    def test_start_untagged_asg(self):
+        event = json.loads(open('./test/example_events/run_instances_from_asg.json').read())
+        event['detail']['requestParameters']['tagSpecificationSet'] = {'items': [{
+            'resourceType': 'instance',
+            'tags': [{'key': 'aws:autoscaling:groupName', 'value': 'untagged_asg'}]
+        }]}
+        tagger = EC2Tagger(event, None)
+        ec2 = MagicMock()
+        tagger.wrappers['ec2'] = ec2
+        with patch('util.aws._asg_creators', TTLCache()):
+            self.assertIsNone(tagger.start())
+        ec2.create_tags.assert_not_called()
+
+    def sqs_record(self, message_id, username, instance_ids):
+        event = json.loads(json.dumps(self.event))
+        event['detail']['userIdentity']['userName'] = username
+        event['detail']['responseElements']['instancesSet']['items'] = [{'instanceId': i} for i in instance_ids]
+        return {'messageId': message_id, 'body': json.dumps(event)}
+
+    @mock_ec2
+    def test_start_batch(self):
+        batch = {'Records': [
+            self.sqs_record('message_1', 'test1', ['i-1', 'i-2']),
+            self.sqs_record('message_2', 'test2', ['i-3']),
+            self.sqs_record('message_3', 'test1', ['i-4']),
+            {'messageId': 'message_4', 'body': 'not json'}
+        ]}
+        tagger = EC2Tagger(batch, None)
+        tagger.ec2.create_tags = MagicMock()
+
+        response = tagger.start_batch()
+
+        self.assertEqual(response, {'batchItemFailures': [{'itemIdentifier': 'message_4'}]})
+        calls = {call[1]['Tags'][0]['Value']: call[1]['Resources'] for call in tagger.ec2.create_tags.call_args_list}
+        self.assertEqual(calls, {'test1': ['i-1', 'i-2', 'i-4'], 'test2': ['i-3']})
+
+    @mock_ec2
+    def test_start_batch_isolates_failed_messages(self):
+        batch = {'Records': [self.sqs_record('message_%d' % i, 'test1', ['i-%d' % i]) for i in range(4)]}
+        tagger = EC2Tagger(batch, None)
+
+        def create_tags(Resources, Tags):
+            if 'i-2' in Resources:
+                raise ClientError({'Error': {'Code': 'InvalidInstanceID.NotFound'}}, 'CreateTags')
+        tagger.ec2.create_tags = MagicMock(side_effect=create_tags)
+
+        self.assertEqual(tagger.start_batch(), {'batchItemFailures': [{'itemIdentifier': 'message_2'}]})
+
+    def test_chunk_entries(self):
+        tagger = EC2Tagger(self.event, None)
+        entries = [('message_1', ['i-%d' % i for i in range(600)]), ('message_2', ['i-a'] * 500),
+                   ('message_3', ['i-b'])]
+        chunks = tagger.chunk_entries(entries)
+        self.assertEqual([[message_id for message_id, _ in chunk] for chunk in chunks],
+                         [['message_1'], ['message_2', 'message_3']])
+
+    @mock_ec2
+    def test_lambda_handler_batch(self):
+        batch = {'Records': [self.sqs_record('message_1', 'test1', ['i-092a8256362fcb350'])]}
+        self.assertEqual(lambda_handler(batch, None), {'batchItemFailures': []})
@@ -1,7 +1,10 @@
 import unittest
 import boto3
+from mock import patch, MagicMock
 from moto import mock_autoscaling, mock_ec2, mock_dynamodb2, mock_ses
-from util.aws import EC2Wrapper, ASGWrapper
+from util.aws import EC2Wrapper, ASGWrapper, DynamoWrapper, SESWrapper, RegionalEC2Pool, TrustedAdvisor, get_region, get_client, clear_clients
+from botocore.exceptions import ClientError
+from util.cache import TTLCache
 class TestEC2Wrapper(unittest.TestCase):
     @mock_ec2
     def setUp(self):
@@ -104,6 +107,52 @@ class TestEC2Wrapper(unittest.TestCase):
         }]
         self.assertEqual(self.wrapper.get_tags_for_instance(instance), expected)
 
+    @mock_ec2
+    def test_get_tags_for_instances(self):
+        instances = self.wrapper.ec2.run_instances(MaxCount=2, MinCount=2)['Instances']
+        tagged, untagged = [instance['InstanceId'] for instance in instances]
+        self.wrapper.tag_instance(tagged, 'test_key', 'test_value')
+        expected = {
+            tagged: {'test_key': 'test_value'},
+            untagged: {}
+        }
+        self.assertEqual(self.wrapper.get_tags_for_instances([tagged, untagged, 'i-00000000000000000']), expected)
+
+    @mock_ec2
+    def test_tag_cache(self):
+        wrapper = EC2Wrapper(self.session, tag_cache=TTLCache())
+        instance = wrapper.ec2.run_instances(MaxCount=1, MinCount=1)['Instances'][0]['InstanceId']
+        self.assertIsNone(wrapper.get_tag_for_instance(instance, 'test_key'))
+        wrapper.tag_instance(instance, 'test_key', 'test_value')
+        self.assertEqual(wrapper.get_tag_for_instance(instance, 'test_key'), 'test_value')
+        self.assertEqual(wrapper.get_tags_for_instances([instance]), {instance: {'test_key': 'test_value'}})
+        self.assertEqual(wrapper.tag_cache.hits, 2)
+        self.assertEqual(wrapper.tag_cache.misses, 1)
+
+    @mock_ec2
+    def test_get_untagged_resources(self):
+        instances = [i['InstanceId'] for i in self.wrapper.ec2.run_instances(MaxCount=2, MinCount=2)['Instances']]
+        volume = self.wrapper.ec2.create_volume(Size=1, AvailabilityZone='us-west-2a')['VolumeId']
+        self.wrapper.ec2.create_tags(Resources=[instances[0]], Tags=[{'Key': 'Creator', 'Value': 'test'}])
+        untagged = self.wrapper.get_untagged_resources('Creator')
+        self.assertNotIn(instances[0], untagged)
+        self.assertIn(instances[1], untagged)
+        self.assertIn(volume, untagged)
+
+    @mock_ec2
+    def test_get_lifecycle_tags(self):
+        instances = self.wrapper.ec2.run_instances(MaxCount=2, MinCount=2)['Instances']
+        low_use, untagged = [instance['InstanceId'] for instance in instances]
+        self.wrapper.tag_as_low_use(low_use)
+        self.wrapper.tag_instance(low_use, 'Creator', 'test_creator')
+        self.wrapper.tag_instance(low_use, 'test_key', 'test_value')
+        expected = {
+            low_use: {'Low Use': 'true', 'Creator': 'test_creator'}
+        }
+        self.assertEqual(self.wrapper.get_lifecycle_tags(), expected)
+        self.assertEqual(self.wrapper.get_lifecycle_tags([low_use, untagged]), expected)
+        self.assertEqual(self.wrapper.get_lifecycle_tags([untagged]), {})
+
     @mock_ec2
     def test_is_whitelisted(self):
         instance = self.wrapper.ec2.run_instances(MaxCount=1, MinCount=1)['Instances'][0]['InstanceId']
@@ -121,12 +170,91 @@ class TestEC2Wrapper(unittest.TestCase):
         self.wrapper.tag_for_deletion(instance)
         self.assertTrue(self.wrapper.is_scheduled_for_deletion(instance))
 
+    @mock_ec2
+    def test_stop_instances_in_chunks(self):
+        instances = self.wrapper.ec2.run_instances(MaxCount=3, MinCount=3)['Instances']
+        instance_ids = [instance['InstanceId'] for instance in instances]
+        states = self.wrapper.stop_instances_in_chunks(instance_ids + ['i-00000000000000000'], chunk_size=2)
+        self.assertEqual(states['i-00000000000000000'], 'failed')
+        for instance_id in instance_ids:
+            self.assertIn(states[instance_id], ('stopping', 'stopped'))
+
     @mock_ec2
     def test_is_tagged(self):
         instance = self.wrapper.ec2.run_instances(MaxCount=1, MinCount=1)['Instances'][0]['InstanceId']
         self.wrapper.tag_instance(instance, 'test_key', 'true')
         self.assertTrue(self.wrapper.is_tagged(instance, 'test_key'))
 
+class TestCreateTagsInChunks(unittest.TestCase):
+    def setUp(self):
+        self.wrapper = EC2Wrapper(boto3.Session(region_name='us-west-2'))
+        self.wrapper.ec2 = MagicMock()
+
+    def test_create_tags_in_chunks(self):
+        error = ClientError({'Error': {'Code': 'RequestLimitExceeded'}}, 'CreateTags')
+        attempts = {}
+
+        def create_tags(Resources, Tags):
+            attempts[Resources[0]] = attempts.get(Resources[0], 0) + 1
+            if Resources[0] == 'i-4':
+                raise error
+        self.wrapper.ec2.create_tags.side_effect = create_tags
+
+        failed = self.wrapper.create_tags_in_chunks(['i-0', 'i-1', 'i-2', 'i-3', 'i-4'],
+                                                    [{'Key': 'Creator', 'Value': 'test'}], chunk_size=2)
+        self.assertEqual(list(failed), ['i-4'])
+        # Throttled calls are retried by the client, not again per chunk
+        self.assertEqual(attempts, {'i-0': 1, 'i-2': 1, 'i-4': 1})
+
+    def test_create_tags_in_chunks_bisects_invalid_ids(self):
+        error = ClientError({'Error': {'Code': 'InvalidInstanceID.NotFound'}}, 'CreateTags')
+
+        def create_tags(Resources, Tags):
+            if 'i-bad' in Resources:
+                raise error
+        self.wrapper.ec2.create_tags.side_effect = create_tags
+
+        failed = self.wrapper.create_tags_in_chunks(['i-0', 'i-1', 'i-bad', 'i-3', 'i-4'],
+                                                    [{'Key': 'Creator', 'Value': 'test'}])
+        self.assertEqual(list(failed), ['i-bad'])
+        tagged = [resource_id for call in self.wrapper.ec2.create_tags.call_args_list
+                  for resource_id in call[1]['Resources'] if 'i-bad' not in call[1]['Resources']]
+        self.assertCountEqual(tagged, ['i-0', 'i-1', 'i-3', 'i-4'])
+
+    def test_create_tags_in_chunks_does_not_bisect_other_errors(self):
+        error = ClientError({'Error': {'Code': 'UnauthorizedOperation'}}, 'CreateTags')
+        self.wrapper.ec2.create_tags.side_effect = error
+        failed = self.wrapper.create_tags_in_chunks(['i-0', 'i-1', 'i-2'], [{'Key': 'Creator', 'Value': 'test'}])
+        self.assertEqual(list(failed), ['i-0', 'i-1', 'i-2'])
+        self.assertEqual(self.wrapper.ec2.create_tags.call_count, 1)
+
+    def test_create_tags_in_chunks_without_resources(self):
+        self.assertEqual(self.wrapper.create_tags_in_chunks([], [{'Key': 'Creator', 'Value': 'test'}]), {})
+        self.wrapper.ec2.create_tags.assert_not_called()
+
+class TestRegionalEC2Pool(unittest.TestCase):
+    def setUp(self):
+        self.session = boto3.Session(region_name='us-west-2')
+        self.pool = RegionalEC2Pool(self.session)
+
+    def test_get_region(self):
+        self.assertEqual(get_region('us-east-1a'), 'us-east-1')
+        self.assertEqual(get_region('us-gov-west-1'), 'us-gov-west-1')
+        self.assertIsNone(get_region(None))
+
+    def test_get(self):
+        self.assertIs(self.pool.get(), self.pool.get('us-west-2'))
+        self.assertEqual(self.pool.get('eu-west-1').ec2.meta.region_name, 'eu-west-1')
+
+    @mock_ec2
+    def test_map_regions(self):
+        east = self.pool.get('us-east-1').ec2.run_instances(MaxCount=1, MinCount=1)['Instances'][0]['InstanceId']
+        west = self.pool.get('us-west-2').ec2.run_instances(MaxCount=1, MinCount=1)['Instances'][0]['InstanceId']
+        groups = {'us-east-1': [east], 'us-west-2': [west]}
+        result = self.pool.map_regions(groups, EC2Wrapper.get_tags_for_instances)
+        self.assertEqual(result, {'us-east-1': {east: {}}, 'us-west-2': {west: {}}})
+
+
 class TestASGWrapper(unittest.TestCase):
     @mock_autoscaling
     def setUp(self):
@@ -137,11 +265,305 @@ class TestASGWrapper(unittest.TestCase):
     def test_get_asg_user_tag_by_instance_id(self): 
         pass
 
+    def create_asg(self, size, session=None):
+        session = session or self.session
+        asg = session.client('autoscaling')
+        image_id = session.client('ec2').describe_images()['Images'][0]['ImageId']
+        asg.create_launch_configuration(LaunchConfigurationName='test_config', ImageId=image_id,
+                                        InstanceType='t2.micro')
+        asg.create_auto_scaling_group(AutoScalingGroupName='test_asg', LaunchConfigurationName='test_config',
+                                      MinSize=size, MaxSize=size, AvailabilityZones=[session.region_name + 'a'])
+        return {'ResourceId': 'test_asg', 'ResourceType': 'auto-scaling-group', 'Key': 'Creator',
+                'Value': 'test_creator', 'PropagateAtLaunch': True}
+
+    @mock_autoscaling
+    @mock_ec2
+    def test_get_creator_by_instance_id(self):
+        tag = self.create_asg(2)
+        self.wrapper.asg.create_or_update_tags(Tags=[tag])
+        instance_ids = self.wrapper.get_asg_instance_ids('test_asg')
+        with patch('util.aws._asg_creators', TTLCache()):
+            with patch.object(self.wrapper.asg, 'describe_tags', wraps=self.wrapper.asg.describe_tags) as describe_tags:
+                self.assertEqual(self.wrapper.get_creator_by_instance_id(instance_ids[:1]), 'test_creator')
+                self.assertEqual(self.wrapper.get_creator_by_instance_id(instance_ids[1:]), 'test_creator')
+                self.assertEqual(self.wrapper.get_creator_by_instance_id([], asg_name='test_asg'), 'test_creator')
+        self.assertEqual(describe_tags.call_count, 1)
+
+    @mock_autoscaling
+    @mock_ec2
+    def test_get_asg_creator_untagged(self):
+        self.create_asg(0)
+        with patch('util.aws._asg_creators', TTLCache()) as cache:
+            self.assertIsNone(self.wrapper.get_asg_creator('test_asg'))
+            self.assertIsNone(cache.get(('us-west-2', 'test_asg')))
+
+    @mock_autoscaling
+    @mock_ec2
+    def test_get_asg_creator_per_region(self):
+        east = boto3.Session(region_name='us-east-1')
+        self.wrapper.asg.create_or_update_tags(Tags=[self.create_asg(0)])
+        east_tag = dict(self.create_asg(0, session=east), Value='east_creator')
+        east.client('autoscaling').create_or_update_tags(Tags=[east_tag])
+        with patch('util.aws._asg_creators', TTLCache()):
+            self.assertEqual(self.wrapper.get_asg_creator('test_asg'), 'test_creator')
+            self.assertEqual(ASGWrapper(east).get_asg_creator('test_asg'), 'east_creator')
+
+    @mock_autoscaling
+    @mock_ec2
+    def test_create_or_update_tags(self):
+        tag = self.create_asg(3)
+        with patch.object(EC2Wrapper, 'create_tags_in_chunks', return_value={}) as create_tags_in_chunks:
+            response = self.wrapper.create_or_update_tags(Tags=[tag])
+        self.assertEqual(response['ResponseMetadata']['HTTPStatusCode'], 200)
+        resource_ids, tags = create_tags_in_chunks.call_args[0]
+        self.assertEqual(len(resource_ids), 3)
+        self.assertEqual(tags, [{'Key': 'Creator', 'Value': 'test_creator'}])
+
+    @mock_autoscaling
+    @mock_ec2
+    def test_create_or_update_tags_without_instances(self):
+        tag = self.create_asg(0)
+        with patch.object(EC2Wrapper, 'create_tags_in_chunks') as create_tags_in_chunks:
+            response = self.wrapper.create_or_update_tags(Tags=[tag])
+        self.assertEqual(response['ResponseMetadata']['HTTPStatusCode'], 200)
+        create_tags_in_chunks.assert_not_called()
+
 class TestTrustedAdvisor(unittest.TestCase):
-    pass
+    def setUp(self):
+        self.advisor = TrustedAdvisor(boto3.Session(region_name='us-west-2'), refresh=True, refresh_budget=60)
+        self.advisor.support = MagicMock()
+        self.advisor.support.describe_trusted_advisor_check_result.return_value = {
+            'result': {'flaggedResources': [{'resourceId': 'cached'}]}
+        }
+
+    def set_statuses(self, *statuses):
+        self.advisor.support.describe_trusted_advisor_check_refresh_statuses.side_effect = [
+            {'statuses': [status]} for status in statuses
+        ]
+
+    @patch('util.aws.time.sleep')
+    def test_refresh(self, sleep):
+        self.set_statuses({'status': 'none', 'millisUntilNextRefreshable': 0}, {'status': 'processing'},
+                          {'status': 'success'})
+        self.advisor.support.refresh_trusted_advisor_check.return_value = {'status': {'status': 'enqueued'}}
+        self.assertTrue(self.advisor.refresh_low_use_check())
+        self.assertEqual(sleep.call_count, 2)
+
+    @patch('util.aws.time.sleep')
+    def test_refresh_not_refreshable(self, sleep):
+        self.set_statuses({'status': 'success', 'millisUntilNextRefreshable': 30000})
+        self.assertEqual(self.advisor.get_low_use_instances(), [{'resourceId': 'cached'}])
+        self.advisor.support.refresh_trusted_advisor_check.assert_not_called()
+        sleep.assert_not_called()
+
+    @patch('util.aws.time.sleep')
+    def test_refresh_out_of_budget(self, sleep):
+        self.advisor.refresh_budget = 0
+        self.set_statuses({'status': 'processing'})
+        self.assertFalse(self.advisor.refresh_low_use_check())
+        sleep.assert_not_called()
+
+    @patch('util.aws.time.sleep')
+    def test_refresh_abandoned(self, sleep):
+        self.set_statuses({'status': 'enqueued'}, {'status': 'abandoned'})
+        self.assertFalse(self.advisor.refresh_low_use_check())
+        self.advisor.support.refresh_trusted_advisor_check.assert_not_called()
+
+class TestClientFactory(unittest.TestCase):
+    def setUp(self):
+        clear_clients()
+        self.session = boto3.Session(region_name='us-west-2', aws_access_key_id='test_key',
+                                     aws_secret_access_key='test_secret')
+
+    def test_get_client(self):
+        client = get_client(self.session, 'ec2')
+        self.assertIs(get_client(self.session, 'ec2', region_name='us-west-2'), client)
+        self.assertIs(get_client(boto3.Session(region_name='us-west-2', aws_access_key_id='test_key',
+                                               aws_secret_access_key='test_secret'), 'ec2'), client)
+        self.assertIsNot(get_client(self.session, 'ec2', region_name='us-east-1'), client)
+        self.assertIsNot(get_client(boto3.Session(region_name='us-west-2', aws_access_key_id='other_key',
+                                                  aws_secret_access_key='test_secret'), 'ec2'), client)
+        self.assertEqual(client.meta.config.retries['mode'], 'adaptive')
+        self.assertEqual(client.meta.config.max_pool_connections, 10)
 
 class TestDynamoWrapper(unittest.TestCase):
-    pass
+    def setUp(self):
+        self.session = boto3.Session(region_name='us-west-2')
+
+    def create_tables(self):
+        dynamo = self.session.resource('dynamodb')
+        for table_name in ['LowUse', 'Whitelist']:
+            dynamo.create_table(
+                TableName=table_name,
+                KeySchema=[{'AttributeName': 'InstanceID', 'KeyType': 'HASH'}],
+                AttributeDefinitions=[{'AttributeName': 'InstanceID', 'AttributeType': 'S'}],
+                ProvisionedThroughput={'ReadCapacityUnits': 1, 'WriteCapacityUnits': 1}
+            )
+        self.wrapper = DynamoWrapper(self.session)
+
+    @mock_dynamodb2
+    def test_batch_add_to_low_use(self):
+        self.create_tables()
+        instances = [{'InstanceID': 'test_id_%d' % i, 'Creator': 'test_creator'} for i in range(30)]
+        self.assertEqual(self.wrapper.batch_add_to_low_use(instances, flagged_at=1000), [])
+        item = self.wrapper.low_use.get_item(Key={'InstanceID': 'test_id_29'})['Item']
+        expected = {
+            'InstanceID': 'test_id_29',
+            'Creator': 'test_creator',
+            'Scheduled For Deletion': False,
+            'EmailSent': False,
+            'FlaggedAt': 1000
+        }
+        self.assertEqual(item, expected)
+        self.assertEqual(self.wrapper.low_use.scan()['Count'], 30)
+
+    @mock_dynamodb2
+    def test_batch_delete_item_from_low_use(self):
+        self.create_tables()
+        instances = [{'InstanceID': 'test_id_%d' % i, 'Creator': 'test_creator'} for i in range(30)]
+        self.wrapper.batch_add_to_low_use(instances)
+        instance_ids = [instance['InstanceID'] for instance in instances]
+        report = self.wrapper.batch_delete_item_from_low_use(instance_ids)
+        self.assertEqual(report, dict.fromkeys(instance_ids, 'deleted'))
+        self.assertEqual(self.wrapper.low_use.scan()['Count'], 0)
+
+    @mock_dynamodb2
+    def test_guarded_batch_delete_item_from_low_use(self):
+        self.create_tables()
+        self.wrapper.add_to_low_use('test_id', 'test_creator')
+        report = self.wrapper.batch_delete_item_from_low_use(['test_id', 'missing_id'], guarded=True)
+        self.assertEqual(report, {'test_id': 'deleted', 'missing_id': 'not_found'})
+        self.assertEqual(self.wrapper.low_use.scan()['Count'], 0)
+
+    @mock_dynamodb2
+    def test_preload(self):
+        self.create_tables()
+        self.wrapper.add_to_low_use('low_use_id', 'test_creator')
+        self.wrapper.add_to_whitelist('whitelist_id', 'test_creator', 'test_reason')
+        self.wrapper.preload(segments=2)
+        self.assertTrue(self.wrapper.is_low_use('low_use_id'))
+        self.assertFalse(self.wrapper.is_low_use('whitelist_id'))
+        self.assertTrue(self.wrapper.is_whitelisted('whitelist_id'))
+
+        with patch.object(self.wrapper.client, 'get_item') as get_item:
+            self.wrapper.batch_schedule_for_deletion([{'InstanceID': 'low_use_id', 'Creator': 'test_creator'}])
+            self.assertTrue(self.wrapper.is_scheduled_for_deletion('low_use_id'))
+            self.assertEqual(self.wrapper.batch_delete_item_from_low_use(['low_use_id', 'missing_id']),
+                             {'low_use_id': 'deleted', 'missing_id': 'not_found'})
+            self.assertFalse(self.wrapper.is_low_use('low_use_id'))
+            self.assertFalse(get_item.called)
+
+    @mock_dynamodb2
+    def test_batch_put_items_skips_unchanged_items(self):
+        self.create_tables()
+        self.wrapper.add_to_low_use('test_id', 'test_creator')
+        self.wrapper.preload()
+        with patch.object(self.wrapper, 'batch_write', return_value=[]) as batch_write:
+            self.wrapper.batch_add_to_low_use([{'InstanceID': 'test_id', 'Creator': 'test_creator'}])
+        batch_write.assert_called_once_with(self.wrapper.low_use, [])
+
+    @mock_dynamodb2
+    def test_batch_write_retries_unprocessed_items(self):
+        self.create_tables()
+        request = {'PutRequest': {'Item': {'InstanceID': 'test_id'}}}
+        responses = [{'UnprocessedItems': {'LowUse': [request]}}, {'UnprocessedItems': {}}]
+        with patch.object(self.wrapper.client, 'batch_write_item', side_effect=responses) as batch_write_item, \
+                patch('util.aws.time.sleep'):
+            self.assertEqual(self.wrapper.batch_write(self.wrapper.low_use, [request]), [])
+        self.assertEqual(batch_write_item.call_count, 2)
+
+    @mock_dynamodb2
+    def test_batch_write_gives_up_on_throttled_chunk(self):
+        self.create_tables()
+        request = {'PutRequest': {'Item': {'InstanceID': 'test_id'}}}
+        throttled = ClientError({'Error': {'Code': 'ProvisionedThroughputExceededException'}}, 'BatchWriteItem')
+        with patch.object(self.wrapper.client, 'batch_write_item', side_effect=throttled) as batch_write_item:
+            self.assertEqual(self.wrapper.batch_write(self.wrapper.low_use, [request]), [request])
+        # The client already retried the call
+        self.assertEqual(batch_write_item.call_count, 1)
+
+    @mock_dynamodb2
+    def test_batch_write_gives_up(self):
+        self.create_tables()
+        request = {'PutRequest': {'Item': {'InstanceID': 'test_id'}}}
+        response = {'UnprocessedItems': {'LowUse': [request]}}
+        with patch.object(self.wrapper.client, 'batch_write_item', return_value=response), \
+                patch('util.aws.time.sleep'):
+            self.assertEqual(self.wrapper.batch_write(self.wrapper.low_use, [request]), [request])
 
 class TestSESWrapper(unittest.TestCase):
-    pass
\ No newline at end of file
+    def setUp(self):
+        self.session = boto3.Session(region_name='us-west-2')
+        self.wrapper = SESWrapper(self.session)
+        self.wrapper.ses = MagicMock()
+        self.wrapper.ses.get_send_quota.return_value = {
+            'Max24HourSend': 3.0,
+            'MaxSendRate': 100.0,
+            'SentLast24Hours': 0.0
+        }
+        self.creator_reports = [
+            {'creator': 'test%d@example.com' % i, 'low_use': [], 'scheduled_for_deletion': []}
+            for i in range(3)
+        ]
+
+    def test_send_low_use_emails(self):
+        self.wrapper.ses.send_templated_email.side_effect = [{'MessageId': 'id0'}, {'MessageId': 'id1'}]
+        summary = self.wrapper.send_low_use_emails(self.creator_reports, max_workers=1, bulk=False)
+        expected = {
+            'test0@example.com': {'destination': 'test0@example.com', 'status': 'sent', 'attempts': 1,
+                                  'message_id': 'id0'},
+            'test1@example.com': {'destination': 'test1@example.com', 'status': 'sent', 'attempts': 1,
+                                  'message_id': 'id1'},
+            'test2@example.com': {'destination': 'test2@example.com', 'status': 'quota_exceeded', 'attempts': 0}
+        }
+        self.assertEqual(summary, expected)
+
+    def test_send_low_use_emails_without_quota(self):
+        denied = ClientError({'Error': {'Code': 'AccessDenied', 'Message': 'denied'}}, 'GetSendQuota')
+        self.wrapper.ses.get_send_quota.side_effect = denied
+        self.wrapper.ses.send_templated_email.return_value = {'MessageId': 'id0'}
+        with patch('util.aws.SES_FALLBACK_SEND_RATE', 1000.0):
+            summary = self.wrapper.send_low_use_emails(self.creator_reports, bulk=False)
+        self.assertEqual([result['status'] for result in summary.values()], ['sent'] * 3)
+
+    def test_send_low_use_emails_failure(self):
+        rejected = ClientError({'Error': {'Code': 'MessageRejected', 'Message': 'rejected'}}, 'SendTemplatedEmail')
+        self.wrapper.ses.send_templated_email.side_effect = rejected
+        summary = self.wrapper.send_low_use_emails(self.creator_reports[:1], bulk=False)
+        self.assertEqual(summary['test0@example.com']['status'], 'failed')
+        self.assertEqual(summary['test0@example.com']['attempts'], 1)
+
+    @patch('util.aws.ADMIN_EMAIL', 'admin@example.com')
+    def test_send_low_use_emails_admin_and_unknown_creator(self):
+        self.wrapper.ses.get_send_quota.return_value['Max24HourSend'] = -1
+        self.wrapper.ses.send_templated_email.side_effect = [
+            {'MessageId': 'id0'},
+            ClientError({'Error': {'Code': 'MessageRejected', 'Message': 'rejected'}}, 'SendTemplatedEmail')
+        ]
+        creator_reports = [{'creator': 'admin@example.com', 'low_use': [], 'scheduled_for_deletion': []},
+                           {'creator': None, 'low_use': [], 'scheduled_for_deletion': []}]
+        summary = self.wrapper.send_low_use_emails(creator_reports, max_workers=1, bulk=False)
+        self.assertEqual(summary['admin@example.com']['status'], 'sent')
+        self.assertEqual(summary[None]['status'], 'failed')
+        self.assertEqual(summary[None]['destination'], 'admin@example.com')
+
+    def test_send_bulk_low_use_emails(self):
+        self.wrapper.ses.get_send_quota.return_value['Max24HourSend'] = -1
+        self.wrapper.ses.send_bulk_templated_email.return_value = {'Status': [
+            {'Status': 'Success', 'MessageId': 'id0'},
+            {'Status': 'TransientFailure', 'Error': 'try again'},
+            {'Status': 'Failed', 'Error': 'failed'}
+        ]}
+        self.wrapper.ses.send_templated_email.return_value = {'MessageId': 'id1'}
+        summary = self.wrapper.send_low_use_emails(self.creator_reports, bulk=True)
+        self.assertEqual(summary['test0@example.com'], {'destination': 'test0@example.com', 'status': 'sent',
+                                                        'attempts': 1, 'message_id': 'id0'})
+        self.assertEqual(summary['test1@example.com'], {'destination': 'test1@example.com', 'status': 'sent',
+                                                        'attempts': 2, 'message_id': 'id1'})
+        self.assertEqual(summary['test2@example.com']['status'], 'failed')
+        self.assertFalse(summary['test2@example.com']['retryable'])
+        self.assertEqual(self.wrapper.ses.send_bulk_templated_email.call_count, 1)
+        self.assertEqual(self.wrapper.ses.send_templated_email.call_count, 1)
+        destinations = self.wrapper.ses.send_bulk_templated_email.call_args[1]['Destinations']
+        self.assertEqual([destination['Destination']['ToAddresses'] for destination in destinations],
+                         [['test0@example.com'], ['test1@example.com'], ['test2@example.com']])
\ No newline at end of file
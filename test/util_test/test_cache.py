@@ -0,0 +1,37 @@
+import unittest
+import time
+from util.cache import TTLCache
+
+
+class TestTTLCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = TTLCache(ttl=60, max_size=2)
+
+    def test_get(self):
+        self.cache.put('test_key', 'test_value')
+        self.assertEqual(self.cache.get('test_key'), 'test_value')
+        self.assertIsNone(self.cache.get('missing_key'))
+        self.assertEqual(self.cache.stats(), {'hits': 1, 'misses': 1, 'size': 1})
+
+    def test_expired_entry(self):
+        self.cache.ttl = 0.01
+        self.cache.put('test_key', 'test_value')
+        time.sleep(0.02)
+        self.assertIsNone(self.cache.get('test_key'))
+        self.assertEqual(len(self.cache), 0)
+
+    def test_evicts_least_recently_used(self):
+        self.cache.put('first', 1)
+        self.cache.put('second', 2)
+        self.cache.get('first')
+        self.cache.put('third', 3)
+        self.assertEqual(self.cache.get('first'), 1)
+        self.assertIsNone(self.cache.get('second'))
+        self.assertEqual(self.cache.get('third'), 3)
+
+    def test_update(self):
+        self.cache.put('test_key', {'a': '1'})
+        self.cache.update('test_key', lambda cached: dict(cached, b='2'))
+        self.cache.update('missing_key', lambda cached: {'b': '2'})
+        self.assertEqual(self.cache.get('test_key'), {'a': '1', 'b': '2'})
+        self.assertIsNone(self.cache.get('missing_key'))
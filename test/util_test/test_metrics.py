@@ -0,0 +1,52 @@
+import unittest
+import boto3
+from moto import mock_ec2
+from util.metrics import Metrics, instrument, flush, emit_metrics, METRICS
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.metrics = Metrics()
+
+    @mock_ec2
+    def test_instrument(self):
+        client = instrument(boto3.client('ec2', region_name='us-west-2'), self.metrics)
+        instrument(client, self.metrics)
+        client.describe_instances()
+        client.describe_instances()
+        with self.assertRaises(Exception):
+            client.stop_instances(InstanceIds=['i-00000000'])
+
+        describe = self.metrics.operations[('ec2', 'DescribeInstances')]
+        self.assertEqual(describe.calls, 2)
+        self.assertEqual(describe.errors, 0)
+        self.assertEqual(sum(describe.latency_counts), 2)
+        self.assertEqual(self.metrics.operations[('ec2', 'StopInstances')].errors, 1)
+
+    def test_to_emf(self):
+        self.metrics.record_call('ses', 'SendEmail', 30.0)
+        self.metrics.record_call('ses', 'SendEmail', 70.0, retries=2, error_code='Throttling')
+        self.metrics.record_throttle('ses', 'SendEmail')
+
+        document = self.metrics.to_emf({'Function': 'test_function'})
+        self.assertEqual(document['ses.SendEmail.Calls'], 2)
+        self.assertEqual(document['ses.SendEmail.Retries'], 2)
+        self.assertEqual(document['ses.SendEmail.Throttles'], 1)
+        self.assertEqual(document['ses.SendEmail.Errors'], 1)
+        self.assertEqual(document['ses.SendEmail.Latency'], 50.0)
+        self.assertEqual(document['LatencyHistograms']['ses.SendEmail']['Counts'][2:4], [1, 1])
+        directive = document['_aws']['CloudWatchMetrics'][0]
+        self.assertEqual(directive['Dimensions'], [['Function']])
+        self.assertEqual(len(directive['Metrics']), 6)
+
+    def test_emit_metrics(self):
+        METRICS.record_call('ec2', 'CreateTags', 10.0)
+
+        @emit_metrics
+        def handler(event, context):
+            raise ValueError(event)
+
+        with self.assertRaises(ValueError):
+            handler('test_event', None)
+        self.assertEqual(METRICS.operations, {})
+        self.assertEqual(flush(dimensions={})['_aws']['CloudWatchMetrics'], [])
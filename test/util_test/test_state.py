@@ -0,0 +1,47 @@
+import unittest
+import os
+import tempfile
+import boto3
+from moto import mock_dynamodb2
+from util.state import DynamoStateStore, FileStateStore
+
+
+class TestFileStateStore(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = FileStateStore(os.path.join(self.directory.name, 'state.json'))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_put_and_get(self):
+        self.assertIsNone(self.store.get('test_key'))
+        self.store.put('test_key', {'phase': 'actions', 'processed': ['test_id']})
+        self.store.put('other_key', {'phase': 'emails'})
+        self.assertEqual(self.store.get('test_key'), {'phase': 'actions', 'processed': ['test_id']})
+        self.assertEqual(self.store.get('other_key'), {'phase': 'emails'})
+
+    def test_delete(self):
+        self.store.put('test_key', {'phase': 'actions'})
+        self.store.delete('test_key')
+        self.store.delete('missing_key')
+        self.assertIsNone(self.store.get('test_key'))
+
+
+class TestDynamoStateStore(unittest.TestCase):
+    @mock_dynamodb2
+    def test_put_get_and_delete(self):
+        session = boto3.Session(region_name='us-west-2')
+        session.resource('dynamodb').create_table(
+            TableName='LUAUState',
+            KeySchema=[{'AttributeName': 'StateKey', 'KeyType': 'HASH'}],
+            AttributeDefinitions=[{'AttributeName': 'StateKey', 'AttributeType': 'S'}],
+            ProvisionedThroughput={'ReadCapacityUnits': 2, 'WriteCapacityUnits': 2}
+        )
+        store = DynamoStateStore(session)
+        state = {'phase': 'actions', 'processed': ['test_id_%d' % i for i in range(1000)]}
+
+        store.put('test_key', state)
+        self.assertEqual(store.get('test_key'), state)
+        store.delete('test_key')
+        self.assertIsNone(store.get('test_key'))
@@ -0,0 +1,18 @@
+import unittest
+from mock import patch
+from util.throttle import RateLimiter, backoff_delay
+
+
+class TestRateLimiter(unittest.TestCase):
+    @patch('util.throttle.time.sleep')
+    def test_acquire(self, sleep):
+        limiter = RateLimiter(2)
+        self.assertEqual(limiter.acquire(2), 0)
+        self.assertGreater(limiter.acquire(1), 0)
+        self.assertTrue(sleep.called)
+
+
+class TestBackoffDelay(unittest.TestCase):
+    def test_backoff_delay(self):
+        for attempt in range(1, 10):
+            self.assertLessEqual(backoff_delay(attempt, base=0.05, cap=1.0), 1.0)
@@ -3,6 +3,8 @@
 This module contains wrapper classes for AWS Services. This includes:
     * EC2
     * AutoScaling
+    * Elastic Load Balancing (v2)
+    * RDS
     * SES
     * TrustedAdvisor
     * DynamoDB
@@ -11,12 +13,60 @@ Attributes:
     LOW_USE_CHECK_ID (str): Unique str indentifier for Low Use Check in Trusted Advisor.
     SES_EMAIL (str): SES Email used to send Low Use reports from.
     ADMIN_EMAIL (str): Admin email account that will receive the admin reports.
+    DESCRIBE_INSTANCES_CHUNK_SIZE (int): Max number of instance ids sent in one DescribeInstances call.
+    DESCRIBE_TAGS_FILTER_SIZE (int): Max number of instance ids in the resource-id filter of one DescribeTags sweep.
+    LIFECYCLE_TAG_KEYS (:obj:`list` of :obj:`str`): Tag keys LUAU uses to track an instance through its lifecycle.
+    MAX_REGION_WORKERS (int): Max number of regions processed at the same time.
+    STOP_CHUNK_SIZE (int): Max number of instance ids sent in one StopInstances call.
+    STOP_MAX_WORKERS (int): Number of StopInstances chunks sent at the same time.
+    CREATE_TAGS_MAX_RESOURCES (int): Max number of resource ids sent in one CreateTags call.
+    TAG_MAX_WORKERS (int): Number of CreateTags chunks sent at the same time.
+    ELBV2_ADD_TAGS_MAX_RESOURCES (int): Max number of load balancer ARNs sent in one ELBv2 AddTags call.
+    STOP_POLL_ATTEMPTS (int): Number of DescribeInstanceStatus polls used to confirm instances are stopping.
+    STOP_POLL_INTERVAL (int): Seconds between DescribeInstanceStatus polls.
+    INSTANCE_STATUS_CHUNK_SIZE (int): Max number of instance ids sent in one DescribeInstanceStatus call.
+    STOPPED_STATES (:obj:`tuple` of :obj:`str`): Instance states that confirm a stop went through.
+    DYNAMO_WRITE_RATE (float): Max DynamoDB item writes per second, unlimited if not set.
+    DYNAMO_BATCH_SIZE (int): Max number of items in one BatchWriteItem call.
+    DYNAMO_MAX_ATTEMPTS (int): Max number of BatchWriteItem attempts per chunk before giving up on its unprocessed items.
+    DYNAMO_DELETE_WORKERS (int): Number of threads used for conditional deletes.
+    DYNAMO_SCAN_SEGMENTS (int): Number of parallel Scan segments per table when preloading Dynamo state.
+    SES_MAX_WORKERS (int): Number of threads sending emails at the same time.
+    SES_BULK_SIZE (int): Max number of destinations in one SendBulkTemplatedEmail call.
+    SES_BULK_SEND (bool): Send creator reports with SendBulkTemplatedEmail instead of one call per creator.
+    SES_FALLBACK_SEND_RATE (float): Emails sent per second when the account's SES quota cannot be read, the
+        sandbox MaxSendRate.
+    SES_RETRYABLE_STATUSES (:obj:`tuple` of :obj:`str`): SendBulkTemplatedEmail destination statuses retried
+        with an individual send.
+    DYNAMO_ATTRIBUTES (:obj:`list` of :obj:`str`): Item attributes LUAU writes, projected by the preload Scan.
+    THROTTLING_ERROR_CODES (:obj:`tuple` of :obj:`str`): Error codes of throttled requests, retried with backoff.
+        Defined in util.metrics, which counts them.
+    CLIENT_MAX_ATTEMPTS (int): Max attempts per call, retries included, in botocore's adaptive retry mode.
+    CLIENT_CONNECT_TIMEOUT (int): Seconds to wait for a connection to an AWS endpoint.
+    CLIENT_READ_TIMEOUT (int): Seconds to wait for an AWS response once connected.
+    CLIENT_MAX_POOL_CONNECTIONS (int): HTTP connections kept per client, sized to the largest worker pool
+        sharing a client.
+    ASG_CREATOR_TTL (int): Seconds an ASG's Creator tag is cached, across warm invocations.
+    TA_REFRESH (bool): Refresh the Low Use check before reading its result instead of reading the cached result.
+    TA_REFRESH_BUDGET (int): Max seconds to wait for a refresh to finish before falling back to the cached result.
+    TA_POLL_BASE (float): Delay in seconds of the first refresh status poll, before backoff and jitter.
+    TA_POLL_CAP (float): Max delay in seconds between refresh status polls.
+    ASG_CREATOR_CACHE_SIZE (int): Max number of ASGs whose Creator tag is cached.
 """
 
 import boto3
 import logging
 import json
 import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from botocore.config import Config
+from botocore.exceptions import ClientError
+from util.cache import TTLCache
+from util.metrics import THROTTLING_ERROR_CODES, instrument
+from util.throttle import RateLimiter, backoff_delay
 
 logging.basicConfig()
 logger = logging.getLogger()
@@ -25,6 +75,156 @@ logger.setLevel(logging.INFO)
 LOW_USE_CHECK_ID = 'Qch7DwouX1'
 SES_EMAIL = os.environ.get('SES_EMAIL', 'Unknown')
 ADMIN_EMAIL =  os.environ.get('ADMIN_EMAIL', 'Unknown')
+DESCRIBE_INSTANCES_CHUNK_SIZE = 1000
+DESCRIBE_TAGS_FILTER_SIZE = 200
+LIFECYCLE_TAG_KEYS = ['Whitelisted', 'Low Use', 'Scheduled For Deletion', 'Reason', 'Creator']
+MAX_REGION_WORKERS = 16
+STOP_CHUNK_SIZE = 50
+STOP_MAX_WORKERS = 4
+CREATE_TAGS_MAX_RESOURCES = 1000
+TAG_MAX_WORKERS = 4
+ELBV2_ADD_TAGS_MAX_RESOURCES = 20
+STOP_POLL_ATTEMPTS = 5
+STOP_POLL_INTERVAL = 2
+INSTANCE_STATUS_CHUNK_SIZE = 100
+STOPPED_STATES = ('stopping', 'stopped')
+DYNAMO_WRITE_RATE = float(os.environ['DYNAMO_WRITE_RATE']) if os.environ.get('DYNAMO_WRITE_RATE') else None
+DYNAMO_BATCH_SIZE = 25
+DYNAMO_MAX_ATTEMPTS = 8
+DYNAMO_DELETE_WORKERS = 8
+DYNAMO_SCAN_SEGMENTS = 4
+SES_MAX_WORKERS = 8
+SES_BULK_SIZE = 50
+SES_BULK_SEND = os.environ.get('SES_BULK_SEND', 'true').lower() == 'true'
+SES_FALLBACK_SEND_RATE = 1.0
+# Transient per-destination bulk statuses worth retrying with an individual send, others (Failed,
+# MessageRejected, ...) are permanent and retrying them only spends send quota
+SES_RETRYABLE_STATUSES = ('AccountThrottled', 'TransientFailure')
+DYNAMO_ATTRIBUTES = ['InstanceID', 'Creator', 'Reason', 'EmailSent', 'Scheduled For Deletion', 'FlaggedAt']
+CLIENT_MAX_ATTEMPTS = 8
+CLIENT_CONNECT_TIMEOUT = 5
+CLIENT_READ_TIMEOUT = 30
+# Largest number of threads sharing one client, plus the pipeline's main and action threads
+CLIENT_MAX_POOL_CONNECTIONS = max(SES_MAX_WORKERS, DYNAMO_DELETE_WORKERS, 2 * DYNAMO_SCAN_SEGMENTS, STOP_MAX_WORKERS) + 2
+CLIENT_CONFIG = Config(
+    retries={'mode': 'adaptive', 'max_attempts': CLIENT_MAX_ATTEMPTS},
+    connect_timeout=CLIENT_CONNECT_TIMEOUT,
+    read_timeout=CLIENT_READ_TIMEOUT,
+    max_pool_connections=CLIENT_MAX_POOL_CONNECTIONS
+)
+ASG_CREATOR_TTL = int(os.environ.get('ASG_CREATOR_TTL', 900))
+ASG_CREATOR_CACHE_SIZE = 1000
+TA_REFRESH = os.environ.get('TA_REFRESH', 'false').lower() == 'true'
+TA_REFRESH_BUDGET = int(os.environ.get('TA_REFRESH_BUDGET', 120))
+TA_POLL_BASE = 2
+TA_POLL_CAP = 20
+# Refresh statuses of a check whose refresh has not finished yet
+TA_REFRESH_PENDING_STATUSES = ('enqueued', 'processing')
+_sessions = {}
+# Creator tag keyed by (region, ASG name), shared by every ASGWrapper of a warm container.
+# ASG names are only unique within a region.
+_asg_creators = TTLCache(ttl=ASG_CREATOR_TTL, max_size=ASG_CREATOR_CACHE_SIZE)
+_clients = {}
+_clients_lock = threading.Lock()
+REGION_PATTERN = re.compile(r'^([a-z]{2}(?:-gov|-iso[a-z]*)?-[a-z]+-\d+)')
+# EC2 error codes of a request naming a resource id that does not exist or is malformed
+# (InvalidInstanceID.NotFound, InvalidVolume.NotFound, InvalidAMIID.Malformed, InvalidID, ...)
+INVALID_ID_ERROR_PATTERN = re.compile(r'^Invalid\w*(?:ID|\.NotFound|\.Malformed)$')
+
+
+def get_region(location):
+    """Get the region of a Trusted Advisor location
+
+    Trusted Advisor reports the Region/AZ of an instance (us-west-2a), this strips it down to the region.
+
+    Args:
+        location (str): Region or Availability Zone
+
+    Returns:
+        str: Name of the region, None if location is not a region or availability zone
+    """
+    match = REGION_PATTERN.match(location or '')
+    if match is None:
+        return None
+    return match.group(1)
+
+
+def get_session(region_name=None):
+    """Get the shared Session for a region
+
+    Sessions are created on first use and kept at module level, so a warm Lambda container
+    reuses them (and their loaded service models and credentials) across invocations.
+
+    Args:
+        region_name (str, optional): Region of the session, defaults to AWS_REGION
+
+    Returns:
+        obj: Boto3 Session object
+    """
+    region_name = region_name or os.environ['AWS_REGION']
+    with _clients_lock:
+        if region_name not in _sessions:
+            _sessions[region_name] = boto3.Session(region_name=region_name)
+        return _sessions[region_name]
+
+
+def _client_key(session, kind, service, region_name):
+    credentials = session.get_credentials()
+    frozen = credentials.get_frozen_credentials() if credentials is not None else None
+    return kind, service, region_name or session.region_name, frozen
+
+
+def get_client(session, service, region_name=None):
+    """Get the shared client for a service
+
+    Clients use CLIENT_CONFIG (adaptive retries, timeouts and a connection pool sized for LUAU's
+    worker pools) and are instrumented by util.metrics. One client is created per service, region
+    and credentials and then reused, clients are thread-safe so parallel code paths share it.
+
+    Args:
+        session (obj): Boto3 Session object
+        service (str): Name of the AWS service
+        region_name (str, optional): Region of the client, defaults to the region of the session
+
+    Returns:
+        obj: Boto3 Client object
+    """
+    key = _client_key(session, 'client', service, region_name)
+    with _clients_lock:
+        if key not in _clients:
+            _clients[key] = instrument(session.client(service, region_name=region_name, config=CLIENT_CONFIG))
+        return _clients[key]
+
+
+def get_resource(session, service, region_name=None):
+    """Get the shared resource for a service
+
+    Resources use CLIENT_CONFIG and their client is instrumented, like get_client. Unlike clients,
+    boto3 resources and the objects they create (Tables) are not thread-safe, so code running on
+    worker threads calls resource.meta.client instead, which is.
+
+    Args:
+        session (obj): Boto3 Session object
+        service (str): Name of the AWS service
+        region_name (str, optional): Region of the resource, defaults to the region of the session
+
+    Returns:
+        obj: Boto3 Resource object
+    """
+    key = _client_key(session, 'resource', service, region_name)
+    with _clients_lock:
+        if key not in _clients:
+            resource = session.resource(service, region_name=region_name, config=CLIENT_CONFIG)
+            instrument(resource.meta.client)
+            _clients[key] = resource
+        return _clients[key]
+
+
+def clear_clients():
+    """Drop every shared session, client and resource, the next calls create new ones"""
+    with _clients_lock:
+        _sessions.clear()
+        _clients.clear()
 
 
 class EC2Wrapper:
@@ -33,10 +233,14 @@ class EC2Wrapper:
     Attributes:
         session (obj): Boto3 Session object with AWS
         ec2 (obj): Boto3 EC2 Client object to directly interface with AWS EC2
+        tag_cache (obj, optional): TTLCache of instance tags keyed by instance id. Tags are read from
+            AWS on every lookup if not given.
+        region_name (str, optional): Region of the EC2 client, defaults to the region of the session
     """
-    def __init__(self, session):
+    def __init__(self, session, tag_cache=None, region_name=None):
         self.session = session
-        self.ec2 = session.client('ec2')
+        self.ec2 = get_client(session, 'ec2', region_name=region_name)
+        self.tag_cache = tag_cache
 
     def create_tags(self, Resources, Tags):
         """Tags resources
@@ -48,10 +252,82 @@ class EC2Wrapper:
         Returns:
             dict: response from AWS CreateTags API Call
         """
-        return self.ec2.create_tags(
+        response = self.ec2.create_tags(
             Resources=Resources,
             Tags=Tags
         )
+        self.write_through(Resources, Tags)
+        return response
+
+    def create_tags_in_chunks(self, resource_ids, tags, chunk_size=CREATE_TAGS_MAX_RESOURCES,
+                              max_workers=TAG_MAX_WORKERS):
+        """Tags many resources with concurrent, chunked CreateTags calls
+
+        Each chunk is sent on its own, so one failing chunk does not hold back or fail the others, and
+        a chunk holding ids that do not exist is bisected so only those ids fail. Throttled calls are
+        retried by the client's adaptive retry mode.
+
+        Args:
+            resource_ids (:obj:`list` of :obj:`str`): List of Resource Ids
+            tags (:obj:`list` of :obj:`dict`): List of Key/Value pairs for Tags
+            chunk_size (int): Max number of resource ids per CreateTags call
+            max_workers (int): Max number of chunks tagged at the same time
+
+        Returns:
+            dict: Error message keyed by the id of each resource that could not be tagged
+        """
+        resource_ids = list(dict.fromkeys(resource_ids))
+        if not resource_ids:
+            return {}
+        chunks = [resource_ids[start:start + chunk_size] for start in range(0, len(resource_ids), chunk_size)]
+        failed = {}
+        with ThreadPoolExecutor(max_workers=min(len(chunks), max_workers)) as executor:
+            for chunk_failures in executor.map(lambda chunk: self.create_tags_for_chunk(chunk, tags), chunks):
+                failed.update(chunk_failures)
+        if failed:
+            logger.error('Could not tag %d resources: %s', len(failed), failed)
+        return failed
+
+    def create_tags_for_chunk(self, resource_ids, tags):
+        """Tags one chunk of resources, bisecting it on invalid ids
+
+        One missing or malformed id fails the whole CreateTags call, so the chunk is bisected until
+        those ids are isolated and every other resource is tagged. Other errors (throttling the client
+        could not retry away, missing permissions) fail the chunk as a whole.
+
+        Args:
+            resource_ids (:obj:`list` of :obj:`str`): List of Resource Ids
+            tags (:obj:`list` of :obj:`dict`): List of Key/Value pairs for Tags
+
+        Returns:
+            dict: Error message keyed by the id of each resource that could not be tagged
+        """
+        try:
+            self.create_tags(Resources=resource_ids, Tags=tags)
+        except ClientError as e:
+            if len(resource_ids) == 1 or not INVALID_ID_ERROR_PATTERN.match(e.response['Error']['Code']):
+                return dict.fromkeys(resource_ids, str(e))
+            middle = len(resource_ids) // 2
+            failed = self.create_tags_for_chunk(resource_ids[:middle], tags)
+            failed.update(self.create_tags_for_chunk(resource_ids[middle:], tags))
+            return failed
+        return {}
+
+    def write_through(self, resource_ids, tags):
+        """Apply written tags to the tag cache
+
+        Only instances that are already cached are updated, so a later read never sees a
+        partial set of tags.
+
+        Args:
+            resource_ids (:obj:`list` of :obj:`str`): List of Resource Ids that were tagged
+            tags (:obj:`list` of :obj:`dict`): List of Key/Value pairs that were written
+        """
+        if self.tag_cache is None:
+            return
+        written = {tag['Key']: tag['Value'] for tag in tags}
+        for resource_id in resource_ids:
+            self.tag_cache.update(resource_id, lambda cached: dict(cached, **written))
 
     def tag_as_low_use(self, instance_id):
         """Tag instance as Low Use
@@ -112,7 +388,7 @@ class EC2Wrapper:
             'Key': tag_key,
             'Value': tag_value
         }
-        return self.ec2.create_tags(
+        return self.create_tags(
             Resources=[instance_id],
             Tags=[tag]
         )
@@ -167,6 +443,10 @@ class EC2Wrapper:
         Returns:
             list: all tags of EC2 instance (empty list if no tags exist)
         """
+        if self.tag_cache is not None:
+            cached = self.tag_cache.get(instance_id)
+            if cached is not None:
+                return [{'Key': key, 'Value': value} for key, value in cached.items()]
         try:
             response = self.ec2.describe_instances(InstanceIds=[instance_id])
         except Exception as e:
@@ -175,9 +455,147 @@ class EC2Wrapper:
         for reservation in response['Reservations']:
             for instance in reservation['Instances']:
                 if instance['InstanceId'] == instance_id:
-                    return instance['Tags']
+                    tags = instance.get('Tags', [])
+                    if self.tag_cache is not None:
+                        self.tag_cache.put(instance_id, {tag['Key']: tag['Value'] for tag in tags})
+                    return tags
         return []
 
+    def get_tags_for_instances(self, instance_ids):
+        """Get all tags for many instances at once
+
+        Instance ids are sent to DescribeInstances in chunks of DESCRIBE_INSTANCES_CHUNK_SIZE and
+        every page of the response is read, so tagging state for a whole report costs a handful of
+        calls instead of one call per tag lookup.
+
+        Args:
+            instance_ids (:obj:`list` of :obj:`str`): IDs of the Instances
+
+        Returns:
+            dict: Tags of each instance keyed by instance id, as a dict of tag key to tag value.
+                Instances that no longer exist are left out.
+        """
+        instance_ids = list(dict.fromkeys(instance_ids))
+        snapshot = {}
+        if self.tag_cache is not None:
+            for instance_id in instance_ids:
+                cached = self.tag_cache.get(instance_id)
+                if cached is not None:
+                    snapshot[instance_id] = dict(cached)
+            instance_ids = [instance_id for instance_id in instance_ids if instance_id not in snapshot]
+        for start in range(0, len(instance_ids), DESCRIBE_INSTANCES_CHUNK_SIZE):
+            chunk = instance_ids[start:start + DESCRIBE_INSTANCES_CHUNK_SIZE]
+            fetched = self.describe_tags_for_chunk(chunk)
+            if self.tag_cache is not None:
+                for instance_id, tags in fetched.items():
+                    self.tag_cache.put(instance_id, dict(tags))
+            snapshot.update(fetched)
+        return snapshot
+
+    def describe_tags_for_chunk(self, instance_ids):
+        """Get all tags for one chunk of instances
+
+        DescribeInstances fails the whole request if any id in it does not exist (instances are
+        often terminated after Trusted Advisor flags them), so a failing chunk is split in half
+        and retried until the missing ids are isolated and dropped.
+
+        Args:
+            instance_ids (:obj:`list` of :obj:`str`): IDs of the Instances
+
+        Returns:
+            dict: Tags of each instance keyed by instance id
+        """
+        if not instance_ids:
+            return {}
+        snapshot = {}
+        paginator = self.ec2.get_paginator('describe_instances')
+        try:
+            for page in paginator.paginate(InstanceIds=instance_ids):
+                for reservation in page['Reservations']:
+                    for instance in reservation['Instances']:
+                        snapshot[instance['InstanceId']] = {
+                            tag['Key']: tag['Value'] for tag in instance.get('Tags', [])
+                        }
+        except ClientError as e:
+            if not e.response['Error']['Code'].startswith('InvalidInstanceID'):
+                raise
+            if len(instance_ids) == 1:
+                logger.info(e)
+                return {}
+            middle = len(instance_ids) // 2
+            snapshot = self.describe_tags_for_chunk(instance_ids[:middle])
+            snapshot.update(self.describe_tags_for_chunk(instance_ids[middle:]))
+        return snapshot
+
+    def get_lifecycle_tags(self, instance_ids=None):
+        """Get the lifecycle tags of instances
+
+        Reads only the LIFECYCLE_TAG_KEYS with paginated DescribeTags sweeps, which return far less
+        data per page than DescribeInstances. Unlike DescribeInstances, ids of terminated instances
+        are simply not matched, so a chunk never has to be split.
+
+        Args:
+            instance_ids (:obj:`list` of :obj:`str`, optional): IDs of the Instances, sent
+                DESCRIBE_TAGS_FILTER_SIZE at a time. Every instance in the region if not given.
+
+        Returns:
+            dict: Lifecycle tags of each instance keyed by instance id, as a dict of tag key to tag value.
+                Instances without any lifecycle tag are left out.
+        """
+        filters = [
+            {'Name': 'resource-type', 'Values': ['instance']},
+            {'Name': 'key', 'Values': LIFECYCLE_TAG_KEYS}
+        ]
+        if instance_ids is None:
+            sweeps = [filters]
+        else:
+            instance_ids = list(dict.fromkeys(instance_ids))
+            sweeps = [filters + [{'Name': 'resource-id',
+                                  'Values': instance_ids[start:start + DESCRIBE_TAGS_FILTER_SIZE]}]
+                      for start in range(0, len(instance_ids), DESCRIBE_TAGS_FILTER_SIZE)]
+        states = {}
+        paginator = self.ec2.get_paginator('describe_tags')
+        for sweep in sweeps:
+            for page in paginator.paginate(Filters=sweep, PaginationConfig={'PageSize': 1000}):
+                for tag in page['Tags']:
+                    states.setdefault(tag['ResourceId'], {})[tag['Key']] = tag['Value']
+        return states
+
+    def get_untagged_resources(self, tag_key='Creator'):
+        """Get the instances, volumes, AMIs and security groups that lack a tag
+
+        Every resource type is read with a paginated describe call. Terminated instances are left out.
+
+        Args:
+            tag_key (str): Key of the tag the resources should have
+
+        Returns:
+            dict: Tags of each untagged resource keyed by resource id, as a dict of tag key to tag value
+        """
+        untagged = {}
+
+        def add(resource_id, tags):
+            tags = {tag['Key']: tag['Value'] for tag in tags or []}
+            if tag_key not in tags:
+                untagged[resource_id] = tags
+
+        states = ['pending', 'running', 'stopping', 'stopped']
+        for page in self.ec2.get_paginator('describe_instances').paginate(
+                Filters=[{'Name': 'instance-state-name', 'Values': states}]):
+            for reservation in page['Reservations']:
+                for instance in reservation['Instances']:
+                    add(instance['InstanceId'], instance.get('Tags'))
+        for page in self.ec2.get_paginator('describe_volumes').paginate():
+            for volume in page['Volumes']:
+                add(volume['VolumeId'], volume.get('Tags'))
+        for page in self.ec2.get_paginator('describe_images').paginate(Owners=['self']):
+            for image in page['Images']:
+                add(image['ImageId'], image.get('Tags'))
+        for page in self.ec2.get_paginator('describe_security_groups').paginate():
+            for group in page['SecurityGroups']:
+                add(group['GroupId'], group.get('Tags'))
+        return untagged
+
     def is_whitelisted(self, instance_id):
         """Check if Instance is whitelisted
 
@@ -238,7 +656,153 @@ class EC2Wrapper:
         response = self.ec2.stop_instances(InstanceIds=instance_ids)
         logger.info(response)
         return response
-        
+
+    def stop_instances_in_chunks(self, instance_ids, chunk_size=STOP_CHUNK_SIZE, max_workers=STOP_MAX_WORKERS):
+        """Stops many instances and confirms they are stopping
+
+        Instance ids are split into chunks that are stopped concurrently. One terminated or
+        protected instance fails a whole StopInstances call, so a failing chunk is bisected until
+        the bad ids are isolated and every other instance still gets stopped. The state of the
+        stopped instances is then polled until they reach stopping/stopped.
+
+        Args:
+            instance_ids (:obj:`list` of :obj:`str`): IDs of the Instances
+            chunk_size (int): Max number of ids per StopInstances call
+            max_workers (int): Max number of chunks stopped at the same time
+
+        Returns:
+            dict: Last known state name keyed by instance id, 'failed' if it could not be stopped
+        """
+        instance_ids = list(dict.fromkeys(instance_ids))
+        if not instance_ids:
+            return {}
+        chunks = [instance_ids[start:start + chunk_size] for start in range(0, len(instance_ids), chunk_size)]
+        failed = {}
+        with ThreadPoolExecutor(max_workers=min(len(chunks), max_workers)) as executor:
+            for chunk_failures in executor.map(self.stop_chunk, chunks):
+                failed.update(chunk_failures)
+        if failed:
+            logger.error('Could not stop %d instances: %s', len(failed), failed)
+        states = self.wait_for_stop([instance_id for instance_id in instance_ids if instance_id not in failed])
+        states.update(dict.fromkeys(failed, 'failed'))
+        return states
+
+    def stop_chunk(self, instance_ids):
+        """Stops one chunk of instances, bisecting it on failure
+
+        Args:
+            instance_ids (:obj:`list` of :obj:`str`): IDs of the Instances
+
+        Returns:
+            dict: Error message keyed by the id of each instance that could not be stopped
+        """
+        try:
+            self.stop_instances(instance_ids)
+        except ClientError as e:
+            if len(instance_ids) == 1 or e.response['Error']['Code'] in THROTTLING_ERROR_CODES:
+                return dict.fromkeys(instance_ids, str(e))
+            middle = len(instance_ids) // 2
+            failed = self.stop_chunk(instance_ids[:middle])
+            failed.update(self.stop_chunk(instance_ids[middle:]))
+            return failed
+        return {}
+
+    def get_instance_states(self, instance_ids):
+        """Get the state of instances
+
+        Args:
+            instance_ids (:obj:`list` of :obj:`str`): IDs of the Instances
+
+        Returns:
+            dict: State name keyed by instance id
+        """
+        states = {}
+        paginator = self.ec2.get_paginator('describe_instance_status')
+        for start in range(0, len(instance_ids), INSTANCE_STATUS_CHUNK_SIZE):
+            chunk = instance_ids[start:start + INSTANCE_STATUS_CHUNK_SIZE]
+            for page in paginator.paginate(InstanceIds=chunk, IncludeAllInstances=True):
+                for status in page['InstanceStatuses']:
+                    states[status['InstanceId']] = status['InstanceState']['Name']
+        return states
+
+    def wait_for_stop(self, instance_ids, attempts=STOP_POLL_ATTEMPTS, interval=STOP_POLL_INTERVAL):
+        """Poll instances until they are stopping or stopped
+
+        Args:
+            instance_ids (:obj:`list` of :obj:`str`): IDs of the Instances
+            attempts (int): Max number of polls
+            interval (float): Seconds between polls
+
+        Returns:
+            dict: Last known state name keyed by instance id, 'unknown' if it was never reported
+        """
+        states = dict.fromkeys(instance_ids, 'unknown')
+        pending = list(instance_ids)
+        for attempt in range(attempts):
+            if attempt:
+                time.sleep(interval)
+            try:
+                states.update(self.get_instance_states(pending))
+            except ClientError as e:
+                logger.error(e)
+            pending = [instance_id for instance_id in pending if states[instance_id] not in STOPPED_STATES]
+            if not pending:
+                break
+        if pending:
+            logger.warning('Instances did not reach stopping/stopped: %s', pending)
+        return states
+
+class RegionalEC2Pool:
+    """Hands out one EC2Wrapper per region
+
+    Wrappers are created on first use and reused afterwards, and all of them share one tag cache.
+
+    Attributes:
+        session (obj): Boto3 Session object with AWS
+        tag_cache (obj, optional): TTLCache shared by every wrapper in the pool
+        default_region (str): Region of the session, used when an instance's region is unknown
+    """
+    def __init__(self, session, tag_cache=None):
+        self.session = session
+        self.tag_cache = tag_cache
+        self.default_region = session.region_name
+        self._wrappers = {}
+        self._lock = threading.Lock()
+
+    def get(self, region=None):
+        """Get the EC2Wrapper for a region
+
+        Args:
+            region (str, optional): Name of the region, defaults to the region of the session
+
+        Returns:
+            obj: EC2Wrapper bound to the region
+        """
+        region = region or self.default_region
+        with self._lock:
+            if region not in self._wrappers:
+                self._wrappers[region] = EC2Wrapper(self.session, tag_cache=self.tag_cache, region_name=region)
+            return self._wrappers[region]
+
+    def map_regions(self, groups, function):
+        """Run a function for each region group in parallel
+
+        Args:
+            groups (dict): Items to process keyed by region
+            function (callable): Called with the EC2Wrapper of a region and the items of that region
+
+        Returns:
+            dict: Return value of function keyed by region
+        """
+        if not groups:
+            return {}
+        regions = list(groups)
+        wrappers = [self.get(region) for region in regions]
+        with ThreadPoolExecutor(max_workers=min(len(regions), MAX_REGION_WORKERS)) as executor:
+            results = executor.map(function, wrappers, [groups[region] for region in regions])
+            return dict(zip(regions, results))
+
+
 class ASGWrapper:
     """Wrapper for AWS ASG
 
@@ -248,7 +812,7 @@ class ASGWrapper:
     """
     def __init__(self, session):
         self.session = session
-        self.asg = session.client('autoscaling')
+        self.asg = get_client(session, 'autoscaling')
 
     def get_asg_user_tag_by_instance_id(self, instance_ids):
         """Get the name of the ASG for these instances
@@ -275,6 +839,53 @@ class ASGWrapper:
         except Exception as e:
             logger.error('Unknown Error: %s', str(e))
 
+    def get_asg_creator(self, asg_name):
+        """Get the Creator tag of an ASG
+
+        The tag is cached for ASG_CREATOR_TTL seconds, so a scale-out of one group costs one
+        DescribeTags call instead of one per launched instance. A group without the tag is not
+        cached, the ASG tagger may not have tagged it yet.
+
+        Args:
+            asg_name (str): Name of an ASG
+        Returns:
+            str: Value of the ASG's Creator tag, None if it is not tagged
+        """
+        key = (self.asg.meta.region_name, asg_name)
+        creator = _asg_creators.get(key)
+        if creator is not None:
+            return creator
+        try:
+            response = self.asg.describe_tags(Filters=[
+                {'Name': 'auto-scaling-group', 'Values': [asg_name]},
+                {'Name': 'key', 'Values': ['Creator']}
+            ])
+        except Exception as e:
+            logger.error('Could not get the tags of %s: %s', asg_name, str(e))
+            return None
+        for tag in response['Tags']:
+            if tag['ResourceId'] == asg_name and tag['Key'] == 'Creator':
+                _asg_creators.put(key, tag['Value'])
+                return tag['Value']
+        logger.warning('%s has no Creator tag', asg_name)
+        return None
+
+    def get_creator_by_instance_id(self, instance_ids, asg_name=None):
+        """Get the creator of instances launched by an ASG
+
+        Resolves instance -> ASG -> Creator tag of the ASG.
+
+        Args:
+            instance_ids ([str]): List of instance_ids that belong to the same ASG
+            asg_name (str, optional): Name of the ASG when it is already known, skips looking it up
+        Returns:
+            str: Value of the ASG's Creator tag, None if the ASG or its tag could not be found
+        """
+        asg_name = asg_name or self.get_asg_user_tag_by_instance_id(instance_ids)
+        if asg_name is None:
+            return None
+        return self.get_asg_creator(asg_name)
+
     def get_asg_instance_ids(self, asg_name):
         """Get the instance_ids of instances belonging to an ASG
 
@@ -285,27 +896,29 @@ class ASGWrapper:
 
         """
         instance_ids = []
-        # Grab the first item in the list because we're only asking for 1 ASG
+        paginator = self.asg.get_paginator('describe_auto_scaling_groups')
         try:
-            asg_data = self.asg.describe_auto_scaling_groups(
-                AutoScalingGroupNames=[asg_name])['AutoScalingGroups'][0]
+            for page in paginator.paginate(AutoScalingGroupNames=[asg_name]):
+                for asg_data in page['AutoScalingGroups']:
+                    for instance_data in asg_data['Instances']:
+                        instance_ids.append(instance_data['InstanceId'])
         except Exception as e: 
             logger.info(e)
             return []
 
-        for instance_data in asg_data['Instances']:
-            instance_ids.append(instance_data['InstanceId'])
-
         return instance_ids
 
     def create_or_update_tags(self, Tags):
         """Tag Autoscaling group and it's EC2 instances
 
+        The group's current instances are tagged in concurrent chunks. A group without instances
+        is left to PropagateAtLaunch, which tags its future instances.
+
         Args:
             Tags: (:obj:`list` of :obj:`dict`): List of tags to tag ASG and EC2
 
         Returns: 
-            dict: Response from AWS EC2 CreateTags API Call
+            dict: Response from AWS AutoScaling CreateOrUpdateTags API Call, None if it failed
 
         """
         tag = Tags[0]
@@ -314,6 +927,7 @@ class ASGWrapper:
             'Key': tag['Key'],
             'Value': tag['Value']
         }
+        response = None
         try:
             response = self.asg.create_or_update_tags(
                 Tags=Tags
@@ -324,28 +938,154 @@ class ASGWrapper:
             logger.info(response)
 
         asg_instances = self.get_asg_instance_ids(asg_name)
-        return EC2Wrapper(self.session).create_tags(Resources=asg_instances, Tags=[ec2_tag])
+        if not asg_instances:
+            logger.info('%s has no instances yet, PropagateAtLaunch will tag them', asg_name)
+            return response
+        failed = EC2Wrapper(self.session).create_tags_in_chunks(asg_instances, [ec2_tag])
+        logger.info('Tagged %d of %d instances in %s', len(asg_instances) - len(failed), len(asg_instances), asg_name)
+        return response
+
+
+class ELBv2Wrapper:
+    """Wrapper for AWS Elastic Load Balancing (v2)
+
+    Attributes:
+        session (obj): Boto3 Session object with AWS
+        elbv2 (obj): Boto3 ELBv2 Client object to directly interface with AWS ELBv2
+    """
+    def __init__(self, session):
+        self.session = session
+        self.elbv2 = get_client(session, 'elbv2')
+
+    def create_tags(self, Resources, Tags):
+        """Tags load balancers, in as many AddTags calls as needed
+
+        Args:
+            Resources (:obj:`list` of :obj:`str`): List of load balancer ARNs
+            Tags (:obj:`list` of :obj:`dict`): List of Key/Value pairs for Tags
+
+        Returns:
+            dict: response from the last AWS AddTags API Call
+        """
+        response = None
+        for start in range(0, len(Resources), ELBV2_ADD_TAGS_MAX_RESOURCES):
+            response = self.elbv2.add_tags(
+                ResourceArns=Resources[start:start + ELBV2_ADD_TAGS_MAX_RESOURCES],
+                Tags=Tags
+            )
+        return response
+
+
+class RDSWrapper:
+    """Wrapper for AWS RDS
+
+    Attributes:
+        session (obj): Boto3 Session object with AWS
+        rds (obj): Boto3 RDS Client object to directly interface with AWS RDS
+    """
+    def __init__(self, session):
+        self.session = session
+        self.rds = get_client(session, 'rds')
+
+    def create_tags(self, Resources, Tags):
+        """Tags RDS resources, AddTagsToResource takes one resource per call
+
+        Args:
+            Resources (:obj:`list` of :obj:`str`): List of RDS resource ARNs
+            Tags (:obj:`list` of :obj:`dict`): List of Key/Value pairs for Tags
+
+        Returns:
+            dict: response from the last AWS AddTagsToResource API Call
+        """
+        response = None
+        for resource_arn in Resources:
+            response = self.rds.add_tags_to_resource(ResourceName=resource_arn, Tags=Tags)
+        return response
 
 
 class TrustedAdvisor:
-    """Wrapper for AWS ASG
+    """Wrapper for AWS TrustedAdvisor
 
     Attributes:
+        session (obj): Boto3 Session object, defaults to a new session
         support (obj): Boto3 Support Client object to directly interface with AWS TrustedAdvisor
+        refresh (bool): Refresh the Low Use check before reading its result
+        refresh_budget (float): Max seconds to wait for a refresh before using the cached result
     """
-    def __init__(self):
-        self.support = boto3.client('support', region_name='us-east-1')
+    def __init__(self, session=None, refresh=TA_REFRESH, refresh_budget=TA_REFRESH_BUDGET):
+        self.session = session if session is not None else boto3.Session()
+        # The Support API is only served from us-east-1
+        self.support = get_client(self.session, 'support', region_name='us-east-1')
+        self.refresh = refresh
+        self.refresh_budget = refresh_budget
 
     def get_low_use_instances(self):
         """Get low use instances
 
+        In refresh mode the check is refreshed first. If the refresh cannot be started or does not
+        finish within refresh_budget, the cached result is returned.
+
         Returns:
             :obj:`list` of :obj:`dict`: List of instances flagged as low use by TrustedAdvisor
         """
+        if self.refresh:
+            self.refresh_low_use_check()
         response = self.support.describe_trusted_advisor_check_result(checkId=LOW_USE_CHECK_ID, language='en')
         if 'result' in response:
             return response['result'].get('flaggedResources', [])
 
+    def get_refresh_status(self):
+        """Get the refresh status of the Low Use check
+
+        Returns:
+            dict: Refresh status, with the status ('none', 'enqueued', 'processing', 'success' or
+                'abandoned') and millisUntilNextRefreshable
+        """
+        response = self.support.describe_trusted_advisor_check_refresh_statuses(checkIds=[LOW_USE_CHECK_ID])
+        return response['statuses'][0]
+
+    def refresh_low_use_check(self, budget=None):
+        """Refresh the Low Use check and wait for the refresh to finish
+
+        A refresh is only requested once the check's minimum refresh interval has passed, a refresh
+        already in progress is waited for instead. The status is polled with jittered exponential
+        backoff until the refresh finishes or the budget runs out.
+
+        Args:
+            budget (float, optional): Max seconds to wait, defaults to refresh_budget
+
+        Returns:
+            bool: True if a refresh finished and the result is fresh, False if the cached result should be used
+        """
+        budget = self.refresh_budget if budget is None else budget
+        deadline = time.monotonic() + budget
+        try:
+            status = self.get_refresh_status()
+            if status['status'] not in TA_REFRESH_PENDING_STATUSES:
+                if status.get('millisUntilNextRefreshable', 0) > 0:
+                    logger.info('Low Use check cannot be refreshed for another %d seconds, using the cached result',
+                                status['millisUntilNextRefreshable'] // 1000)
+                    return False
+                status = self.support.refresh_trusted_advisor_check(checkId=LOW_USE_CHECK_ID)['status']
+            attempt = 1
+            while status['status'] in TA_REFRESH_PENDING_STATUSES:
+                delay = backoff_delay(attempt, base=TA_POLL_BASE, cap=TA_POLL_CAP)
+                if time.monotonic() + delay > deadline:
+                    logger.warning('Low Use check refresh did not finish within %d seconds, using the cached result',
+                                   budget)
+                    return False
+                time.sleep(delay)
+                attempt += 1
+                status = self.get_refresh_status()
+        except ClientError as e:
+            logger.warning('Could not refresh the Low Use check, using the cached result: %s', e)
+            return False
+        if status['status'] != 'success':
+            logger.warning('Low Use check refresh ended with status %s, using the cached result', status['status'])
+            return False
+        logger.info('Low Use check refreshed')
+        return True
+
     def get_low_use_summary(self):
         """Get low use report
 
@@ -370,7 +1110,7 @@ class SESWrapper:
     """
     def __init__(self, session):
         self.session = session
-        self.ses = session.client('ses')
+        self.ses = get_client(session, 'ses')
         self.low_use_template_name = 'LowUseReport'
         self.admin_template_name = 'AdminLowUseReport'
 
@@ -454,6 +1194,152 @@ class SESWrapper:
         )
         return response
 
+    def get_send_quota(self):
+        """Get the SES sending limits of the account
+
+        Returns:
+            float: Max number of emails SES accepts per second
+            float: Number of emails that can still be sent in the current 24 hours, None if unlimited
+        """
+        quota = self.ses.get_send_quota()
+        if quota['Max24HourSend'] < 0:
+            return quota['MaxSendRate'], None
+        return quota['MaxSendRate'], max(quota['Max24HourSend'] - quota['SentLast24Hours'], 0)
+
+    def send_low_use_emails(self, creator_reports, max_workers=SES_MAX_WORKERS, bulk=SES_BULK_SEND):
+        """Sends the low use report to many creators
+
+        Sends run on a bounded thread pool behind a token bucket matched to the account's
+        MaxSendRate, and throttled sends are retried by the client's adaptive retry mode. Reports beyond the remaining
+        24 hour quota, less one send kept for the admin report, are not sent. If the quota cannot
+        be read, reports are sent at SES_FALLBACK_SEND_RATE with no quota applied. In bulk mode the reports are first sent SES_BULK_SIZE at a
+        time with SendBulkTemplatedEmail, and only destinations that failed with a transient
+        status are sent again one by one.
+
+        Args:
+            creator_reports (:obj:`list` of :obj:`dict`): Creator reports with creator, low_use and
+                scheduled_for_deletion keys
+            max_workers (int): Max number of emails sent at the same time
+            bulk (bool): Use SendBulkTemplatedEmail
+
+        Returns:
+            dict: Delivery summary keyed by creator, each with the destination address, a status ('sent',
+                'failed' or 'quota_exceeded'), attempts, and message_id or error. Reports without a creator
+                are sent to ADMIN_EMAIL and keyed by their creator (None) all the same.
+        """
+        creator_reports = list(creator_reports)
+        try:
+            send_rate, remaining = self.get_send_quota()
+        except ClientError as e:
+            logger.warning('Could not get SES quota, sending %s emails per second: %s', SES_FALLBACK_SEND_RATE, e)
+            send_rate, remaining = SES_FALLBACK_SEND_RATE, None
+        limiter = RateLimiter(send_rate)
+        summary = {}
+        if remaining is not None:
+            # Keep one send for the admin report
+            remaining = int(max(remaining - 1, 0))
+        if remaining is not None and len(creator_reports) > remaining:
+            logger.error('SES quota allows %d of %d emails', remaining, len(creator_reports))
+            for creator_report in creator_reports[remaining:]:
+                summary[creator_report['creator']] = {'destination': creator_report['creator'] or ADMIN_EMAIL,
+                                                      'status': 'quota_exceeded', 'attempts': 0}
+            creator_reports = creator_reports[:remaining]
+        if bulk and creator_reports:
+            bulk_summary = self.send_bulk_low_use_emails(creator_reports, limiter)
+            summary.update(bulk_summary)
+            creator_reports = [creator_report for creator_report in creator_reports
+                               if bulk_summary[creator_report['creator']].get('retryable')]
+        if creator_reports:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                results = executor.map(lambda creator_report: self.send_creator_report(limiter, creator_report),
+                                       creator_reports)
+                for creator_report, result in zip(creator_reports, results):
+                    creator = creator_report['creator']
+                    result['destination'] = creator or ADMIN_EMAIL
+                    result['attempts'] += summary.get(creator, {}).get('attempts', 0)
+                    summary[creator] = result
+        return summary
+
+    def send_bulk_low_use_emails(self, creator_reports, limiter=None):
+        """Sends the low use report to many creators with SendBulkTemplatedEmail
+
+        Each request carries up to SES_BULK_SIZE destinations, each with its own
+        ReplacementTemplateData. Throttled requests are retried by the client's adaptive retry mode,
+        only destinations that failed with a transient status are worth sending again.
+
+        Args:
+            creator_reports (:obj:`list` of :obj:`dict`): Creator reports with creator, low_use and
+                scheduled_for_deletion keys
+            limiter (obj, optional): RateLimiter shared by every send of the run, one token per destination
+
+        Returns:
+            dict: Delivery status keyed by creator with the destination address, status ('sent' or 'failed'),
+                attempts, message_id or error, and retryable set for failures worth retrying on their own
+        """
+        summary = {}
+        default_template_data = json.dumps(self.get_low_use_template_data(ADMIN_EMAIL, [], []))
+        for start in range(0, len(creator_reports), SES_BULK_SIZE):
+            chunk = creator_reports[start:start + SES_BULK_SIZE]
+            creators = [creator_report['creator'] for creator_report in chunk]
+            recipients = [creator or ADMIN_EMAIL for creator in creators]
+            destinations = []
+            for recipient, creator_report in zip(recipients, chunk):
+                template_data = self.get_low_use_template_data(recipient,
+                                                               creator_report['low_use'],
+                                                               creator_report['scheduled_for_deletion'])
+                destinations.append({
+                    'Destination': {'ToAddresses': [recipient]},
+                    'ReplacementTemplateData': json.dumps(template_data)
+                })
+            if limiter is not None:
+                limiter.acquire(len(destinations))
+            try:
+                response = self.ses.send_bulk_templated_email(
+                    Source=SES_EMAIL,
+                    Template=self.low_use_template_name,
+                    DefaultTemplateData=default_template_data,
+                    Destinations=destinations
+                )
+            except ClientError as e:
+                logger.error('Could not send bulk reports: %s', e)
+                for creator, recipient in zip(creators, recipients):
+                    summary[creator] = {'destination': recipient, 'status': 'failed', 'attempts': 1,
+                                        'error': str(e), 'retryable': False}
+                continue
+            for creator, recipient, status in zip(creators, recipients, response['Status']):
+                if status['Status'] == 'Success':
+                    summary[creator] = {'destination': recipient, 'status': 'sent', 'attempts': 1,
+                                        'message_id': status.get('MessageId')}
+                else:
+                    retryable = status['Status'] in SES_RETRYABLE_STATUSES
+                    if not retryable:
+                        logger.error('Could not send report to %s: %s %s', recipient, status['Status'],
+                                     status.get('Error', ''))
+                    summary[creator] = {'destination': recipient, 'status': 'failed', 'attempts': 1,
+                                        'error': status.get('Error', status['Status']),
+                                        'retryable': retryable}
+        return summary
+
+    def send_creator_report(self, limiter, creator_report):
+        """Sends one creator report
+
+        Args:
+            limiter (obj): RateLimiter shared by every send of the run
+            creator_report (dict): Creator report with creator, low_use and scheduled_for_deletion keys
+
+        Returns:
+            dict: Delivery status with status, attempts, and message_id or error
+        """
+        limiter.acquire()
+        try:
+            response = self.send_low_use_email(creator_report['creator'],
+                                               creator_report['low_use'],
+                                               creator_report['scheduled_for_deletion'])
+        except ClientError as e:
+            logger.error('Could not send report to %s: %s', creator_report['creator'], e)
+            return {'status': 'failed', 'attempts': 1, 'error': str(e)}
+        return {'status': 'sent', 'attempts': 1, 'message_id': response.get('MessageId')}
+
     def send_admin_report(self, low_use_instances, instances_scheduled_for_deletion):
         """Sends the admin report
 
@@ -473,15 +1359,116 @@ class DynamoWrapper(object):
     Attributes:
         session (obj): Boto3 AWS Session Object
         dynamo (obj): Boto3 AWS Dynamo Resource Object
+        client (obj): Boto3 AWS Dynamo Client Object of the resource. Unlike the resource and its tables,
+            it is thread-safe, so every call that may run on a worker thread goes through it. It takes and
+            returns Python types like the resource does.
         low_use (obj): Boto3 AWS Dynamo Table Object
         whitelist (obj): Boto3 AWS Dynamo Table Object
+        write_limiter (obj): RateLimiter for item writes, None if writes are not rate limited
+        index (dict): Items of each table keyed by table name and instance id, None until preloaded.
+            Once preloaded, reads are answered from it and writes keep it up to date.
+        scan_calls (int): Number of Scan calls made by preload
 
     """
-    def __init__(self, session):
+    def __init__(self, session, write_rate=DYNAMO_WRITE_RATE):
         self.session = session
-        self.dynamo = session.resource('dynamodb')
+        self.dynamo = get_resource(session, 'dynamodb')
+        self.client = self.dynamo.meta.client
         self.low_use = self.dynamo.Table('LowUse')
         self.whitelist = self.dynamo.Table('Whitelist')
+        self.write_limiter = RateLimiter(write_rate) if write_rate else None
+        self.index = None
+        self.scan_calls = 0
+        self._index_lock = threading.Lock()
+
+    def preload(self, segments=DYNAMO_SCAN_SEGMENTS):
+        """Load the LowUse and Whitelist tables into the in-memory index
+
+        Both tables are read with a parallel segmented Scan that only projects the attributes LUAU writes.
+
+        Args:
+            segments (int): Number of Scan segments per table
+
+        Returns:
+            dict: The loaded index
+        """
+        tables = [self.low_use, self.whitelist]
+        jobs = [(table, segment) for table in tables for segment in range(segments)]
+        with ThreadPoolExecutor(max_workers=len(jobs)) as executor:
+            results = list(executor.map(lambda job: self.scan_segment(job[0], job[1], segments), jobs))
+        index = {table.name: {} for table in tables}
+        for (table, _), items in zip(jobs, results):
+            for item in items:
+                index[table.name][item['InstanceID']] = item
+        self.index = index
+        logger.info('Preloaded %d LowUse and %d Whitelist items',
+                    len(index[self.low_use.name]), len(index[self.whitelist.name]))
+        return self.index
+
+    def scan_segment(self, table, segment, total_segments):
+        """Read every page of one Scan segment
+
+        Args:
+            table (obj): Boto3 AWS Dynamo Table Object
+            segment (int): Segment to read
+            total_segments (int): Total number of segments the table is split into
+
+        Returns:
+            :obj:`list` of :obj:`dict`: Items in the segment
+        """
+        names = {'#a%d' % i: attribute for i, attribute in enumerate(DYNAMO_ATTRIBUTES)}
+        kwargs = {
+            'Segment': segment,
+            'TotalSegments': total_segments,
+            'ProjectionExpression': ', '.join(names),
+            'ExpressionAttributeNames': names
+        }
+        items = []
+        while True:
+            response = self.client.scan(TableName=table.name, **kwargs)
+            with self._index_lock:
+                self.scan_calls += 1
+            items.extend(response.get('Items', []))
+            if 'LastEvaluatedKey' not in response:
+                return items
+            kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    def index_put(self, table, item):
+        """Record a written item in the index
+
+        Args:
+            table (obj): Boto3 AWS Dynamo Table Object
+            item (dict): Item that was written
+        """
+        if self.index is not None:
+            with self._index_lock:
+                self.index[table.name][item['InstanceID']] = item
+
+    def index_delete(self, table, instance_id):
+        """Remove a deleted item from the index
+
+        Args:
+            table (obj): Boto3 AWS Dynamo Table Object
+            instance_id (str): ID of EC2 Instance that was deleted
+        """
+        if self.index is not None:
+            with self._index_lock:
+                self.index[table.name].pop(instance_id, None)
+
+    def get_item(self, table, instance_id):
+        """Fetch Instance from a table, using the index when preloaded
+
+        Args:
+            table (obj): Boto3 AWS Dynamo Table Object
+            instance_id (str): ID of EC2 Instance
+
+        Returns:
+            dict: DynamoDB item. None if item does not exist
+        """
+        if self.index is not None:
+            return self.index[table.name].get(instance_id)
+        key = {"InstanceID": instance_id}
+        return self.client.get_item(TableName=table.name, Key=key).get('Item')
 
     def get_whitelist_instance(self, instance_id):
         """Fetch Instance from whitelist table.
@@ -492,8 +1479,7 @@ class DynamoWrapper(object):
         Returns:
             dict: DynamoDB item from Whitelist table. None if item does not exist
         """
-        key = {"InstanceID": instance_id}
-        return self.whitelist.get_item(Key=key)
+        return self.get_item(self.whitelist, instance_id)
 
     def get_low_use_instance(self, instance_id):
         """Fetch Instance from low use table.
@@ -504,8 +1490,7 @@ class DynamoWrapper(object):
         Returns:
             dict: DynamoDB item from LowUse table. None if item does not exist
         """
-        key = {"InstanceID": instance_id}
-        return self.low_use.get_item(Key=key)
+        return self.get_item(self.low_use, instance_id)
 
     def is_whitelisted(self, instance_id):
         """Checks if an instance is whitelisted in Dynamo
@@ -561,14 +1546,10 @@ class DynamoWrapper(object):
         Returns:
             dict: Response from AWS DynamoDB PutItem API Call
         """
-        item = {
-            "InstanceID": instance_id,
-            "Creator": creator,
-            "Reason": reason,
-            "EmailSent": False
-        }
+        item = self.whitelist_item(instance_id, creator, reason)
         self.delete_from_low_use(instance_id)
         response = self.whitelist.put_item(Item=item)
+        self.index_put(self.whitelist, item)
         return response
 
     def add_to_low_use(self, instance_id, creator):
@@ -581,36 +1562,224 @@ class DynamoWrapper(object):
         Returns:
             dict: Response from AWS DynamoDB PutItem API Call
         """
-        item = {
+        item = self.low_use_item(instance_id, creator)
+        response = self.low_use.put_item(Item=item)
+        self.index_put(self.low_use, item)
+        return response
+
+    def schedule_for_deletion(self, instance_id, creator):
+        """Adds an instance to the low use list and labels it as scheduled for deletion
+
+        Args:
+            instance_id (str): ID of EC2 Instance
+            creator (str): Creator email of Instance
+
+        Returns:
+            dict: Response from AWS DynamoDB PutItem API Call
+        """
+        item = self.scheduled_for_deletion_item(instance_id, creator)
+        response = self.low_use.put_item(Item=item)
+        self.index_put(self.low_use, item)
+        return response
+
+    def whitelist_item(self, instance_id, creator, reason):
+        """Builds a Whitelist table item
+
+        Args:
+            instance_id (str): ID of EC2 Instance
+            creator (str): Creator email of Instance
+            reason (str): Reason for Whitelisting
+
+        Returns:
+            dict: Item for the Whitelist table
+        """
+        return {
             "InstanceID": instance_id,
             "Creator": creator,
-            "Scheduled For Deletion": False,
+            "Reason": reason,
             "EmailSent": False
         }
 
-        return self.low_use.put_item(Item=item)
+    def low_use_item(self, instance_id, creator, flagged_at=None):
+        """Builds a LowUse table item for a low use instance
 
-    def schedule_for_deletion(self, instance_id, creator):
-        """Adds an instance to the low use list and labels it as scheduled for deletion
+        Args:
+            instance_id (str): ID of EC2 Instance
+            creator (str): Creator email of Instance
+            flagged_at (float, optional): Epoch time the instance was flagged as low use, defaults to now
+
+        Returns:
+            dict: Item for the LowUse table
+        """
+        return {
+            "InstanceID": instance_id,
+            "Creator": creator,
+            "Scheduled For Deletion": False,
+            "EmailSent": False,
+            "FlaggedAt": int(flagged_at if flagged_at is not None else time.time())
+        }
+
+    def scheduled_for_deletion_item(self, instance_id, creator, flagged_at=None):
+        """Builds a LowUse table item for an instance scheduled for deletion
 
         Args:
             instance_id (str): ID of EC2 Instance
             creator (str): Creator email of Instance
+            flagged_at (float, optional): Epoch time the instance was scheduled for deletion, defaults to now
 
         Returns:
-            dict: Response from AWS DynamoDB PutItem API Call
+            dict: Item for the LowUse table
         """
-        item = {
+        return {
             "InstanceID": instance_id,
             "Creator": creator,
-            "Scheduled For Deletion": True
+            "Scheduled For Deletion": True,
+            "FlaggedAt": int(flagged_at if flagged_at is not None else time.time())
         }
 
-        return self.low_use.put_item(Item=item)
+    def get_flagged_at(self, instance_id):
+        """Get when an instance entered its current lifecycle stage (Low Use or Scheduled For Deletion)
+
+        Args:
+            instance_id (str): ID of EC2 Instance
+
+        Returns:
+            float: Epoch time, None if the instance is not in the LowUse table or was flagged before
+                the time was recorded
+        """
+        item = self.get_item(self.low_use, instance_id)
+        if item is None or item.get('FlaggedAt') is None:
+            return None
+        return float(item['FlaggedAt'])
+
+    def batch_write(self, table, requests):
+        """Writes requests to a table with BatchWriteItem
+
+        Requests are sent DYNAMO_BATCH_SIZE at a time. Unprocessed items are retried with jittered
+        exponential backoff, and every attempt waits on the write limiter so large syncs stay under
+        the table's provisioned capacity. Throttled calls are retried by the client's adaptive retry
+        mode, a chunk still throttled after that is given up on.
+
+        Args:
+            table (obj): Boto3 AWS Dynamo Table Object
+            requests (:obj:`list` of :obj:`dict`): PutRequest/DeleteRequest entries for BatchWriteItem
+
+        Returns:
+            :obj:`list` of :obj:`dict`: Requests that were still unprocessed after DYNAMO_MAX_ATTEMPTS
+        """
+        failed = []
+        for start in range(0, len(requests), DYNAMO_BATCH_SIZE):
+            pending = requests[start:start + DYNAMO_BATCH_SIZE]
+            attempt = 0
+            while pending:
+                attempt += 1
+                if self.write_limiter is not None:
+                    self.write_limiter.acquire(len(pending))
+                try:
+                    response = self.client.batch_write_item(RequestItems={table.name: pending})
+                except ClientError as e:
+                    if e.response['Error']['Code'] not in THROTTLING_ERROR_CODES:
+                        raise
+                    logger.error('Giving up on %d throttled items in %s: %s', len(pending), table.name, e)
+                    failed.extend(pending)
+                    break
+                pending = response.get('UnprocessedItems', {}).get(table.name, [])
+                if not pending:
+                    break
+                if attempt >= DYNAMO_MAX_ATTEMPTS:
+                    logger.error('Giving up on %d unprocessed items in %s', len(pending), table.name)
+                    failed.extend(pending)
+                    break
+                time.sleep(backoff_delay(attempt))
+        return failed
+
+    def changed_items(self, table, items):
+        """Get the items a put would actually write
+
+        Only the last item for each InstanceID is kept. When the index is preloaded, items that are
+        already stored unchanged are left out.
+
+        Args:
+            table (obj): Boto3 AWS Dynamo Table Object
+            items (:obj:`list` of :obj:`dict`): Items to put
+
+        Returns:
+            :obj:`list` of :obj:`dict`: Items to write
+        """
+        unique_items = {item['InstanceID']: item for item in items}
+        if self.index is None:
+            return list(unique_items.values())
+        return [item for item in unique_items.values() if self.get_item(table, item['InstanceID']) != item]
+
+    def batch_put_items(self, table, items):
+        """Puts items into a table with BatchWriteItem
+
+        BatchWriteItem rejects a request that writes the same key twice, so only the last
+        item for each InstanceID is written. When the index is preloaded, items that are
+        already stored unchanged are skipped.
+
+        Args:
+            table (obj): Boto3 AWS Dynamo Table Object
+            items (:obj:`list` of :obj:`dict`): Items to put
+
+        Returns:
+            :obj:`list` of :obj:`dict`: Items that could not be written
+        """
+        changed = self.changed_items(table, items)
+        requests = [{'PutRequest': {'Item': item}} for item in changed]
+        failed = [request['PutRequest']['Item'] for request in self.batch_write(table, requests)]
+        failed_ids = set(item['InstanceID'] for item in failed)
+        for item in changed:
+            if item['InstanceID'] not in failed_ids:
+                self.index_put(table, item)
+        return failed
+
+    def batch_add_to_whitelist(self, instances):
+        """Adds instances to the whitelist in batches
+
+        Args:
+            instances (:obj:`list` of :obj:`dict`): Instances with InstanceID, Creator and Reason
+
+        Returns:
+            :obj:`list` of :obj:`dict`: Items that could not be written
+        """
+        items = [self.whitelist_item(instance['InstanceID'], instance['Creator'], instance['Reason'])
+                 for instance in instances]
+        return self.batch_put_items(self.whitelist, items)
+
+    def batch_add_to_low_use(self, instances, flagged_at=None):
+        """Adds instances to the low use list in batches
+
+        Args:
+            instances (:obj:`list` of :obj:`dict`): Instances with InstanceID and Creator
+            flagged_at (float, optional): Epoch time the instances were flagged as low use, defaults to now
+
+        Returns:
+            :obj:`list` of :obj:`dict`: Items that could not be written
+        """
+        items = [self.low_use_item(instance['InstanceID'], instance['Creator'], flagged_at) for instance in instances]
+        return self.batch_put_items(self.low_use, items)
+
+    def batch_schedule_for_deletion(self, instances, flagged_at=None):
+        """Labels instances as scheduled for deletion in batches
+
+        Args:
+            instances (:obj:`list` of :obj:`dict`): Instances with InstanceID and Creator
+            flagged_at (float, optional): Epoch time the instances were scheduled for deletion, defaults to now
+
+        Returns:
+            :obj:`list` of :obj:`dict`: Items that could not be written
+        """
+        items = [self.scheduled_for_deletion_item(instance['InstanceID'], instance['Creator'], flagged_at)
+                 for instance in instances]
+        return self.batch_put_items(self.low_use, items)
 
     def delete_from_low_use(self, instance_id):
         """Removes an instance from the low use list
 
+        The delete is unconditional (deleting a missing item is a no-op in DynamoDB), so no read
+        is needed first.
+
         Args:
             instance_id (str): ID of EC2 Instance
 
@@ -618,17 +1787,74 @@ class DynamoWrapper(object):
             dict: Response from AWS DynamoDB DeleteItem API Call
         """
         key = {"InstanceID": instance_id}
-        if self.is_low_use(instance_id):
-            return self.low_use.delete_item(Key=key)
+        if self.write_limiter is not None:
+            self.write_limiter.acquire()
+        response = self.client.delete_item(TableName=self.low_use.name, Key=key)
+        self.index_delete(self.low_use, instance_id)
+        return response
 
-    def batch_delete_item_from_low_use(self, instance_ids): 
+    def batch_delete_item_from_low_use(self, instance_ids, guarded=False):
         """Removes multiple instances from the low use list
 
+        Unguarded deletes are blind DeleteRequests sent through batch_write. BatchWriteItem does not
+        support conditions, so guarded deletes are individual DeleteItem calls conditioned on the item
+        existing, run on a thread pool; they are slower but report which instances were not in the table.
+        When the index is preloaded, instances that are not in it are reported as not_found without a call.
+
         Args:
             instance_ids (:obj:`list` of :obj:`str`): IDs of EC2 Instance
+            guarded (bool): Only delete items that exist, reporting the others as not_found
+
+        Returns:
+            dict: Outcome keyed by instance id, one of 'deleted', 'not_found', 'unprocessed' or 'failed'
         """
+        instance_ids = list(dict.fromkeys(instance_ids))
+        report = {}
+        if self.index is not None:
+            for instance_id in instance_ids:
+                if self.get_low_use_instance(instance_id) is None:
+                    report[instance_id] = 'not_found'
+            instance_ids = [instance_id for instance_id in instance_ids if instance_id not in report]
+        if guarded:
+            with ThreadPoolExecutor(max_workers=DYNAMO_DELETE_WORKERS) as executor:
+                outcomes = executor.map(self.guarded_delete_from_low_use, instance_ids)
+                report.update(zip(instance_ids, outcomes))
+            return report
+
+        requests = [{'DeleteRequest': {'Key': {'InstanceID': instance_id}}} for instance_id in instance_ids]
+        report.update(dict.fromkeys(instance_ids, 'deleted'))
+        for request in self.batch_write(self.low_use, requests):
+            report[request['DeleteRequest']['Key']['InstanceID']] = 'unprocessed'
         for instance_id in instance_ids:
-            self.delete_from_low_use(instance_id)
+            if report[instance_id] == 'deleted':
+                self.index_delete(self.low_use, instance_id)
+        return report
+
+    def guarded_delete_from_low_use(self, instance_id):
+        """Removes an instance from the low use list only if it is in it
+
+        Args:
+            instance_id (str): ID of EC2 Instance
+
+        Returns:
+            str: 'deleted', 'not_found' or 'failed'
+        """
+        if self.write_limiter is not None:
+            self.write_limiter.acquire()
+        try:
+            self.client.delete_item(
+                TableName=self.low_use.name,
+                Key={"InstanceID": instance_id},
+                ConditionExpression='attribute_exists(InstanceID)'
+            )
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                self.index_delete(self.low_use, instance_id)
+                return 'not_found'
+            logger.error('Could not delete %s from LowUse: %s', instance_id, e)
+            return 'failed'
+        self.index_delete(self.low_use, instance_id)
+        return 'deleted'
 
 
 class EmailDynamoWrapper(DynamoWrapper):
@@ -0,0 +1,102 @@
+"""Cache Module
+
+This module contains a small in-memory cache used to avoid repeating AWS read calls
+within (and across warm) Lambda invocations.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """Size-bounded LRU cache whose entries expire after a time to live
+
+    Attributes:
+        ttl (float): Seconds an entry stays valid after it is written
+        max_size (int): Max number of entries kept, the least recently used entry is evicted first
+        hits (int): Number of lookups answered from the cache
+        misses (int): Number of lookups that were missing or expired
+    """
+    def __init__(self, ttl=300, max_size=10000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Fetch an entry
+
+        Args:
+            key (str): Key of the entry
+
+        Returns:
+            obj: Cached value, None if the key is missing or expired
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        """Store an entry, evicting the least recently used entries past max_size
+
+        Args:
+            key (str): Key of the entry
+            value (obj): Value to cache
+        """
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def update(self, key, function):
+        """Replace a cached value in place without refreshing its expiry
+
+        Used for write-through updates: nothing is stored if the key is not already cached.
+
+        Args:
+            key (str): Key of the entry
+            function (callable): Called with the cached value, returns the new value
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries[key] = (entry[0], function(entry[1]))
+
+    def invalidate(self, key):
+        """Remove an entry
+
+        Args:
+            key (str): Key of the entry
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        """Remove all entries and reset the hit/miss counters"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """Get cache counters
+
+        Returns:
+            dict: hits, misses and current size of the cache
+        """
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries)}
+
+    def __len__(self):
+        return len(self._entries)
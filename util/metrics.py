@@ -0,0 +1,266 @@
+"""Metrics Module
+
+This module instruments boto3 clients through the botocore event system and reports, per
+operation, the number of calls, a latency histogram, retries, throttled attempts and errors.
+Handlers decorated with emit_metrics log everything recorded during the invocation as one
+JSON line in CloudWatch Embedded Metric Format (EMF), which CloudWatch turns into metrics.
+
+Attributes:
+    METRICS_NAMESPACE (str): CloudWatch namespace the metrics are published under.
+    LATENCY_BUCKETS (:obj:`list` of :obj:`float`): Upper bounds in milliseconds of the latency histogram
+        buckets, the last bucket holds everything slower.
+    EMF_MAX_METRICS (int): Max number of metrics in one EMF metric directive.
+    THROTTLING_ERROR_CODES (:obj:`tuple` of :obj:`str`): Error codes AWS services use when a call was throttled,
+        shared with util.aws which retries them.
+"""
+
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+
+logging.basicConfig()
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+METRICS_NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'LUAU')
+LATENCY_BUCKETS = [10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+EMF_MAX_METRICS = 100
+THROTTLING_ERROR_CODES = ('Throttling', 'ThrottlingException', 'ThrottledException', 'RequestLimitExceeded',
+                          'ProvisionedThroughputExceededException', 'TooManyRequestsException',
+                          'RequestThrottledException', 'SlowDown')
+
+
+class OperationStats:
+    """Counters of one AWS API operation
+
+    Attributes:
+        calls (int): Number of calls, a call includes all of its retries
+        retries (int): Number of retried attempts
+        throttles (int): Number of attempts rejected with a throttling error
+        errors (int): Number of calls that ended in an error
+        latency_total (float): Sum of call latencies in milliseconds
+        latency_max (float): Slowest call in milliseconds
+        latency_counts (:obj:`list` of :obj:`int`): Number of calls in each LATENCY_BUCKETS bucket
+    """
+    def __init__(self):
+        self.calls = 0
+        self.retries = 0
+        self.throttles = 0
+        self.errors = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.latency_counts = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    def add_call(self, latency, retries, error_code):
+        """Record a finished call
+
+        Args:
+            latency (float): Latency of the call, retries included, in milliseconds
+            retries (int): Number of retried attempts
+            error_code (str): Error code of the call, None if it succeeded
+        """
+        self.calls += 1
+        self.retries += retries
+        if error_code is not None:
+            self.errors += 1
+        self.latency_total += latency
+        self.latency_max = max(self.latency_max, latency)
+        self.latency_counts[bisect_left(LATENCY_BUCKETS, latency)] += 1
+
+
+class Metrics:
+    """Thread-safe store of OperationStats keyed by service and operation
+
+    Attributes:
+        operations (dict): OperationStats keyed by (service, operation)
+        timings (dict): Milliseconds keyed by name, for timings that are not AWS calls
+    """
+    def __init__(self):
+        self.operations = {}
+        self.timings = {}
+        self._lock = threading.Lock()
+
+    def _stats(self, service, operation):
+        key = (service, operation)
+        if key not in self.operations:
+            self.operations[key] = OperationStats()
+        return self.operations[key]
+
+    def record_call(self, service, operation, latency, retries=0, error_code=None):
+        """Record a finished call
+
+        Args:
+            service (str): Name of the AWS service (ec2, ses, ...)
+            operation (str): Name of the API operation (DescribeInstances, ...)
+            latency (float): Latency of the call, retries included, in milliseconds
+            retries (int): Number of retried attempts
+            error_code (str): Error code of the call, None if it succeeded
+        """
+        with self._lock:
+            self._stats(service, operation).add_call(latency, retries, error_code)
+
+    def record_throttle(self, service, operation):
+        """Record an attempt rejected with a throttling error
+
+        Args:
+            service (str): Name of the AWS service
+            operation (str): Name of the API operation
+        """
+        with self._lock:
+            self._stats(service, operation).throttles += 1
+
+    def record_timing(self, name, milliseconds):
+        """Record a timing that is not an AWS call, adding to any earlier timing of the same name
+
+        Args:
+            name (str): Name of the metric
+            milliseconds (float): Time taken
+        """
+        with self._lock:
+            self.timings[name] = self.timings.get(name, 0.0) + milliseconds
+
+    def reset(self):
+        """Forget everything recorded"""
+        with self._lock:
+            self.operations = {}
+            self.timings = {}
+
+    def to_emf(self, dimensions=None, namespace=METRICS_NAMESPACE):
+        """Build the Embedded Metric Format document of everything recorded
+
+        EMF allows one value per dimension in a document, so every operation gets its own metric
+        names ("ec2.DescribeInstances.Calls", ...) and everything fits in a single log line. Latency
+        is published as the average per operation, the histograms are kept in the document as a
+        property.
+
+        Args:
+            dimensions (dict): Dimension values shared by every metric
+            namespace (str): CloudWatch namespace
+
+        Returns:
+            dict: EMF document
+        """
+        dimensions = dimensions or {}
+        document = dict(dimensions)
+        definitions = []
+        histograms = {}
+        with self._lock:
+            for (service, operation), stats in sorted(self.operations.items()):
+                prefix = '%s.%s' % (service, operation)
+                values = [
+                    ('Calls', stats.calls, 'Count'),
+                    ('Retries', stats.retries, 'Count'),
+                    ('Throttles', stats.throttles, 'Count'),
+                    ('Errors', stats.errors, 'Count'),
+                    ('Latency', stats.latency_total / stats.calls if stats.calls else 0.0, 'Milliseconds'),
+                    ('LatencyMax', stats.latency_max, 'Milliseconds')
+                ]
+                for name, value, unit in values:
+                    document['%s.%s' % (prefix, name)] = value
+                    definitions.append({'Name': '%s.%s' % (prefix, name), 'Unit': unit})
+                histograms[prefix] = {'Buckets': LATENCY_BUCKETS, 'Counts': list(stats.latency_counts)}
+            for name, milliseconds in sorted(self.timings.items()):
+                document[name] = milliseconds
+                definitions.append({'Name': name, 'Unit': 'Milliseconds'})
+        document['LatencyHistograms'] = histograms
+        document['_aws'] = {
+            'Timestamp': int(time.time() * 1000),
+            'CloudWatchMetrics': [
+                {
+                    'Namespace': namespace,
+                    'Dimensions': [sorted(dimensions)],
+                    'Metrics': definitions[start:start + EMF_MAX_METRICS]
+                } for start in range(0, len(definitions), EMF_MAX_METRICS)
+            ]
+        }
+        return document
+
+
+METRICS = Metrics()
+
+
+def instrument(client, metrics=METRICS):
+    """Record the calls of a boto3 client
+
+    Registers handlers on the client's own botocore event emitter, so only this client is
+    affected. Registering the same client twice has no effect.
+
+    Args:
+        client (obj): Boto3 Client object
+        metrics (obj): Metrics the calls are recorded in
+
+    Returns:
+        obj: The client
+    """
+    service = client.meta.service_model.service_name
+
+    def before_call(model, context, **kwargs):
+        context['luau_start'] = time.monotonic()
+
+    def needs_retry(response, operation, **kwargs):
+        if response is None:
+            return
+        error_code = response[1].get('Error', {}).get('Code')
+        if error_code in THROTTLING_ERROR_CODES:
+            metrics.record_throttle(service, operation.name)
+
+    def after_call(model, parsed, context, **kwargs):
+        record(model, context, parsed.get('ResponseMetadata', {}).get('RetryAttempts', 0),
+               parsed.get('Error', {}).get('Code'))
+
+    def after_call_error(model, context, exception, **kwargs):
+        record(model, context, 0, type(exception).__name__)
+
+    def record(model, context, retries, error_code):
+        start = context.get('luau_start')
+        if start is None:
+            return
+        metrics.record_call(service, model.name, (time.monotonic() - start) * 1000, retries, error_code)
+
+    events = client.meta.events
+    events.register('before-call', before_call, unique_id='luau-metrics-before-call')
+    events.register('needs-retry', needs_retry, unique_id='luau-metrics-needs-retry')
+    events.register('after-call', after_call, unique_id='luau-metrics-after-call')
+    events.register('after-call-error', after_call_error, unique_id='luau-metrics-after-call-error')
+    return client
+
+
+def flush(metrics=METRICS, dimensions=None):
+    """Log everything recorded as one EMF JSON line and reset the metrics
+
+    Args:
+        metrics (obj): Metrics to flush
+        dimensions (dict): Dimension values shared by every metric, defaults to the Lambda function name
+
+    Returns:
+        dict: The EMF document that was logged
+    """
+    if dimensions is None:
+        dimensions = {'Function': os.environ.get('AWS_LAMBDA_FUNCTION_NAME', 'local')}
+    document = metrics.to_emf(dimensions)
+    metrics.reset()
+    # EMF is parsed from stdout, so it bypasses the logging format prefix
+    print(json.dumps(document))
+    return document
+
+
+def emit_metrics(handler):
+    """Decorate a Lambda handler so the invocation's metrics are flushed when it returns or raises
+
+    Args:
+        handler (callable): Lambda handler
+
+    Returns:
+        callable: Decorated handler
+    """
+    @functools.wraps(handler)
+    def wrapper(event, context):
+        try:
+            return handler(event, context)
+        finally:
+            flush()
+    return wrapper
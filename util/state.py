@@ -0,0 +1,146 @@
+"""State Module
+
+This module contains the stores LUAU uses to persist run state (checkpoints) between Lambda
+invocations. State is any JSON serializable dict, saved under a key.
+
+    * DynamoStateStore keeps state in the LUAUState DynamoDB Table (used in Lambda)
+    * FileStateStore keeps state in a local JSON file (used in tests and local runs)
+
+Attributes:
+    STATE_TABLE (str): Name of the DynamoDB Table holding LUAU run state.
+    STATE_STORE_PATH (str): Path of a local state file, when set it is used instead of DynamoDB.
+"""
+
+import json
+import logging
+import os
+import threading
+import zlib
+from boto3.dynamodb.types import Binary
+from util.aws import get_resource
+
+logging.basicConfig()
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+STATE_TABLE = os.environ.get('STATE_TABLE', 'LUAUState')
+STATE_STORE_PATH = os.environ.get('STATE_STORE_PATH')
+
+
+def get_state_store(session):
+    """Get the state store for this environment
+
+    Args:
+        session (obj): Boto3 AWS Session Object
+
+    Returns:
+        obj: FileStateStore if STATE_STORE_PATH is set, DynamoStateStore otherwise
+    """
+    if STATE_STORE_PATH:
+        return FileStateStore(STATE_STORE_PATH)
+    return DynamoStateStore(session)
+
+
+class DynamoStateStore(object):
+    """State store backed by a DynamoDB Table
+
+    State is stored as zlib compressed JSON in a binary attribute, which keeps large checkpoints
+    well under the DynamoDB item size limit.
+
+    Attributes:
+        session (obj): Boto3 AWS Session Object
+        table (obj): Boto3 AWS Dynamo Table Object
+    """
+    def __init__(self, session, table_name=STATE_TABLE):
+        self.session = session
+        self.table = get_resource(session, 'dynamodb').Table(table_name)
+
+    def get(self, key):
+        """Load state
+
+        Args:
+            key (str): Key the state is saved under
+
+        Returns:
+            dict: The saved state, None if nothing is saved under the key
+        """
+        item = self.table.get_item(Key={'StateKey': key}, ConsistentRead=True).get('Item')
+        if item is None:
+            return None
+        return json.loads(zlib.decompress(item['State'].value).decode('utf-8'))
+
+    def put(self, key, state):
+        """Save state, replacing any state saved under the key
+
+        Args:
+            key (str): Key to save the state under
+            state (dict): JSON serializable state
+        """
+        self.table.put_item(Item={
+            'StateKey': key,
+            'State': Binary(zlib.compress(json.dumps(state).encode('utf-8')))
+        })
+
+    def delete(self, key):
+        """Remove state
+
+        Args:
+            key (str): Key the state is saved under
+        """
+        self.table.delete_item(Key={'StateKey': key})
+
+
+class FileStateStore(object):
+    """State store backed by a local JSON file
+
+    Attributes:
+        path (str): Path of the JSON file, holding every saved state keyed by key
+    """
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def _read(self):
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path) as state_file:
+            return json.load(state_file)
+
+    def _write(self, states):
+        with open(self.path, 'w') as state_file:
+            json.dump(states, state_file)
+
+    def get(self, key):
+        """Load state
+
+        Args:
+            key (str): Key the state is saved under
+
+        Returns:
+            dict: The saved state, None if nothing is saved under the key
+        """
+        with self._lock:
+            return self._read().get(key)
+
+    def put(self, key, state):
+        """Save state, replacing any state saved under the key
+
+        Args:
+            key (str): Key to save the state under
+            state (dict): JSON serializable state
+        """
+        with self._lock:
+            states = self._read()
+            states[key] = state
+            self._write(states)
+
+    def delete(self, key):
+        """Remove state
+
+        Args:
+            key (str): Key the state is saved under
+        """
+        with self._lock:
+            states = self._read()
+            if states.pop(key, None) is not None:
+                self._write(states)
@@ -0,0 +1,67 @@
+"""Throttle Module
+
+This module contains helpers to keep LUAU under AWS API rate limits: a token bucket
+rate limiter and jittered exponential backoff for retries.
+"""
+
+import random
+import threading
+import time
+
+
+def backoff_delay(attempt, base=0.05, cap=5.0):
+    """Get the delay before a retry
+
+    Uses exponential backoff with full jitter, so concurrent callers that were throttled
+    together do not retry together.
+
+    Args:
+        attempt (int): Number of the retry, starting at 1
+        base (float): Delay in seconds of the first retry before jitter
+        cap (float): Max delay in seconds before jitter
+
+    Returns:
+        float: Seconds to wait before retrying
+    """
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class RateLimiter:
+    """Thread-safe token bucket
+
+    Tokens are added at a steady rate up to a burst capacity, and callers block until
+    enough tokens are available.
+
+    Attributes:
+        rate (float): Tokens added per second
+        capacity (float): Max tokens held at once, defaults to one second worth of tokens
+    """
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity) if capacity is not None else max(self.rate, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        """Block until tokens are available and take them
+
+        Requests bigger than the capacity are allowed and simply wait for the bucket to refill.
+
+        Args:
+            tokens (float): Number of tokens to take
+
+        Returns:
+            float: Seconds spent waiting
+        """
+        waited = 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= tokens
+            if self._tokens < 0:
+                waited = -self._tokens / self.rate
+        if waited:
+            time.sleep(waited)
+        return waited